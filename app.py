@@ -1,15 +1,78 @@
 # app.py - Pure AI Recipe Generator
 import subprocess
+import signal
 import time
 import os
-import re
 import json
+import hmac
+import contextvars
 import pickle
+import urllib.error
+import urllib.request
 import numpy as np
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import Flask, render_template, request, jsonify, session
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from keyword_search import has_fts_index, keyword_search
+from dedup import has_clusters
+from ingredients import IngredientIndex, INGREDIENT_INDEX_FILE
+from pantry import PantryScorer, parse_pantry, PANTRY_MATRIX_FILE
+from dense_index import DenseIndex
+from knn import NeighborGraph, KNN_FILE
+from shared_index import SharedArrays
+from index_versions import (IndexManager, IndexVersion, list_versions, resolve_paths, LEGACY_VERSION, MODELS_FILE,
+                            VERSIONS_DIR, WATCH_INTERVAL)
+from shards import Coordinator, LocalShard, RemoteShard, SHARD_TIMEOUT
+from metrics import span, observe_ollama, render as render_metrics, PARSE_FAILURES, INDEX_MEMORY, PARTIAL_RESULTS
+from query_encoder import BackgroundEncoder
+from instructions import normalize_instructions, parsed_steps, has_step_timers
+from recipe_search import (fuse_candidates, filter_rows, visible_candidates, recipe_payloads, request_deadline,
+                           SearchSnapshots, CursorExpired)
+from profiler import SamplingProfiler, SlowRequestLog, collapsed, SLOW_REQUEST_SECONDS, MAX_PROFILE_SECONDS
+
+# Pantry stage: recipes missing more non-staple ingredients than this are not added as pantry matches
+PANTRY_MAX_MISSING = 3
+
+# Retrieval budget per hybrid search in seconds (0 = none): shards are scanned most promising first and
+# whatever was found when it runs out is returned, marked partial
+SEARCH_DEADLINE_SECONDS = float(os.environ.get('SEARCH_DEADLINE_SECONDS', 0))
+# hybrid_search_db's deadline when the caller gives none (None means no deadline)
+DEFAULT_DEADLINE = object()
+
+# /recipes/search: candidates taken from each leg, page sizes and retrieval budget
+RECIPES_SEARCH_DEPTH = 500
+RECIPES_PAGE_SIZE = 20
+RECIPES_MAX_PAGE_SIZE = 100
+RECIPES_SEARCH_DEADLINE_SECONDS = float(os.environ.get('RECIPES_SEARCH_DEADLINE_SECONDS', 0.08))
+# Ranked candidates per search are kept this long, so later pages skip retrieval
+RECIPES_CACHE_SECONDS = float(os.environ.get('RECIPES_CACHE_SECONDS', 300))
+RECIPES_CACHE_SIZE = int(os.environ.get('RECIPES_CACHE_SIZE', 1024))
+
+# Set by serve.py: the parent process loads indexes and coordinates version swaps, workers only serve
+PREFORK_SERVER = os.environ.get('PREFORK_SERVER') == '1'
+# How often new published index versions are looked for (0 = never)
+INDEX_WATCH_SECONDS = float(os.environ.get('INDEX_WATCH_SECONDS', WATCH_INTERVAL))
+# Admin reload/rollback handed from a serve.py worker to the parent (in the versions directory)
+SWAP_REQUEST_FILE = '.swap-request.json'
+
+# Ollama server; point at fake_ollama.py for offline load tests
+OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://localhost:11434').rstrip('/')
+
+def ollama_call(path, payload=None, timeout=180):
+    """GET (no payload) or POST JSON to the Ollama API; returns the decoded body.
+    
+    Raises urllib.error.HTTPError for non-2xx answers, URLError if Ollama is unreachable.
+    """
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(f'{OLLAMA_URL}{path}', data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+# Sentence transformer: torch is imported and the model loaded in a background
+# thread while the indexes below load; encoder.encode() waits for it. Under
+# serve.py the parent never initialises torch: each worker starts its own
+# load in after_fork()
+encoder = BackgroundEncoder(start=not PREFORK_SERVER)
 
 # Start Ollama model automatically
 def start_ollama_model():
@@ -26,8 +89,6 @@ def start_ollama_model():
         print(f"[ERROR] Failed to start Ollama automatically: {e}")
         return None
 
-ollama_process = start_ollama_model()
-
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
@@ -36,11 +97,12 @@ print("AI Recipe Generator")
 print("=" * 60)
 
 # --- Load Models & Embeddings ---
-print("\n[INFO] Loading models and metadata...")
-try:
+def load_index_version(name, path):
+    """Load path/recipe_models.pkl and its chunks into an IndexVersion (see index_versions.py)."""
+    print(f"\n[INFO] Loading index version {name} ({os.path.abspath(path)})")
     # Load metadata
-    with open('recipe_models.pkl', 'rb') as f:
-        models_data = pickle.load(f)
+    with open(os.path.join(path, MODELS_FILE), 'rb') as f:
+        models_data = resolve_paths(pickle.load(f), path)
     
     recipe_ids = models_data['recipe_ids']
     chunks_dir = models_data['chunks_dir']
@@ -68,41 +130,149 @@ try:
     else:
         chunk_size = models_data.get('chunk_size', 10000)
 
-    # Load Sentence Transformer
-    print("[INFO] Loading Sentence Transformer...")
-    encoder = SentenceTransformer('all-MiniLM-L6-v2')
-    
+    # Per-shard files and row offsets from the build manifest; older builds used
+    # uniform emb_chunk_{i} files of chunk_size rows
+    chunk_files = models_data.get('chunk_files') or [
+        {'emb': f'emb_chunk_{i}.npy', 'tfidf': f'tfidf_chunk_{i}.npz'} for i in range(num_chunks)
+    ]
+    chunk_offsets = models_data.get('chunk_offsets') or [i * chunk_size for i in range(num_chunks)]
+    recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+
+    # Dense retrieval: projected prefilter + full rerank when the build wrote proj_chunk_* files
+    dense_index = DenseIndex.from_models({**models_data, 'chunk_files': chunk_files, 'chunk_offsets': chunk_offsets})
+    if dense_index.projected is not None:
+        print(f"[INFO] Dense prefilter: {dense_index.projection.dims}-dim projection "
+              f"({dense_index.memory_bytes / 1e6:.0f} MB), rerank top {dense_index.rerank_candidates}")
+    else:
+        print("[INFO] No projected vectors; dense search scans full embedding chunks.")
+
+    # Shards behind hybrid search: shard_server.py processes listed in SHARD_URLS, else every chunk locally
+    shard_urls = [u.strip() for u in os.environ.get('SHARD_URLS', '').split(',') if u.strip()]
+    if shard_urls:
+        shard_timeout = float(os.environ.get('SHARD_TIMEOUT', SHARD_TIMEOUT))
+        search_coordinator = Coordinator([RemoteShard(u, shard_timeout) for u in shard_urls], shard_timeout)
+        print(f"[INFO] Searching {len(shard_urls)} remote shards (timeout {shard_timeout}s).")
+    else:
+        local_shard = LocalShard('local', chunks_dir, chunk_files, chunk_offsets, recipe_ids, dense_index)
+        search_coordinator = Coordinator([local_shard], timeout=None)
+
     # TF-IDF vectorizer (matrix is in chunks)
-    print("[INFO] Loading TF-IDF vectorizer...")
     tfidf_vectorizer = models_data.get('tfidf_vectorizer')
-    
     if tfidf_vectorizer:
         print(f"[INFO] TF-IDF vectorizer loaded")
     else:
         print("[WARNING] TF-IDF vectorizer not available.")
     
     print(f"[INFO] Ready to search {len(recipe_ids)} recipes across {num_chunks} chunks.")
-    models_loaded = True
+    return IndexVersion(name, path, recipes=len(recipe_ids), on_close=_close_index_version,
+                        recipe_ids=recipe_ids, dense_index=dense_index, coordinator=search_coordinator,
+                        tfidf_vectorizer=tfidf_vectorizer)
+
+def _close_index_version(version):
+    version.coordinator.close()
+    version.coordinator = version.dense_index = version.tfidf_vectorizer = version.recipe_ids = None
+    shared = getattr(version, 'shared_arrays', None)
+    if shared is not None and shared.owner == os.getpid():
+        # serve.py parent: workers still on this version keep their own mapping
+        version.shared_arrays = None
+        try:
+            shared.close()
+        except BufferError:
+            shared.shm.unlink()
+
+def warm_index_version(version):
+    """One dense and one sparse query, so the first real request does not pay for page faults."""
+    if version.dense_index is not None and version.dense_index.chunk_files:
+        first = os.path.join(version.dense_index.chunks_dir, version.dense_index.chunk_files[0]['emb'])
+        probe = np.load(first, mmap_mode='r')[:1]
+        version.coordinator.search(query_emb=np.array(probe, dtype=np.float32), top_k=10)
+    if hasattr(version.tfidf_vectorizer, 'transform_query'):
+        version.coordinator.search(query_vec=version.tfidf_vectorizer.transform_query('chicken rice'), top_k=10)
+
+# Published versions (build_models.py --publish) are picked up while serving; without
+# any, recipe_models.pkl in the working directory is loaded as the 'legacy' version
+index_manager = IndexManager(load_index_version, os.environ.get('INDEX_VERSIONS_DIR', VERSIONS_DIR),
+                             warm=warm_index_version)
+INDEX_MEMORY.set_function(lambda: index_manager.active.dense_index.memory_bytes if index_manager.active else 0,
+                          index='dense_prefilter')
+print("\n[INFO] Loading models and metadata...")
+try:
+    if list_versions(index_manager.versions_dir):
+        index_manager.reload(background=False)
+    else:
+        index_manager.activate(load_index_version(LEGACY_VERSION, '.'))
+    if index_manager.active is None:
+        raise RuntimeError(index_manager.last_error)
 except Exception as e:
     print(f"[ERROR] Failed to load models: {e}")
     print("Ensure you have run 'build_models.py' first.")
-    models_loaded = False
-    recipe_ids = []
-    encoder = None
-    chunks_dir = None
-    tfidf_vectorizer = None
+
+@app.before_request
+def _watch_index_versions():
+    """Poll for new index versions from the process that serves requests (under serve.py: the parent, see update_index)."""
+    if not PREFORK_SERVER:
+        index_manager.ensure_watching(INDEX_WATCH_SECONDS)
+
+# Keyword index (FTS5) for the sparse leg of hybrid search
+keyword_index_available = False
+recipe_clusters_available = False
+step_timers_available = False
+try:
+    if os.path.exists('recipes.db'):
+        conn = sqlite3.connect('recipes.db')
+        keyword_index_available = has_fts_index(conn)
+        recipe_clusters_available = has_clusters(conn)
+        step_timers_available = has_step_timers(conn)
+        conn.close()
+except Exception as e:
+    print(f"[WARNING] Could not check for FTS5 index: {e}")
+
+if keyword_index_available:
+    print("[INFO] FTS5 keyword index found (recipes_fts).")
+else:
+    print("[WARNING] FTS5 keyword index not found; falling back to TF-IDF chunks. Rebuild with create_db.py.")
+
+# Ingredient -> recipe postings (built by create_db.py)
+ingredient_index = None
+if os.path.exists(INGREDIENT_INDEX_FILE):
+    try:
+        ingredient_index = IngredientIndex.load(INGREDIENT_INDEX_FILE)
+        print(f"[INFO] Ingredient index loaded: {ingredient_index.num_ingredients} ingredients, "
+              f"{len(ingredient_index.indices)} postings.")
+    except Exception as e:
+        print(f"[WARNING] Failed to load ingredient index: {e}")
+else:
+    print(f"[WARNING] {INGREDIENT_INDEX_FILE} not found. Run create_db.py to build it.")
+
+# Pantry-coverage scorer over the recipe x ingredient matrix (built by create_db.py)
+pantry_scorer = None
+if ingredient_index is not None and os.path.exists(PANTRY_MATRIX_FILE):
+    try:
+        pantry_scorer = PantryScorer.load(ingredient_index, PANTRY_MATRIX_FILE)
+        print(f"[INFO] Pantry matrix loaded: {pantry_scorer.matrix.shape[0]} x {pantry_scorer.matrix.shape[1]}.")
+    except Exception as e:
+        print(f"[WARNING] Failed to load pantry matrix: {e}")
+
+# Precomputed "more like this" neighbours (built by knn.py)
+neighbor_graph = None
+if os.path.exists(KNN_FILE):
+    try:
+        neighbor_graph = NeighborGraph.load(KNN_FILE)
+        INDEX_MEMORY.set_function(lambda: (neighbor_graph.neighbors.nbytes + neighbor_graph.scores.nbytes
+                                           + neighbor_graph.recipe_ids.nbytes), index='knn_graph')
+        print(f"[INFO] kNN graph loaded: {len(neighbor_graph.recipe_ids)} recipes x {neighbor_graph.k} neighbours.")
+    except Exception as e:
+        print(f"[WARNING] Failed to load kNN graph: {e}")
 
 # Local LLM (optional) - using Ollama for stable inference
 llm = None
 ollama_available = False
 try:
-    import requests
     # Check if Ollama is running on default port
-    resp = requests.get('http://localhost:11434/api/tags', timeout=2)
-    if resp.status_code == 200:
-        ollama_available = True
-        print("\n[INFO] Ollama detected. Using Ollama for local LLM inference.")
-        print("   Ensure 'ollama run mistral' is running in another terminal.")
+    ollama_call('/api/tags', timeout=2)
+    ollama_available = True
+    print("\n[INFO] Ollama detected. Using Ollama for local LLM inference.")
+    print("   Ensure 'ollama run mistral' is running in another terminal.")
 except Exception:
     pass
 
@@ -152,218 +322,460 @@ def _parse_mistral_recipe_list(llm_output):
         print(f"LLM output was:\n{llm_output}")
         return None
 
-def search_db(query, top_k=5):
-    """Search database using chunked embeddings."""
+def search_db(query, top_k=5, deadline=None):
+    """Search database using chunked embeddings (until deadline, a time.monotonic() value, if given)."""
     print(f"[search_db] Called with query: {query}")
-    print(f"[search_db] models_loaded: {models_loaded}")
-    
-    if not models_loaded:
-        print("[search_db] Models not loaded, returning empty.")
-        return []
-    
-    try:
-        # Encode query
-        query_emb = encoder.encode([query]) # Shape: (1, 384)
+    with index_manager.acquire() as index:
+        print(f"[search_db] index version: {index.name if index else None}")
         
-        global_top_scores = []
-        global_top_indices = []
+        if index is None:
+            print("[search_db] Models not loaded, returning empty.")
+            return []
         
-        # Iterate through chunks
-        print(f"[search_db] Starting search across {num_chunks} chunks...")
-        for i in range(num_chunks):
-            if i % 5 == 0:
-                print(f"[search_db] Processing chunk {i+1}/{num_chunks}...")
-            
-            chunk_path = os.path.join(chunks_dir, f'emb_chunk_{i}.npy')
-            if not os.path.exists(chunk_path):
-                continue
-                
-            # Load chunk
-            chunk_emb = np.load(chunk_path) # Shape: (N_chunk, 384)
-            
-            # Compute similarity
-            sims = cosine_similarity(query_emb, chunk_emb)[0] # Shape: (N_chunk,)
-            
-            # Get top k in this chunk
-            # We take top_k from EACH chunk to be safe, then merge later
-            k_chunk = min(top_k, len(sims))
-            chunk_top_indices = np.argsort(sims)[-k_chunk:][::-1]
-            chunk_top_scores = sims[chunk_top_indices]
+        try:
+            # Encode query
+            with span('query_encode'):
+                query_emb = encoder.encode([query]) # Shape: (1, 384)
             
-            # Map back to global indices
-            # Global index = (chunk_index * chunk_size) + local_index
-            # BUT we need to be careful if chunks are not perfectly equal or if recipe_ids list aligns perfectly.
-            # Assuming recipe_ids list aligns with the concatenation of all chunks.
-            global_indices = (i * chunk_size) + chunk_top_indices
+            with span('dense_scan'):
+                hits = index.coordinator.search(query_emb=query_emb, top_k=top_k, deadline=deadline)['dense']
+            if len(hits) == 0:
+                return []
             
-            global_top_scores.extend(chunk_top_scores)
-            global_top_indices.extend(global_indices)
+            with span('hydrate'):
+                results = []
+                conn = sqlite3.connect('recipes.db')
+                cursor = conn.cursor()
             
-            # Clean up
-            del chunk_emb, sims
-        
-        # Now find the global top k from the candidates
-        global_top_scores = np.array(global_top_scores)
-        global_top_indices = np.array(global_top_indices)
+                for r_id, _ in hits:
+                    cursor.execute('SELECT name, description, cuisine, ingredients, instructions FROM recipes WHERE id = ?', (r_id,))
+                    row = cursor.fetchone()
+                    if row:
+                        results.append({
+                            'name': row[0],
+                            'description': row[1],
+                            'cuisine': row[2],
+                            'ingredients': row[3],
+                            'instructions': row[4]
+                        })
         
-        if len(global_top_scores) == 0:
+                conn.close()
+            return results
+        except Exception as e:
+            print(f"[search_db] Error: {e}")
             return []
-            
-        final_top_args = np.argsort(global_top_scores)[-top_k:][::-1]
-        final_indices = global_top_indices[final_top_args]
-        
-        results = []
-        conn = sqlite3.connect('recipes.db')
-        cursor = conn.cursor()
-        
-        for idx in final_indices:
-            if idx < len(recipe_ids):
-                r_id = recipe_ids[idx]
-                cursor.execute('SELECT name, description, cuisine, ingredients, instructions FROM recipes WHERE id = ?', (r_id,))
-                row = cursor.fetchone()
-                if row:
-                    results.append({
-                        'name': row[0],
-                        'description': row[1],
-                        'cuisine': row[2],
-                        'ingredients': row[3],
-                        'instructions': row[4]
-                    })
-        
-        conn.close()
-        return results
-    except Exception as e:
-        print(f"[search_db] Error: {e}")
-        return []
 
-def hybrid_search_db(query, top_k=10):
-    """Hybrid search using both TF-IDF and embeddings."""
-    if not models_loaded:
-        print("[hybrid_search_db] Models not loaded, returning empty.")
-        return []
+def _tfidf_search(query, index, top_k=10, deadline=None, coverage=None):
+    """Sparse leg fallback: hashed TF-IDF scores from the shards of an index version. Returns recipe ids.
     
-    print(f"[hybrid_search_db] Called with query: {query}")
+    The fraction of rows searched before the deadline goes into coverage['keyword'].
+    """
+    with span('sparse_transform'):
+        if hasattr(index.tfidf_vectorizer, 'transform_query'):
+            query_vec = index.tfidf_vectorizer.transform_query(query)
+        else:
+            # Plain HashingVectorizer from fix_pkl.py
+            query_vec = index.tfidf_vectorizer.transform([query])
+    with span('sparse_scan'):
+        result = index.coordinator.search(query_vec=query_vec, top_k=top_k, deadline=deadline)
+    if result['partial']:
+        print(f"[_tfidf_search] Partial result: {result['coverage']:.0%} of rows searched, "
+              f"{len(result['failed'])}/{result['shards']} shards missing")
+        PARTIAL_RESULTS.inc(leg='keyword')
+    if coverage is not None:
+        coverage['keyword'] = result['coverage']
+    return [r_id for r_id, _ in result['sparse']]
+
+# Worker threads for the hybrid search stages; encoding, numpy scoring and SQLite release the GIL
+search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='search')
+
+def _submit(fn, *args):
+    """Run fn on search_executor in a copy of this context, so its spans join the request trace."""
+    return search_executor.submit(contextvars.copy_context().run, fn, *args)
+
+def _keyword_leg(query, index, deadline=None, coverage=None, top_k=10):
+    """Keyword candidates: FTS5 bm25 if the DB has recipes_fts, else the TF-IDF chunks.
     
-    # 1. TF-IDF Search (from chunks)
-    tfidf_results = []
-    if tfidf_vectorizer:
+    Either is bounded by the deadline; the fraction searched goes into coverage['keyword'].
+    """
+    if keyword_index_available:
+        report = {}
         try:
-            from scipy import sparse
-            query_vec = tfidf_vectorizer.transform([query])
-            
-            # Load and search TF-IDF chunks
-            global_tfidf_scores = []
-            global_tfidf_indices = []
-            
-            for i in range(num_chunks):
-                tfidf_chunk_path = os.path.join(chunks_dir, f'tfidf_chunk_{i}.npz')
-                if not os.path.exists(tfidf_chunk_path):
-                    continue
-                
-                chunk_matrix = sparse.load_npz(tfidf_chunk_path)
-                scores = cosine_similarity(query_vec, chunk_matrix)[0]
-                
-                # Get top candidates from this chunk
-                k_chunk = min(top_k, len(scores))
-                chunk_top_indices = np.argsort(scores)[-k_chunk:][::-1]
-                chunk_top_scores = scores[chunk_top_indices]
-                
-                # Map to global indices
-                global_indices = (i * chunk_size) + chunk_top_indices
-                
-                global_tfidf_scores.extend(chunk_top_scores)
-                global_tfidf_indices.extend(global_indices)
-                
-                del chunk_matrix, scores
-            
-            # Get top 10 overall from TF-IDF (keep as list to preserve order)
-            if len(global_tfidf_scores) > 0:
-                global_tfidf_scores = np.array(global_tfidf_scores)
-                global_tfidf_indices = np.array(global_tfidf_indices)
-                
-                final_top_args = np.argsort(global_tfidf_scores)[-10:][::-1]
-                final_indices = global_tfidf_indices[final_top_args]
-                tfidf_results = final_indices.tolist()  # Keep as list to preserve order
-                print(f"[hybrid_search_db] TF-IDF found {len(tfidf_results)} candidates")
+            with span('keyword_fts'):
+                conn = sqlite3.connect('recipes.db')
+                try:
+                    keyword_results = [r_id for r_id, _ in keyword_search(conn, query, top_k=top_k, deadline=deadline,
+                                                                          report=report)]
+                finally:
+                    conn.close()
+            if report['coverage'] < 1.0:
+                PARTIAL_RESULTS.inc(leg='keyword')
+                print(f"[hybrid_search_db] FTS5 partial result: {report['coverage']:.0%} of recipes searched")
+            print(f"[hybrid_search_db] FTS5 found {len(keyword_results)} candidates")
+            return keyword_results
+        except Exception as e:
+            print(f"[hybrid_search_db] FTS5 error: {e}")
+        finally:
+            if coverage is not None:
+                coverage['keyword'] = report.get('coverage', 0.0)
+    elif index is not None and index.tfidf_vectorizer:
+        try:
+            keyword_results = _tfidf_search(query, index, top_k=top_k, deadline=deadline, coverage=coverage)
+            print(f"[hybrid_search_db] TF-IDF found {len(keyword_results)} candidates")
+            return keyword_results
         except Exception as e:
             print(f"[hybrid_search_db] TF-IDF error: {e}")
-    
-    # 2. Embedding Search
-    embedding_results = []
+    return []
+
+def _embedding_leg(query, index, deadline=None, coverage=None, top_k=10):
+    """Dense candidates: encode the query, then top-k over the shards (most promising first until the deadline)."""
+    if coverage is not None:
+        coverage['embedding'] = 0.0
     try:
-        query_emb = encoder.encode([query])
-        
-        global_top_scores = []
-        global_top_indices = []
-        
-        for i in range(num_chunks):
-            if i % 10 == 0:
-                print(f"[hybrid_search_db] Processing chunk {i+1}/{num_chunks}...")
-            
-            chunk_path = os.path.join(chunks_dir, f'emb_chunk_{i}.npy')
-            if not os.path.exists(chunk_path):
-                continue
-                
-            chunk_emb = np.load(chunk_path)
-            sims = cosine_similarity(query_emb, chunk_emb)[0]
-            
-            k_chunk = min(top_k, len(sims))
-            chunk_top_indices = np.argsort(sims)[-k_chunk:][::-1]
-            chunk_top_scores = sims[chunk_top_indices]
-            
-            global_indices = (i * chunk_size) + chunk_top_indices
-            
-            global_top_scores.extend(chunk_top_scores)
-            global_top_indices.extend(global_indices)
-            
-            del chunk_emb, sims
-        
-        global_top_scores = np.array(global_top_scores)
-        global_top_indices = np.array(global_top_indices)
+        if index is None:
+            raise RuntimeError("embedding index not loaded")
+        if deadline is not None and isinstance(encoder, BackgroundEncoder):
+            # Don't wait past the deadline for an encoder that is still loading
+            encoder.wait(max(0.0, deadline - time.monotonic()))
+        with span('query_encode'):
+            query_emb = encoder.encode([query])
         
-        if len(global_top_scores) > 0:
-            final_top_args = np.argsort(global_top_scores)[-10:][::-1]
-            final_indices = global_top_indices[final_top_args]
-            embedding_results = final_indices.tolist()  # Keep as list to preserve order
+        with span('dense_scan'):
+            result = index.coordinator.search(query_emb=query_emb, top_k=top_k, deadline=deadline)
+        if coverage is not None:
+            coverage['embedding'] = result['coverage']
+        if result['partial']:
+            print(f"[hybrid_search_db] Partial result: {result['coverage']:.0%} of rows searched, "
+                  f"{len(result['failed'])}/{result['shards']} shards missing")
+            PARTIAL_RESULTS.inc(leg='embedding')
+        embedding_results = [r_id for r_id, _ in result['dense']]
+        if embedding_results:
             print(f"[hybrid_search_db] Embeddings found {len(embedding_results)} candidates")
+        return embedding_results
     except Exception as e:
         print(f"[hybrid_search_db] Embedding error: {e}")
+        return []
+
+def _query_pantry(query):
+    """Pantry ingredients named in query; empty when none is a known ingredient, so plain searches keep their ranking."""
+    return pantry_scorer.known(parse_pantry(query)) if pantry_scorer is not None else []
+
+def _pantry_leg(pantry, top_k=10):
+    try:
+        with span('pantry_rank'):
+            pantry_matches = pantry_scorer.rank(pantry, top_k=top_k, max_missing=PANTRY_MAX_MISSING)
+        print(f"[hybrid_search_db] Pantry {pantry}: {len(pantry_matches)} coverage matches added")
+        return [r_id for r_id, _, _ in pantry_matches]
+    except Exception as e:
+        print(f"[hybrid_search_db] Pantry error: {e}")
+        return []
+
+@span('hydrate')
+def _hydrate_rows(ids, cluster_column):
+    """{id: (name, description, cuisine, ingredients, instructions, cluster)} in one IN query."""
+    if not ids:
+        return {}
+    conn = sqlite3.connect('recipes.db')
+    placeholders = ','.join('?' * len(ids))
+    rows = conn.execute(
+        f'SELECT id, name, description, cuisine, ingredients, instructions, {cluster_column} '
+        f'FROM recipes WHERE id IN ({placeholders})', [int(r_id) for r_id in ids]).fetchall()
+    conn.close()
+    return {row[0]: row[1:] for row in rows}
+
+@span('hybrid_search')
+def hybrid_search_db(query, top_k=10, deadline=DEFAULT_DEADLINE, report=None):
+    """Hybrid search using both keyword (FTS5 or TF-IDF) and embeddings.
+    
+    The keyword, embedding and pantry legs run concurrently, and each leg's
+    candidates are hydrated from SQLite as soon as it finishes, so latency
+    follows the slowest leg instead of the sum. Both legs search the index
+    version that was active when the call started.
+    
+    deadline (a time.monotonic() value, None for none, default
+    SEARCH_DEADLINE_SECONDS from now) bounds the shard scans and the FTS5
+    query: the legs return the best candidates found by then. If given, report is filled
+    with {'partial': bool, 'coverage': {leg: fraction of rows searched}}.
+    """
+    if deadline is DEFAULT_DEADLINE:
+        deadline = request_deadline(None, SEARCH_DEADLINE_SECONDS)
+    coverage = {}
+    with index_manager.acquire() as index:
+        if index is None and not keyword_index_available:
+            print("[hybrid_search_db] Models not loaded, returning empty.")
+            return []
+        
+        print(f"[hybrid_search_db] Called with query: {query}")
+        start = time.perf_counter()
+        cluster_column = 'cluster_id' if recipe_clusters_available else 'id'
+        
+        # 1-2. Keyword and embedding legs (plus the pantry leg) in parallel
+        pantry = _query_pantry(query)
+        legs = {_submit(_keyword_leg, query, index, deadline, coverage): 'keyword',
+                _submit(_embedding_leg, query, index, deadline, coverage): 'embedding'}
+        if pantry:
+            legs[_submit(_pantry_leg, pantry)] = 'pantry'
+        
+        # Hydrate each leg's new candidates while the other legs are still running
+        candidates = {}
+        hydrations = []
+        requested = set()
+        for future in as_completed(legs):
+            ids = future.result()
+            candidates[legs[future]] = ids
+            new_ids = [r_id for r_id in dict.fromkeys(ids) if r_id not in requested]
+            requested.update(new_ids)
+            hydrations.append(_submit(_hydrate_rows, new_ids, cluster_column))
+    keyword_results = candidates['keyword']
+    embedding_results = candidates['embedding']
+    if report is not None:
+        report['partial'] = any(fraction < 1.0 for fraction in coverage.values())
+        report['coverage'] = {leg: round(fraction, 3) for leg, fraction in coverage.items()}
     
     # 3. Combine top 10 from each (already sorted by score)
-    final_indices = tfidf_results + embedding_results
-    print(f"[hybrid_search_db] Taking {len(tfidf_results)} from TF-IDF + {len(embedding_results)} from embeddings = {len(final_indices)} total")
+    final_ids = keyword_results + embedding_results
+    print(f"[hybrid_search_db] Taking {len(keyword_results)} from keyword + {len(embedding_results)} from embeddings = {len(final_ids)} total")
     
-    if len(final_indices) == 0:
+    # 4. Pantry stage: add best-covered recipes, then order everything by missing ingredients
+    pantry_info = {}
+    if pantry:
+        try:
+            final_ids = candidates['pantry'] + final_ids
+            
+            candidate_ids = list(dict.fromkeys(final_ids))
+            coverage, missing = pantry_scorer.score_candidates(candidate_ids, pantry)
+            pantry_info = {r_id: (float(c), float(m)) for r_id, c, m in zip(candidate_ids, coverage, missing)}
+            # Stable sort keeps the retriever order among recipes missing the same number
+            final_ids = sorted(candidate_ids, key=lambda r_id: pantry_info[r_id][1])
+        except Exception as e:
+            print(f"[hybrid_search_db] Pantry error: {e}")
+    
+    rows = {}
+    for hydration in hydrations:
+        try:
+            rows.update(hydration.result())
+        except Exception as e:
+            print(f"[hybrid_search_db] Hydration error: {e}")
+    
+    if len(final_ids) == 0:
         return []
     
-    # 4. Retrieve from DB (with deduplication)
+    # 5. Assemble in ranked order (with deduplication; near-duplicates collapse to one per cluster)
     results = []
     seen_ids = set()
-    conn = sqlite3.connect('recipes.db')
-    cursor = conn.cursor()
+    seen_clusters = set()
     
-    for idx in final_indices:
-        if idx < len(recipe_ids):
-            r_id = recipe_ids[idx]
-            if r_id in seen_ids:
+    for r_id in final_ids:
+        if r_id in seen_ids:
+            continue
+        seen_ids.add(r_id)
+        
+        row = rows.get(r_id)
+        if row:
+            cluster_id = row[5] if row[5] is not None else r_id
+            if cluster_id in seen_clusters:
                 continue
-            seen_ids.add(r_id)
-            
-            cursor.execute('SELECT name, description, cuisine, ingredients, instructions FROM recipes WHERE id = ?', (r_id,))
-            row = cursor.fetchone()
-            if row:
-                results.append({
-                    'name': row[0],
-                    'description': row[1],
-                    'cuisine': row[2],
-                    'ingredients': row[3],
-                    'instructions': row[4]
-                })
+            seen_clusters.add(cluster_id)
+            result = {
+                'name': row[0],
+                'description': row[1],
+                'cuisine': row[2],
+                'ingredients': row[3],
+                'instructions': row[4]
+            }
+            if r_id in pantry_info:
+                coverage, missing = pantry_info[r_id]
+                result['pantry_coverage'] = round(coverage, 3)
+                result['missing_count'] = int(missing) if np.isfinite(missing) else None
+            results.append(result)
     
-    conn.close()
-    print(f"[hybrid_search_db] Returning {len(results)} unique recipes")
+    print(f"[hybrid_search_db] Returning {len(results)} unique recipes in {(time.perf_counter() - start) * 1000:.0f} ms")
     return results
 
+@span('rank_recipes')
+def rank_recipes(query, index, depth=RECIPES_SEARCH_DEPTH, deadline=None):
+    """Ranked recipe ids for query from the keyword, embedding and pantry legs (depth each).
+    
+    Returns (ids, pantry_info {id: (coverage, missing)}, retrieval {'partial', 'coverage'}).
+    Legs are fused by reciprocal rank; with a pantry in the query, recipes
+    missing fewer ingredients come first, as in hybrid_search_db. index is
+    the IndexVersion the caller holds (index_manager.acquire()).
+    """
+    coverage = {}
+    pantry = _query_pantry(query)
+    legs = {_submit(_keyword_leg, query, index, deadline, coverage, depth): 'keyword',
+            _submit(_embedding_leg, query, index, deadline, coverage, depth): 'embedding'}
+    if pantry:
+        legs[_submit(_pantry_leg, pantry, depth)] = 'pantry'
+    candidates = {legs[future]: future.result() for future in as_completed(legs)}
+    
+    try:
+        ranked, pantry_info = fuse_candidates(candidates, pantry, pantry_scorer)
+    except Exception as e:
+        print(f"[rank_recipes] Pantry error: {e}")
+        ranked, pantry_info = fuse_candidates(candidates)
+    retrieval = {'partial': any(fraction < 1.0 for fraction in coverage.values()),
+                 'coverage': {leg: round(fraction, 3) for leg, fraction in coverage.items()}}
+    return ranked, pantry_info, retrieval
+
+@span('filter')
+def _filter_rows(ids, cluster_column):
+    """{id: (cuisine, category, cluster)} for the candidates, in one IN query."""
+    if not ids:
+        return {}
+    conn = sqlite3.connect('recipes.db')
+    try:
+        return filter_rows(conn, ids, cluster_column)
+    finally:
+        conn.close()
+
+@span('hydrate')
+def hydrate_recipes(ids):
+    """Full recipe payloads for ids, in order (recipe_search.recipe_payloads on recipes.db)."""
+    if not ids:
+        return []
+    conn = sqlite3.connect('recipes.db')
+    try:
+        return recipe_payloads(conn, ids, step_timers_available)
+    finally:
+        conn.close()
+
+# Ranked candidate lists by snapshot id, for paging /recipes/search
+search_snapshots = SearchSnapshots(RECIPES_CACHE_SIZE, RECIPES_CACHE_SECONDS)
+
+def search_recipes(query, filters=None, limit=RECIPES_PAGE_SIZE, cursor=None, deadline=None):
+    """One page of ranked database recipes: {'recipes', 'next_cursor', 'total', 'retrieval'}.
+    
+    filters: cuisine, category, max_missing (pantry queries only). cursor
+    comes from a previous page's next_cursor for the same query and filters
+    (ValueError otherwise; CursorExpired once the index version changed or
+    its list cannot be reproduced). The filtered candidate list is ranked
+    once per search and kept in search_snapshots, so a page is usually just
+    hydrate_recipes() on its ids; a page landing on another worker ranks
+    the same list again.
+    """
+    filters = filters or {}
+    with index_manager.acquire() as index:
+        # The version is read from the index this request holds, so a snapshot is never ranked on one version
+        # and labelled with another
+        version = index.name if index is not None else None
+        return search_snapshots.page(query, filters, version,
+                                     lambda budget: rank_candidates(query, filters, index, budget),
+                                     hydrate_recipes, limit, cursor, deadline)
+
+def rank_candidates(query, filters, index, deadline=None):
+    """(visible ids, pantry_info, retrieval) for search_recipes: ranked, filtered, one recipe per cluster.
+    
+    Ranks RECIPES_SEARCH_DEPTH candidates per leg; filtering and near-duplicate
+    collapse take one light IN query.
+    """
+    ranked, pantry_info, retrieval = rank_recipes(query, index, RECIPES_SEARCH_DEPTH, deadline)
+    
+    cluster_column = 'cluster_id' if recipe_clusters_available else 'id'
+    visible, pantry_info = visible_candidates(ranked, _filter_rows(ranked, cluster_column), filters, pantry_info)
+    return visible, pantry_info, retrieval
+
+def wait_until_loaded():
+    """Block until this process's encoder load has finished (or failed); used by bench_startup."""
+    if isinstance(encoder, BackgroundEncoder):
+        try:
+            encoder.wait()
+        except Exception as e:
+            print(f"[WARNING] {e}")
+
+def update_index():
+    """serve.py parent: apply a pending admin reload/rollback, else load a newer published version.
+    
+    Runs on SIGHUP (sent by the admin endpoints) and every INDEX_WATCH_SECONDS.
+    Returns True if the active version changed; serve.py then shares its
+    arrays and re-forks the workers, so every worker serves the same version.
+    """
+    before = index_manager.active
+    request_file = os.path.join(index_manager.versions_dir, SWAP_REQUEST_FILE)
+    try:
+        with open(request_file) as f:
+            swap = json.load(f)
+        os.remove(request_file)
+    except (OSError, ValueError):
+        swap = None
+    try:
+        if swap is None:
+            index_manager.check_for_new_version(background=False)
+        elif swap.get('action') == 'rollback':
+            index_manager.rollback(background=False)
+        else:
+            index_manager.reload(swap.get('version'), background=False)
+    except LookupError as e:
+        print(f"[index] {e}")
+    return index_manager.active is not before
+
+def _request_swap(action, version=None):
+    """Worker under serve.py: hand a reload/rollback to the parent, which loads it once and re-forks all workers."""
+    os.makedirs(index_manager.versions_dir, exist_ok=True)
+    request_file = os.path.join(index_manager.versions_dir, SWAP_REQUEST_FILE)
+    with open(f'{request_file}.{os.getpid()}', 'w') as f:
+        json.dump({'action': action, 'version': version}, f)
+    os.replace(f'{request_file}.{os.getpid()}', request_file)
+    os.kill(os.getppid(), signal.SIGHUP)
+
+def after_fork():
+    """Per-worker setup; serve.py calls this in each worker right after fork.
+    
+    Starts the encoder load (never done in the parent, see PREFORK_SERVER) and
+    replaces the search thread pool, whose threads did not survive the fork.
+    """
+    global search_executor
+    search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='search')
+    if isinstance(encoder, BackgroundEncoder):
+        encoder.start()
+
+# The active version's segment, set by share_index_memory() when running under serve.py
+shared_arrays = None
+
+def share_index_memory():
+    """Move the active version's large read-only index arrays into one shared-memory segment.
+    
+    serve.py calls this in the parent before forking workers, at startup and
+    after every version swap (update_index); a version's segment is released
+    when the parent closes that version.
+    """
+    global shared_arrays
+    index = index_manager.active
+    if index is None or getattr(index, 'shared_arrays', None) is not None:
+        return
+    arrays = {'recipe_ids': index.recipe_ids}
+    if index.dense_index.projected is not None:
+        arrays['projected'] = index.dense_index.projected
+    shared_arrays = index.shared_arrays = SharedArrays.create(arrays)
+    INDEX_MEMORY.set_function(lambda: shared_arrays.nbytes, index='shared_segment')
+    index.recipe_ids = shared_arrays['recipe_ids']
+    if 'projected' in arrays:
+        index.dense_index.projected = shared_arrays['projected']
+    for shard in index.coordinator.shards:
+        if isinstance(shard, LocalShard):
+            shard.recipe_ids = index.recipe_ids
+    print(f"[INFO] Shared index memory: {shared_arrays.nbytes / 1e6:.0f} MB ({', '.join(arrays)})")
+
+def fetch_recipes(ids):
+    """Hydrate recipe rows with one WHERE id IN (...) query, keeping the given order."""
+    if not ids:
+        return []
+    conn = sqlite3.connect('recipes.db')
+    placeholders = ','.join('?' * len(ids))
+    rows = conn.execute(
+        f'SELECT id, name, description, cuisine, ingredients, instructions FROM recipes WHERE id IN ({placeholders})',
+        list(ids)).fetchall()
+    conn.close()
+    by_id = {row[0]: row for row in rows}
+    return [{
+        'id': r_id,
+        'name': by_id[r_id][1],
+        'description': by_id[r_id][2],
+        'cuisine': by_id[r_id][3],
+        'ingredients': by_id[r_id][4],
+        'instructions': by_id[r_id][5]
+    } for r_id in ids if r_id in by_id]
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -399,7 +811,13 @@ def cook_with_ai():
         print(f"Error in /cook-with-ai: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Admin diagnostics: on-demand stack sampling and /search requests slower than SLOW_REQUEST_SECONDS
+sampling_profiler = SamplingProfiler()
+slow_requests = SlowRequestLog(float(os.environ.get('SLOW_REQUEST_SECONDS', SLOW_REQUEST_SECONDS)))
+
 @app.route('/search', methods=['POST'])
+@span('search_request')
+@slow_requests.watch(lambda: request.get_json(silent=True))
 def search():
     """Generate recipes using Embeddings + Mistral AI."""
     try:
@@ -409,6 +827,10 @@ def search():
 
         if not query:
             return jsonify({'success': False, 'error': 'No query provided'})
+        try:
+            deadline = request_deadline(data.get('deadline_ms'), SEARCH_DEADLINE_SECONDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
 
         if llm != "ollama":
             return jsonify({'success': False, 'error': 'Ollama not running. Start it with: ollama run mistral'}), 503
@@ -416,32 +838,36 @@ def search():
         print(f"[search] Searching for: {query}")
         print(f"[search] Dietary preference: {dietary_preference}")
 
-        # 1. Hybrid Search (TF-IDF + Embeddings)
-        # This will return up to 20 recipes (10 from TF-IDF + 10 from embeddings)
-        found_dishes = hybrid_search_db(query, top_k=10)
+        # 1. Hybrid Search (FTS5/TF-IDF + Embeddings)
+        # This will return up to 20 recipes (10 from keyword + 10 from embeddings)
+        retrieval = {}
+        found_dishes = hybrid_search_db(query, top_k=10, deadline=deadline, report=retrieval)
         
         if not found_dishes:
             print("[search] No matches found in DB.")
             return jsonify({'success': False, 'error': 'No matching recipes found in database.'})
         
         print(f"[search] Found {len(found_dishes)} matches in DB for enhancement.")
-        context_str = "I found these similar recipes in our database:\n\n"
-        for i, dish in enumerate(found_dishes):
-            context_str += f"Recipe {i+1}: {dish['name']} ({dish['cuisine']})\n"
-            context_str += f"Description: {dish['description']}\n"
-            context_str += f"Ingredients: {dish['ingredients']}\n"
-            context_str += f"Instructions: {dish['instructions']}\n"
-            context_str += "-" * 20 + "\n"
-
-        # Build dietary constraint for prompt
-        dietary_constraint = ""
-        if dietary_preference == 'vegetarian':
-            dietary_constraint = "IMPORTANT: Generate ONLY VEGETARIAN recipes. Do not include any meat, poultry, fish, or seafood."
-        elif dietary_preference == 'non-vegetarian':
-            dietary_constraint = "IMPORTANT: Generate ONLY NON-VEGETARIAN recipes that include meat, poultry, fish, or seafood."
-        
-        # 2. Generate DB-Enhanced Recipes
-        prompt = f"""You are a creative chef. A user wants recipes using ONLY these ingredients: "{query}" (plus basic pantry staples like salt, pepper, oil, water, sugar).
+        with span('prompt_build'):
+            context_str = "I found these similar recipes in our database:\n\n"
+            for i, dish in enumerate(found_dishes):
+                context_str += f"Recipe {i+1}: {dish['name']} ({dish['cuisine']})\n"
+                context_str += f"Description: {dish['description']}\n"
+                context_str += f"Ingredients: {dish['ingredients']}\n"
+                if dish.get('missing_count') is not None:
+                    context_str += f"Needs {dish['missing_count']} ingredient(s) beyond the user's list and staples\n"
+                context_str += f"Instructions: {dish['instructions']}\n"
+                context_str += "-" * 20 + "\n"
+
+            # Build dietary constraint for prompt
+            dietary_constraint = ""
+            if dietary_preference == 'vegetarian':
+                dietary_constraint = "IMPORTANT: Generate ONLY VEGETARIAN recipes. Do not include any meat, poultry, fish, or seafood."
+            elif dietary_preference == 'non-vegetarian':
+                dietary_constraint = "IMPORTANT: Generate ONLY NON-VEGETARIAN recipes that include meat, poultry, fish, or seafood."
+
+            # 2. Generate DB-Enhanced Recipes
+            prompt = f"""You are a creative chef. A user wants recipes using ONLY these ingredients: "{query}" (plus basic pantry staples like salt, pepper, oil, water, sugar).
 
 {dietary_constraint}
 
@@ -464,100 +890,182 @@ Your response MUST be a valid JSON array of recipe objects. Each object should h
 Do not include any text outside of the JSON array. The response should start with `[` and end with `]`.
 """
 
-        import requests
-        resp = requests.post('http://localhost:11434/api/generate', json={
-            'model': 'mistral',
-            'prompt': prompt,
-            'stream': False,
-            'temperature': 0.7,
-        }, timeout=180)
-
-        if resp.status_code != 200:
+        try:
+            with span('llm_request'):
+                result = ollama_call('/api/generate', {
+                    'model': 'mistral',
+                    'prompt': prompt,
+                    'stream': False,
+                    'temperature': 0.7,
+                }, timeout=180)
+        except urllib.error.HTTPError as e:
+            print(f"[search] Ollama returned HTTP {e.code}")
             return jsonify({'success': False, 'error': 'Failed to generate recipes from AI.'})
 
-        result = resp.json()
+        observe_ollama(result)
         llm_output = result.get('response', '').strip()
 
-        recipes = _parse_mistral_recipe_list(llm_output)
+        with span('parse'):
+            recipes = _parse_mistral_recipe_list(llm_output)
         
         if not recipes:
+            PARSE_FAILURES.inc()
             return jsonify({'success': False, 'error': 'Failed to parse AI-generated recipes.'})
 
-        def normalize_instructions(instructions):
-            """Ensure instructions are a flat list of single steps."""
-            if isinstance(instructions, str):
-                instructions = [instructions]
-            
-            normalized = []
-            for item in instructions:
-                if not item or not isinstance(item, str):
-                    continue
-                
-                # 1. Split by newlines first
-                lines = item.split('\n')
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # 2. Split by numbered patterns (e.g. "1. Step", "2) Step")
-                    # Split before number at start of line or in middle
-                    # (?<!\d) ensures we don't split 1.5
-                    # (?=\d+[\.\)]\s+) lookahead for "1. " or "1) "
-                    parts = re.split(r'(?<!\d)(?=\d+[\.\)]\s+)', line)
-                    
-                    for part in parts:
-                        part = part.strip()
-                        if not part:
-                            continue
-                            
-                        # 3. Split by sentence boundaries
-                        # Look for punctuation [.!?] followed by whitespace and a Capital letter
-                        # This handles "Cook pasta. Drain it." -> "Cook pasta.", "Drain it."
-                        sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', part)
-                        
-                        for sentence in sentences:
-                            sentence = sentence.strip()
-                            
-                            # Remove leading numbers/bullets (e.g. "1.", "1)", "-")
-                            sentence = re.sub(r'^[\d\-\*\•]+[\.\)\:]?\s*', '', sentence)
-                            
-                            if len(sentence) > 3:
-                                # Ensure it ends with punctuation
-                                if not sentence[-1] in '.!?':
-                                    sentence += '.'
-                                normalized.append(sentence)
-            
-            return normalized if normalized else ["Follow the recipe instructions."]
-
-        for i, recipe in enumerate(recipes):
-            recipe['id'] = f"ai-{i}"
+        with span('normalize'):
+            for i, recipe in enumerate(recipes):
+                recipe['id'] = f"ai-{i}"
             
-            # Normalize instructions
-            raw_instructions = recipe.get('instructions', [])
-            recipe['instructions'] = normalize_instructions(raw_instructions)
-            
-            parsed_steps = []
-            for j, instruction in enumerate(recipe['instructions']):
-                timers = re.findall(r'(\d+)\s*min', instruction)
-                parsed_steps.append({
-                    'step_number': j + 1,
-                    'text': instruction,
-                    'timers': [int(t) for t in timers],
-                    'has_timer': bool(timers)
-                })
-            recipe['parsed_steps'] = parsed_steps
+                # Flat list of single steps, then per-step timers (instructions.py)
+                recipe['instructions'] = normalize_instructions(recipe.get('instructions', []))
+                recipe['parsed_steps'] = parsed_steps(recipe['instructions'])
         
         session['recipes'] = recipes
 
-        return jsonify({'success': True, 'recipes': recipes})
+        return jsonify({'success': True, 'recipes': recipes, 'retrieval': retrieval})
 
     except Exception as e:
         print(f"[search] ERROR: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/similar/<int:recipe_id>')
+def similar(recipe_id):
+    """Recipes most like recipe_id, from the precomputed kNN graph."""
+    if neighbor_graph is None:
+        return jsonify({'success': False, 'error': 'Similar recipes not available. Run knn.py first.'}), 503
+    
+    k = max(1, min(request.args.get('k', 10, type=int), neighbor_graph.k))
+    neighbours = neighbor_graph.similar(recipe_id, k=k)
+    if not neighbours and neighbor_graph.row(recipe_id) is None:
+        return jsonify({'success': False, 'error': f'Recipe {recipe_id} is not in the index'}), 404
+    
+    similarity = dict(neighbours)
+    recipes = fetch_recipes([r_id for r_id, _ in neighbours])
+    for recipe in recipes:
+        recipe['similarity'] = round(similarity[recipe['id']], 3)
+    return jsonify({'success': True, 'recipe_id': recipe_id, 'recipes': recipes})
+
+@app.route('/recipes/search')
+@span('recipes_search_request')
+@slow_requests.watch(lambda: request.args.to_dict())
+def recipes_search():
+    """Ranked database recipes without the LLM, for showing real recipes while AI variants are generated.
+    
+    GET ?q=...&cuisine=&category=&max_missing=&limit=&cursor=&deadline_ms=
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'No query provided'}), 400
+    limit = max(1, min(request.args.get('limit', RECIPES_PAGE_SIZE, type=int), RECIPES_MAX_PAGE_SIZE))
+    filters = {name: request.args[name] for name in ('cuisine', 'category')
+               if request.args.get(name) and request.args[name] != 'all'}
+    max_missing = request.args.get('max_missing', type=int)
+    if max_missing is not None:
+        filters['max_missing'] = max_missing
+    try:
+        deadline = request_deadline(request.args.get('deadline_ms'), RECIPES_SEARCH_DEADLINE_SECONDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        page = search_recipes(query, filters, limit, request.args.get('cursor'), deadline)
+    except CursorExpired as e:
+        return jsonify({'success': False, 'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[recipes_search] ERROR: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'query': query, **page})
+
+@app.route('/metrics')
+def metrics():
+    """Stage latencies, counters and index memory in Prometheus text format."""
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def _admin_allowed():
+    """X-Admin-Token must match ADMIN_TOKEN; without ADMIN_TOKEN admin endpoints are closed.
+    
+    ADMIN_ALLOW_LOCALHOST=1 admits local clients without a token instead; only
+    for a server nothing proxies or tunnels to, since proxied requests arrive
+    from 127.0.0.1 too.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), token.encode('utf-8'))
+    if os.environ.get('ADMIN_ALLOW_LOCALHOST') == '1':
+        return request.remote_addr in ('127.0.0.1', '::1')
+    return False
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample all threads for ?seconds= (default 10) and return collapsed stacks for a flamegraph."""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    seconds = request.args.get('seconds', 10, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({'success': False, 'error': f'seconds must be in (0, {MAX_PROFILE_SECONDS}]'}), 400
+    try:
+        stacks, rounds = sampling_profiler.run(seconds, include_idle=request.args.get('idle') == '1')
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return collapsed(stacks), 200, {'Content-Type': 'text/plain; charset=utf-8', 'X-Profile-Samples': str(rounds)}
+
+@app.route('/admin/slow-requests')
+def admin_slow_requests():
+    """Most recent slow /search requests with parameters and per-stage timings."""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    return jsonify({'success': True, 'threshold_seconds': slow_requests.threshold,
+                    'requests': slow_requests.recent(request.args.get('limit', type=int))})
+
+@app.route('/admin/index')
+def admin_index():
+    """Active index version, versions still draining requests, available and previous versions."""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    return jsonify({'success': True, **index_manager.status()})
+
+@app.route('/admin/index/reload', methods=['POST'])
+def admin_index_reload():
+    """Load a published version ({"version": ...}, default the newest) in the background and swap it in."""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    version = (request.get_json(silent=True) or {}).get('version')
+    try:
+        if PREFORK_SERVER:
+            loading, _ = index_manager.resolve(version)
+            _request_swap('reload', loading)
+            return jsonify({'success': True, 'loading': loading, 'workers': 'restarting'}), 202
+        loading = index_manager.reload(version)
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    if loading is None:
+        return jsonify({'success': False, 'error': f'already loading {index_manager.loading}'}), 409
+    return jsonify({'success': True, 'loading': loading}), 202
+
+@app.route('/admin/index/rollback', methods=['POST'])
+def admin_index_rollback():
+    """Reload the previously active version and swap back to it."""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    try:
+        if PREFORK_SERVER:
+            loading = index_manager.previous()
+            if loading is None:
+                raise LookupError("no previous version to roll back to")
+            _request_swap('rollback')
+            return jsonify({'success': True, 'loading': loading, 'workers': 'restarting'}), 202
+        loading = index_manager.rollback()
+    except LookupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    if loading is None:
+        return jsonify({'success': False, 'error': f'already loading {index_manager.loading}'}), 409
+    return jsonify({'success': True, 'loading': loading}), 202
+
 if __name__ == "__main__":
+    # Not at import: serve.py must not fork with an `ollama run` child attached
+    ollama_process = start_ollama_model()
     print("\nStarting server on http://localhost:5000\n")
     app.run(host='0.0.0.0', port=5000, debug=False)
 
@@ -0,0 +1 @@
+"""Offline benchmarks. Run from the project root: python -m benchmarks.<name>"""
@@ -0,0 +1,108 @@
+# benchmarks/bench_dense_projection.py
+"""
+Projected-prefilter dense search: recall@10 vs exact, latency and memory per dimension
+
+Usage: python -m benchmarks.bench_dense_projection [--rows 500000] [--dims 32,64,96,128]
+Uses embeddings from model_chunks/ (via recipe_models.pkl) when present,
+otherwise synthetic anisotropic 384-dim vectors. Queries are perturbed
+corpus rows; exact results come from a full in-memory scan.
+"""
+
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from dense_index import DenseIndex, Projection, normalize_rows, top_k_desc, RERANK_CANDIDATES
+
+
+def synthetic_embeddings(rows, dim=384, latent=160, seed=0):
+    """Low-rank signal with a shared mean direction, like sentence-transformer output"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((latent, dim)).astype(np.float32)
+    scale = (1.0 / np.arange(1, latent + 1) ** 0.5).astype(np.float32)
+    mean = rng.standard_normal(dim).astype(np.float32)
+    emb = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 100000):
+        n = min(100000, rows - start)
+        z = rng.standard_normal((n, latent)).astype(np.float32) * scale
+        emb[start:start + n] = z @ basis + 0.5 * mean + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(emb)
+
+
+def model_embeddings(rows):
+    with open('recipe_models.pkl', 'rb') as f:
+        models = pickle.load(f)
+    parts, total = [], 0
+    for files in models['chunk_files']:
+        part = np.load(os.path.join(models['chunks_dir'], files['emb']))
+        parts.append(part)
+        total += len(part)
+        if total >= rows:
+            break
+    return normalize_rows(np.concatenate(parts)[:rows])
+
+
+def write_shards(tmp, emb, projection, shard_rows):
+    chunk_files, chunk_offsets = [], []
+    for i, start in enumerate(range(0, len(emb), shard_rows)):
+        part = emb[start:start + shard_rows]
+        files = {'emb': f'emb_chunk_{i}.npy', 'proj': f'proj_chunk_{i}.npy' if projection else None}
+        np.save(os.path.join(tmp, files['emb']), part)
+        if projection:
+            np.save(os.path.join(tmp, files['proj']), projection.project(part))
+        chunk_files.append(files)
+        chunk_offsets.append(start)
+    return chunk_files, chunk_offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--dims', default='32,64,96,128')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--candidates', type=int, default=RERANK_CANDIDATES)
+    args = parser.parse_args()
+
+    if os.path.exists('recipe_models.pkl'):
+        emb, source = model_embeddings(args.rows), 'model_chunks'
+    else:
+        emb, source = synthetic_embeddings(args.rows), 'synthetic'
+
+    rng = np.random.default_rng(1)
+    queries = normalize_rows(emb[rng.choice(len(emb), size=args.queries, replace=False)]
+                             + 0.05 * rng.standard_normal((args.queries, emb.shape[1])).astype(np.float32))
+    sample = emb[rng.choice(len(emb), size=min(len(emb), 200000), replace=False)]
+
+    exact, exact_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        exact.append(set(top_k_desc(emb @ q, 10).tolist()))
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+    print(f"📊 Dense search ({source}): {len(emb):,} x {emb.shape[1]}, {args.queries} queries, "
+          f"rerank {args.candidates}")
+    print(f"{'dims':>6} {'recall@10':>10} {'p50 ms':>8} {'p95 ms':>8} {'prefilter MB':>13}")
+    print(f"{'exact':>6} {1.0:>10.1%} {np.percentile(exact_ms, 50):>8.1f} {np.percentile(exact_ms, 95):>8.1f} "
+          f"{emb.nbytes / 1e6:>13.0f}")
+
+    for dims in [int(d) for d in args.dims.split(',')]:
+        projection = Projection.fit(sample, dims)
+        with tempfile.TemporaryDirectory() as tmp:
+            chunk_files, chunk_offsets = write_shards(tmp, emb, projection, 10000)
+            index = DenseIndex(tmp, chunk_files, chunk_offsets, projection, args.candidates)
+            hits, latencies = 0, []
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                rows, _ = index.search(q, top_k=10)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(truth & set(rows.tolist()))
+            print(f"{dims:>6} {hits / (10 * len(queries)):>10.1%} {np.percentile(latencies, 50):>8.1f} "
+                  f"{np.percentile(latencies, 95):>8.1f} {index.memory_bytes / 1e6:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
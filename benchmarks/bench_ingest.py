@@ -0,0 +1,83 @@
+# benchmarks/bench_ingest.py
+"""
+Ingest benchmark: default per-batch commits vs bulk-load mode
+
+Usage: python -m benchmarks.bench_ingest [--rows N] [--file data/RecipeNLG_dataset.csv]
+Without --file a synthetic RecipeNLG-shaped CSV is generated. Each mode loads
+into a fresh temporary DB; rows/sec and final DB size are compared. The
+default run also recreates the old idx_search index so it mirrors the
+previous schema.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+
+import sqlite3
+
+import pandas as pd
+
+import create_db
+
+WORDS = ['sugar', 'flour', 'butter', 'milk', 'eggs', 'vanilla', 'onion', 'garlic',
+         'chicken', 'rice', 'tomato', 'salt', 'pepper', 'oil', 'cumin', 'paneer']
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    """Write a CSV with RecipeNLG columns (title, ingredients, directions, NER)"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        ner = rng.sample(WORDS, rng.randint(3, 10))
+        records.append({
+            'title': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}",
+            'ingredients': str([f"{rng.randint(1, 4)} c. {w}" for w in ner]).replace("'", '"'),
+            'directions': str([' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 25))).capitalize() + '.'
+                               for _ in range(rng.randint(3, 8))]).replace("'", '"'),
+            'NER': str(ner).replace("'", '"'),
+        })
+    pd.DataFrame(records).to_csv(path, index=False)
+
+
+def run(mode_bulk, data_file, workdir):
+    db_file = os.path.join(workdir, f"bench_{'bulk' if mode_bulk else 'default'}.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(db_file, with_indexes=not mode_bulk)
+        if not mode_bulk:
+            conn = sqlite3.connect(db_file)
+            conn.execute('CREATE INDEX idx_search ON recipes(search_text)')
+            conn.close()
+        return create_db.files_to_database([data_file], db_file=db_file, clear_existing=True, bulk=mode_bulk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--file', default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        data_file = args.file
+        if not data_file:
+            data_file = os.path.join(workdir, 'synthetic.csv')
+            write_synthetic_csv(data_file, args.rows)
+
+        print(f"📊 Ingest benchmark: {os.path.basename(data_file)}")
+        print("=" * 60)
+        results = {}
+        for bulk in (False, True):
+            label = 'bulk' if bulk else 'previous'
+            stats = run(bulk, data_file, workdir)
+            results[label] = stats
+            print(f"{label:8s} {stats['rows']:>9,} rows  load {stats['rows'] / stats['load_seconds']:>8,.0f} rows/sec  "
+                  f"total {stats['total_seconds']:6.1f}s  DB {stats['db_size_mb']:7.1f} MB")
+        speedup = results['previous']['total_seconds'] / results['bulk']['total_seconds']
+        print("=" * 60)
+        print(f"Bulk speedup (incl. index build): {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
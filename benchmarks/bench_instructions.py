@@ -0,0 +1,83 @@
+# benchmarks/bench_instructions.py
+"""
+Step normalization + timer extraction per recipe, against NFR-3 (<10 ms per recipe)
+
+Usage: python -m benchmarks.bench_instructions [--db bench_data/100000/recipes.db] [--rows 100000]
+Recipes come from --db (stored instructions), else the RecipeNLG directions
+in data/, else synthetic RecipeNLG-shaped cells. Three paths are timed per
+recipe:
+  request-time  the regexes /search and dev_server.py used to run per request
+  ingest        instructions.ingest_steps (create_db.py, once per recipe)
+  from column   instructions.recipe_steps on stored instructions + step_timers
+Reported: mean, p99 and max per recipe and total throughput.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from benchmarks.bench_parsers import synthetic_rows
+from create_db import parse_instructions
+from instructions import ingest_steps, recipe_steps
+from test_instructions import legacy_normalize_instructions, legacy_parsed_steps
+from test_list_parser import corpus_samples
+
+NFR3_MS = 10.0
+
+
+def load_recipes(db_file, rows):
+    """[[step, ...]] as the ingest sees them"""
+    if db_file:
+        conn = sqlite3.connect(db_file)
+        cells = [r[0] for r in conn.execute('SELECT instructions FROM recipes ORDER BY id LIMIT ?', (rows,))]
+        conn.close()
+        return [cell.split('|') for cell in cells if cell]
+    cells = corpus_samples() or synthetic_rows(rows)[1::2]
+    return [steps for steps in (parse_instructions(cell) for cell in cells[:rows]) if steps]
+
+
+def _time_each(fn, items):
+    latencies = np.empty(len(items))
+    start = time.perf_counter()
+    for i, item in enumerate(items):
+        t0 = time.perf_counter()
+        fn(item)
+        latencies[i] = time.perf_counter() - t0
+    return latencies * 1000, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=None, help='recipes.db to read instructions from')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.db and not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+    recipes = load_recipes(args.db, args.rows)
+    stored = [ingest_steps(steps) for steps in recipes]
+    columns = [('|'.join(steps), step_timers) for steps, step_timers in stored]
+    timed = sum(1 for _, step_timers in stored if step_timers.strip('|'))
+    print(f"📊 Instruction normalization: {len(recipes):,} recipes, "
+          f"{sum(len(s) for s, _ in stored) / max(len(stored), 1):.1f} steps each, {timed / max(len(stored), 1):.0%} with a timer")
+
+    paths = [
+        ('request-time', lambda steps: legacy_parsed_steps(legacy_normalize_instructions(steps)), recipes),
+        ('ingest', ingest_steps, recipes),
+        ('from column', lambda row: recipe_steps(*row), columns),
+    ]
+    print(f"{'path':<14} {'mean ms':>9} {'p99 ms':>9} {'max ms':>9} {'recipes/s':>11}")
+    for label, fn, items in paths:
+        latencies, wall = _time_each(fn, items)
+        print(f"{label:<14} {latencies.mean():>9.4f} {np.percentile(latencies, 99):>9.4f} "
+              f"{latencies.max():>9.3f} {len(items) / wall:>11,.0f}")
+        worst = latencies.max()
+        status = '✅' if worst < NFR3_MS else '❌'
+        print(f"   {status} NFR-3: worst recipe {worst:.3f} ms (target < {NFR3_MS:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/bench_load.py
+"""
+End-to-end load test of /search at several concurrency levels
+
+Usage: python -m benchmarks.bench_load [--url http://127.0.0.1:5000/search] [--concurrency 1,4,16]
+       python -m benchmarks.bench_load --fake-ollama --llm-latency 2 --tokens-per-sec 300 --failure-rate 0.02
+With --fake-ollama a fake_ollama.py server runs inside this process on
+--ollama-port; start the app against it, e.g.
+    OLLAMA_URL=http://127.0.0.1:11434 python serve.py --workers 4
+Closed-loop clients post queries from --queries for --seconds per level.
+Reports requests/sec, latency percentiles and an error breakdown: HTTP
+status, transport errors (timeout / connection) and {'success': false}
+answers grouped by their error message.
+"""
+
+import argparse
+import itertools
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+import numpy as np
+
+from fake_ollama import FakeOllamaConfig, start_in_thread
+
+DEFAULT_QUERIES = ['chicken rice', 'paneer spinach', 'tomato pasta basil', 'potato onion', 'tofu ginger soy',
+                   'eggs cheese', 'lentils cumin', 'mushroom garlic']
+
+
+def post(url, payload, timeout):
+    """(outcome, seconds): outcome is 'ok' or an error category"""
+    data = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+        outcome = 'ok'
+        try:
+            answer = json.loads(body)
+            if isinstance(answer, dict) and answer.get('success') is False:
+                outcome = f"error: {str(answer.get('error'))[:60]}"
+        except ValueError:
+            outcome = 'invalid JSON body'
+    except urllib.error.HTTPError as e:
+        outcome = f'HTTP {e.code}'
+    except (socket.timeout, TimeoutError):
+        outcome = 'timeout'
+    except urllib.error.URLError as e:
+        outcome = 'timeout' if isinstance(e.reason, (socket.timeout, TimeoutError)) else 'connection error'
+    except OSError:
+        outcome = 'connection error'
+    return outcome, time.perf_counter() - start
+
+
+def run_level(url, payloads, clients, seconds, timeout):
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        local_outcomes, local_latencies = Counter(), []
+        while time.perf_counter() < stop_at:
+            outcome, elapsed = post(url, payloads[next(counter) % len(payloads)], timeout)
+            local_outcomes[outcome] += 1
+            if outcome == 'ok':
+                local_latencies.append(elapsed)
+        with lock:
+            outcomes.update(local_outcomes)
+            latencies.extend(local_latencies)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes, np.array(latencies) * 1000, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000/search')
+    parser.add_argument('--queries', default=','.join(DEFAULT_QUERIES), help='Comma-separated queries')
+    parser.add_argument('--dietary', default='all')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--timeout', type=float, default=200, help='Per-request client timeout')
+    parser.add_argument('--fake-ollama', action='store_true', help='Run fake_ollama.py in this process')
+    parser.add_argument('--ollama-port', type=int, default=11434)
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = None
+    if args.fake_ollama:
+        config = FakeOllamaConfig(args.llm_latency, args.tokens_per_sec, args.failure_rate, args.malformed_rate,
+                                  seed=0)
+        server, ollama_url = start_in_thread(config, port=args.ollama_port)
+        print(f"🤖 Fake Ollama on {ollama_url} (start the app with OLLAMA_URL={ollama_url})")
+
+    payloads = [{'query': q.strip(), 'dietary_preference': args.dietary}
+                for q in args.queries.split(',') if q.strip()]
+    print(f"📊 {args.url}: {len(payloads)} queries, {args.seconds:.0f}s per level")
+    print(f"{'clients':>8} {'requests':>9} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    try:
+        for clients in [int(c) for c in args.concurrency.split(',')]:
+            outcomes, latencies, wall = run_level(args.url, payloads, clients, args.seconds, args.timeout)
+            total = sum(outcomes.values())
+            errors = total - outcomes['ok']
+            p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0, 0, 0))
+            print(f"{clients:>8} {total:>9} {outcomes['ok'] / wall:>8.2f} {p50:>9.0f} {p95:>9.0f} {p99:>9.0f} "
+                  f"{errors:>7}")
+            for outcome, count in outcomes.most_common():
+                if outcome != 'ok':
+                    print(f"{'':>8}   {count:>6} x {outcome}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
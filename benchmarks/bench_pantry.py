@@ -0,0 +1,72 @@
+# benchmarks/bench_pantry.py
+"""
+Pantry-coverage ranking latency at corpus scale
+
+Usage: python -m benchmarks.bench_pantry [--recipes 2200000] [--ingredients 20000]
+Uses ingredient_postings.npz / pantry_matrix.npz when present, otherwise a
+synthetic Zipf-distributed recipe x ingredient matrix.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from ingredients import IngredientIndex, INGREDIENT_INDEX_FILE
+from pantry import PantryScorer, PANTRY_MATRIX_FILE
+
+
+def synthetic_scorer(num_recipes, num_ingredients, per_recipe=9, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(max(per_recipe - 5, 1), per_recipe + 6, size=num_recipes)
+    indptr = np.zeros(num_recipes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    cols = (rng.zipf(1.3, size=indptr[-1]) - 1) % num_ingredients
+    matrix = sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), cols, indptr),
+                               shape=(num_recipes, num_ingredients))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+
+    csc = matrix.tocsc()
+    names = np.array([f"ingredient {i}" for i in range(num_ingredients)])
+    index = IngredientIndex(names, np.arange(1, num_recipes + 1, dtype=np.int64),
+                            csc.indptr.astype(np.int64), csc.indices.astype(np.int32))
+    return PantryScorer(matrix, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=2200000)
+    parser.add_argument('--ingredients', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    if os.path.exists(INGREDIENT_INDEX_FILE) and os.path.exists(PANTRY_MATRIX_FILE):
+        scorer = PantryScorer.load(IngredientIndex.load(INGREDIENT_INDEX_FILE), PANTRY_MATRIX_FILE)
+        source = 'recipes.db artifacts'
+    else:
+        scorer = synthetic_scorer(args.recipes, args.ingredients)
+        source = 'synthetic'
+
+    names = scorer.ingredient_index.names.tolist()
+    rng = np.random.default_rng(1)
+    pantries = [[names[i] for i in rng.integers(0, min(200, len(names)), size=rng.integers(3, 9))]
+                for _ in range(args.queries)]
+
+    latencies = []
+    for pantry in pantries:
+        start = time.perf_counter()
+        scorer.rank(pantry, top_k=10, max_missing=3)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies = np.array(latencies)
+    print(f"📊 Pantry ranking ({source}): {scorer.matrix.shape[0]:,} recipes x "
+          f"{scorer.matrix.shape[1]:,} ingredients, {scorer.matrix.nnz:,} nnz")
+    print(f"   p50 {np.percentile(latencies, 50):.1f} ms   p95 {np.percentile(latencies, 95):.1f} ms   "
+          f"max {latencies.max():.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
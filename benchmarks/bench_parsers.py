@@ -0,0 +1,70 @@
+# benchmarks/bench_parsers.py
+"""
+Micro-benchmark: ingest list/instruction parsers, fast path vs previous chain
+
+Usage: python -m benchmarks.bench_parsers [--rows N]
+Uses data/RecipeNLG_dataset.csv when present, otherwise synthetic
+RecipeNLG-shaped rows.
+"""
+
+import argparse
+import random
+import time
+
+from create_db import parse_json_list, parse_instructions
+from test_list_parser import legacy_parse_json_list, legacy_parse_instructions, corpus_samples
+
+WORDS = ['sugar', 'flour', 'butter', 'milk', 'eggs', 'vanilla', 'onion', 'garlic',
+         'chicken', 'rice', 'tomato', 'salt', 'pepper', 'oil', 'cumin', 'paneer']
+
+
+def synthetic_rows(n, seed=0):
+    """RecipeNLG-style cells: JSON lists, Python literals and plain text"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        ingredients = [f"{rng.randint(1, 4)} c. {rng.choice(WORDS)}" for _ in range(rng.randint(4, 12))]
+        steps = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + '.'
+                 for _ in range(rng.randint(3, 8))]
+        if i % 4 == 3:
+            ingredients[0] = "Mom's " + ingredients[0]
+            rows.append(repr(ingredients))
+        else:
+            rows.append(str(ingredients).replace("'", '"'))
+        rows.append(str(steps).replace("'", '"') if i % 2 else repr(steps))
+    return rows
+
+
+def _time(fn, rows, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in rows:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = corpus_samples()[:args.rows] or synthetic_rows(args.rows // 2)
+    print(f"📊 Parser benchmark ({len(rows):,} cells)")
+    print("=" * 60)
+
+    for label, old, new in [
+        ('parse_json_list', legacy_parse_json_list, parse_json_list),
+        ('parse_instructions', legacy_parse_instructions, parse_instructions),
+    ]:
+        t_old = _time(old, rows)
+        t_new = _time(new, rows)
+        print(f"{label:20s} old {t_old / len(rows) * 1e6:7.1f} µs/row   "
+              f"new {t_new / len(rows) * 1e6:7.1f} µs/row   speedup {t_old / t_new:5.1f}x")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
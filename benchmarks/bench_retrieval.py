@@ -0,0 +1,270 @@
+# benchmarks/bench_retrieval.py
+"""
+Retrieval benchmark over a synthetic corpus: every index mode, one fixed query set
+
+Usage: python -m benchmarks.bench_retrieval [--rows 100000] [--queries 200] [--modes dense_exact,sparse]
+       python -m benchmarks.bench_retrieval --rows 1000000 --save-baseline benchmarks/baselines/1m.json
+       python -m benchmarks.bench_retrieval --rows 1000000 --baseline benchmarks/baselines/1m.json
+The corpus comes from benchmarks.synthetic (generated on first use under
+bench_data/<rows>). Each mode runs in a fresh process, so peak RSS is that
+mode's own. Reported per mode: latency p50/p95/p99, sequential QPS, peak
+RSS, recall@k against the exact result for the same leg, and target@k (how
+often the recipe a query was sampled from comes back).
+
+Modes: dense_exact, dense_projected, dense_anytime (shards most promising
+first, stopping --deadline-ms after the query), sparse (hashed TF-IDF),
+fts5, sharded (--shards local partitions behind the Coordinator), and search_db /
+hybrid_search_db / search_recipes (an uncached first page of /recipes/search), which
+import app.py in the corpus directory with the synthetic encoder (they need
+app.py's dependencies and skip otherwise).
+With --baseline, p95/QPS/RSS worse than --tolerance or recall lower by more
+than 0.01 is reported as a regression and the exit status is 1.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import HashedTextEncoder, generate, query_set
+
+MODES = ['dense_exact', 'dense_projected', 'dense_anytime', 'sparse', 'fts5', 'sharded', 'search_db', 'hybrid_search_db',
+         'search_recipes']
+# app.py functions return recipe dicts without ids, so their results are compared by name
+APP_MODES = ('search_db', 'hybrid_search_db', 'search_recipes')
+# Which mode is ground truth for recall@k; modes without one only report target@k
+EXACT = {'dense_projected': 'dense_exact', 'dense_anytime': 'dense_exact', 'sharded': 'dense_exact', 'search_db': 'dense_exact'}
+
+
+def open_mode(mode, config, shards, top_k, deadline_ms):
+    """search(query_text) -> recipe ids (index modes) or names (app modes), run inside the corpus dir"""
+    encoder = HashedTextEncoder(config['dim'], seed=config['seed'])
+    if mode in APP_MODES:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            import app
+        app.encoder = encoder
+        if mode == 'search_recipes':
+            def fn(text, top_k):
+                app.search_snapshots.clear()
+                return app.search_recipes(text, limit=top_k)['recipes']
+        else:
+            fn = getattr(app, mode)
+
+        def search(text):
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                return [r['name'] for r in fn(text, top_k=top_k)][:top_k]
+        return search
+
+    if mode == 'fts5':
+        from keyword_search import keyword_search
+        conn = sqlite3.connect('recipes.db', check_same_thread=False)
+        return lambda text: [r_id for r_id, _ in keyword_search(conn, text, top_k=top_k)]
+
+    from dense_index import DenseIndex, Projection
+    from shards import Coordinator, LocalShard
+    with open('recipe_models.pkl', 'rb') as f:
+        models_data = pickle.load(f)
+    recipe_ids = np.asarray(models_data['recipe_ids'], dtype=np.int64)
+
+    if mode == 'sharded':
+        projection = Projection.load(models_data['projection_file']) if models_data.get('projection_file') else None
+        parts = np.array_split(np.arange(len(models_data['chunk_files'])), shards)
+        coordinator = Coordinator([LocalShard.from_models(f'shard{i}', models_data, part.tolist(), projection)
+                                   for i, part in enumerate(parts) if len(part)], timeout=None)
+        return lambda text: [r_id for r_id, _ in coordinator.search(query_emb=encoder.encode([text]),
+                                                                     top_k=top_k)['dense']]
+    if mode == 'sparse':
+        shard = LocalShard('sparse', models_data['chunks_dir'], models_data['chunk_files'],
+                           models_data['chunk_offsets'], recipe_ids, cache_sparse=True)
+        vectorizer = models_data['tfidf_vectorizer']
+        return lambda text: [r_id for r_id, _ in shard.sparse_search(vectorizer.transform_query(text), top_k)]
+
+    if mode == 'dense_anytime':
+        index = DenseIndex.from_models(models_data)
+
+        def search(text):
+            deadline = time.monotonic() + deadline_ms / 1000
+            return recipe_ids[index.anytime_search(encoder.encode([text]), top_k, deadline)[0]].tolist()
+        return search
+
+    if mode == 'dense_projected':
+        index = DenseIndex.from_models(models_data)
+        if index.projected is None:
+            raise RuntimeError('corpus has no projected vectors (built with --proj-dims 0)')
+    else:
+        index = DenseIndex(models_data['chunks_dir'], models_data['chunk_files'], models_data['chunk_offsets'])
+    return lambda text: recipe_ids[index.search(encoder.encode([text]), top_k=top_k)[0]].tolist()
+
+
+def peak_rss():
+    """High-water RSS of this process in bytes (VmHWM resets on exec; ru_maxrss would not)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_mode(mode, data_dir, config, queries, top_k, shards, deadline_ms, warmup):
+    """Runs in a child process; returns raw latencies, results and peak RSS"""
+    os.chdir(data_dir)
+    try:
+        search = open_mode(mode, config, shards, top_k, deadline_ms)
+    except Exception as e:
+        return {'skipped': f'{type(e).__name__}: {e}'}
+    texts = [text for _, text in queries]
+    for text in texts[:warmup]:
+        search(text)
+    latencies, results = [], []
+    start = time.perf_counter()
+    for text in texts:
+        t0 = time.perf_counter()
+        results.append(search(text))
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - start
+    return {'latencies': latencies, 'results': results, 'wall': wall, 'peak_rss': peak_rss()}
+
+
+def recipe_names(data_dir, ids):
+    conn = sqlite3.connect(os.path.join(data_dir, 'recipes.db'))
+    names = {}
+    for start in range(0, len(ids), 500):
+        part = ids[start:start + 500]
+        rows = conn.execute(f"SELECT id, name FROM recipes WHERE id IN ({','.join('?' * len(part))})",
+                            part).fetchall()
+        names.update(rows)
+    conn.close()
+    return names
+
+
+def summarize(raw, queries, exact, names, top_k, by_name=False):
+    latencies = np.array(raw['latencies']) * 1000
+    results = raw['results']
+    targets = [names[r_id] if by_name else r_id for r_id, _ in queries]
+    summary = {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'qps': round(len(latencies) / raw['wall'], 2),
+        'peak_rss_mb': round(raw['peak_rss'] / 1e6, 1),
+        'target_at_k': round(float(np.mean([t in r for t, r in zip(targets, results)])), 4),
+        'recall_at_k': None,
+    }
+    if exact is not None:
+        recalls = []
+        for truth, got in zip(exact, results):
+            truth = [names[r] for r in truth] if by_name else truth
+            if truth:
+                recalls.append(len(set(truth[:top_k]) & set(got)) / len(truth[:top_k]))
+        summary['recall_at_k'] = round(float(np.mean(recalls)), 4) if recalls else None
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of results against a saved baseline"""
+    regressions = []
+    for mode, current in results.items():
+        previous = baseline['results'].get(mode)
+        if not previous or 'skipped' in current or 'skipped' in previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{mode}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current['qps'] < previous['qps'] * (1 - tolerance):
+            regressions.append(f"{mode}: QPS {previous['qps']:.1f} -> {current['qps']:.1f}")
+        if current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{mode}: peak RSS {previous['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB")
+        for key in ('recall_at_k', 'target_at_k'):
+            if previous.get(key) is not None and current.get(key) is not None \
+                    and current[key] < previous[key] - 0.01:
+                regressions.append(f"{mode}: {key} {previous[key]:.3f} -> {current[key]:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--data', default=None, help='Corpus directory (default bench_data/<rows>)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--shards', type=int, default=4, help='Partitions for the sharded mode')
+    parser.add_argument('--deadline-ms', type=float, default=2.0, help='Budget per query for dense_anytime')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--save-baseline', default=None, help='Write results as a JSON baseline')
+    parser.add_argument('--baseline', default=None, help='Compare against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative p95/QPS/RSS change')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data or os.path.join('bench_data', str(args.rows)))
+    config = generate(data_dir, args.rows, args.seed)
+    queries = query_set(data_dir, args.queries, args.seed)
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    # Ground-truth modes first
+    modes = sorted(modes, key=lambda m: m not in EXACT.values())
+    for needed in {EXACT[m] for m in modes if m in EXACT} - set(modes):
+        modes.insert(0, needed)
+
+    print(f"📊 Retrieval: {config['rows']:,} synthetic recipes, {len(queries)} queries, top {args.top_k}")
+    print(f"{'mode':<17} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'QPS':>8} {'peak MB':>8} "
+          f"{'recall':>7} {'target':>7}")
+    ctx = multiprocessing.get_context('spawn')
+    raw_results, results = {}, {}
+    names = None
+    for mode in modes:
+        with ctx.Pool(1) as pool:
+            raw = pool.apply(run_mode, (mode, data_dir, config, queries, args.top_k, args.shards, args.deadline_ms,
+                                        args.warmup))
+        if 'skipped' in raw:
+            results[mode] = {'skipped': raw['skipped']}
+            print(f"{mode:<17} skipped ({raw['skipped']})")
+            continue
+        raw_results[mode] = raw
+        exact = raw_results.get(EXACT.get(mode), {}).get('results')
+        if mode in APP_MODES and names is None:
+            wanted = {r_id for r_id, _ in queries} | {r for rows in (exact or []) for r in rows}
+            names = recipe_names(data_dir, sorted(wanted))
+        summary = summarize(raw, queries, exact, names, args.top_k, by_name=mode in APP_MODES)
+        results[mode] = summary
+        recall = '-' if summary['recall_at_k'] is None else f"{summary['recall_at_k']:.3f}"
+        print(f"{mode:<17} {summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+              f"{summary['qps']:>8.1f} {summary['peak_rss_mb']:>8.0f} {recall:>7} {summary['target_at_k']:>7.3f}")
+
+    report = {'config': {**config, 'queries': len(queries), 'top_k': args.top_k, 'shards': args.shards,
+                         'deadline_ms': args.deadline_ms},
+              'results': results}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"💾 Baseline saved: {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != report['config']:
+            print(f"❌ Baseline was recorded with a different setup: {baseline['config']}")
+            sys.exit(2)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the serving modules: import time, RSS and a -X importtime breakdown
+
+Usage: python -m benchmarks.bench_startup [--modules shards,pantry,sparse_weighting] [--runs 5]
+       python -m benchmarks.bench_startup --compare HEAD~1
+       python -m benchmarks.bench_startup --modules app --cwd bench_data/100000
+Each run imports --modules in a fresh `python -X importtime` process
+(from --cwd, with the tree on PYTHONPATH) and records the wall time of the
+imports and the RSS right after them; if a module has
+wait_until_loaded() (app.py's background encoder) the time and RSS once it
+returns are reported too. The fastest run is shown, with the top-level
+packages that took the most import time. --compare REV runs the same in a
+temporary git worktree of REV, for a before/after table.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+# What hybrid search needs at query time (app.py adds Flask and the encoder)
+RETRIEVAL_MODULES = ['shards', 'pantry', 'sparse_weighting', 'dense_index', 'keyword_search', 'ingredients',
+                     'knn', 'dedup', 'metrics']
+
+CHILD = r'''
+import json, sys, time
+def rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+start = time.perf_counter()
+modules = [__import__(name) for name in sys.argv[1].split(',')]
+report = {'import_seconds': time.perf_counter() - start, 'import_rss': rss()}
+for module in modules:
+    wait = getattr(module, 'wait_until_loaded', None)
+    if wait is not None:
+        wait()
+        report.update(ready_seconds=time.perf_counter() - start, ready_rss=rss())
+report['loaded'] = sorted({name.split('.')[0] for name in sys.modules if name.split('.')[0] in %r})
+print('@@' + json.dumps(report))
+'''
+
+HEAVY = ('torch', 'sentence_transformers', 'transformers', 'sklearn', 'scipy', 'pandas', 'requests')
+
+
+def parse_importtime(stderr):
+    """{top-level package: self seconds} from -X importtime output"""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        totals[name.split('.')[0]] += int(self_us) / 1e6
+    return dict(totals)
+
+
+def run_once(tree, modules, cwd):
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([tree, os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep)}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD % (HEAVY,), ','.join(modules)],
+                          cwd=cwd or tree, env=env, capture_output=True, text=True)
+    reports = [line[2:] for line in proc.stdout.splitlines() if line.startswith('@@')]
+    if proc.returncode != 0 or not reports:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'
+        return {'error': error}
+    return {**json.loads(reports[-1]), 'packages': parse_importtime(proc.stderr)}
+
+
+def measure(tree, modules, cwd, runs):
+    """Fastest of `runs` cold imports"""
+    results = [run_once(tree, modules, cwd) for _ in range(runs)]
+    ok = [r for r in results if 'error' not in r]
+    return min(ok, key=lambda r: r['import_seconds']) if ok else results[0]
+
+
+def git_worktree(rev, path):
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, rev], check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', default=','.join(RETRIEVAL_MODULES), help='Comma-separated modules to import')
+    parser.add_argument('--cwd', default=None, help='Directory to import from (app.py loads its data from here)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='Packages listed in the breakdown')
+    parser.add_argument('--compare', default=None, help='Git revision to measure as "before"')
+    args = parser.parse_args()
+
+    modules = [m for m in args.modules.split(',') if m]
+    cwd = os.path.abspath(args.cwd) if args.cwd else None
+    tree = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.compare:
+            before = os.path.join(tmp, 'before')
+            git_worktree(args.compare, before)
+            try:
+                results[args.compare] = measure(before, modules, cwd, args.runs)
+            finally:
+                subprocess.run(['git', 'worktree', 'remove', '--force', before], capture_output=True)
+        results['working tree'] = measure(tree, modules, cwd, args.runs)
+
+    print(f"📊 Cold import of {', '.join(modules)} (best of {args.runs})")
+    print(f"{'tree':<14} {'import s':>9} {'RSS MB':>8} {'ready s':>8} {'ready MB':>9}  heavy packages loaded")
+    for label, r in results.items():
+        if 'error' in r:
+            print(f"{label:<14} failed: {r['error']}")
+            continue
+        ready = (f"{r['ready_seconds']:>8.2f} {r['ready_rss'] / 1e6:>9.0f}" if 'ready_seconds' in r
+                 else f"{'-':>8} {'-':>9}")
+        print(f"{label:<14} {r['import_seconds']:>9.2f} {r['import_rss'] / 1e6:>8.0f} {ready}  "
+              f"{', '.join(r['loaded']) or 'none'}")
+    for label, r in results.items():
+        if 'error' in r:
+            continue
+        top = sorted(r['packages'].items(), key=lambda item: -item[1])[:args.top]
+        print(f"\n⏱️  Import time by top-level package ({label}):")
+        for name, seconds in top:
+            print(f"   {name:<28} {seconds * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
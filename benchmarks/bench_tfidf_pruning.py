@@ -0,0 +1,103 @@
+# benchmarks/bench_tfidf_pruning.py
+"""
+Hashed TF-IDF before/after DF weighting and pruning
+
+Usage: python -m benchmarks.bench_tfidf_pruning [--docs 100000] [--queries 500]
+Samples search_text from recipes.db when present, otherwise generates a
+synthetic Zipf-distributed corpus. Each recipe's name is used as a query for
+its own row, giving recall@10; index size (RAM = loaded CSR arrays, npz =
+compressed shard file), nnz touched per query and query latency are
+reported for the plain HashingVectorizer and the weighted one.
+"""
+
+import argparse
+import io
+import os
+import sqlite3
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from sparse_weighting import DocumentFrequencies, WeightedHashingVectorizer
+
+
+def synthetic_corpus(n, vocab=20000, seed=0):
+    """(names, texts): Zipf body words, instruction boilerplate, distinctive names"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f'w{i}' for i in range(vocab)])
+    boilerplate = 'preheat oven to 350 degrees salt and pepper to taste stir well'
+    names, texts = [], []
+    for _ in range(n):
+        name = ' '.join(words[rng.integers(vocab // 10, vocab, size=3)])
+        body = ' '.join(words[(rng.zipf(1.2, size=rng.integers(40, 200)) - 1) % vocab])
+        names.append(name)
+        texts.append(f'{name} {body} {boilerplate}')
+    return names, texts
+
+
+def db_corpus(n, db_file='recipes.db'):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute('SELECT name, search_text FROM recipes ORDER BY RANDOM() LIMIT ?', (n,)).fetchall()
+    conn.close()
+    return [r[0] or '' for r in rows], [r[1] or '' for r in rows]
+
+
+def npz_bytes(matrix):
+    buf = io.BytesIO()
+    sparse.save_npz(buf, matrix)
+    return buf.tell()
+
+
+def evaluate(label, vectorizer, matrix, names, query_rows):
+    column_nnz = np.diff(matrix.tocsc().indptr)
+    hits, touched, latencies = 0, [], []
+    for row in query_rows:
+        query = vectorizer.transform([names[row]])
+        start = time.perf_counter()
+        scores = (matrix @ query.T).toarray().ravel()
+        top = np.argpartition(-scores, 10)[:10]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += int(row in top)
+        touched.append(column_nnz[query.indices].sum())
+
+    memory = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    print(f"{label:<10} {matrix.nnz:>12,} {memory / 1e6:>9.1f} {npz_bytes(matrix) / 1e6:>9.1f} "
+          f"{np.mean(touched):>14,.0f} {np.percentile(latencies, 50):>9.2f} {hits / len(query_rows):>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    if os.path.exists('recipes.db'):
+        names, texts = db_corpus(args.docs)
+        source = 'recipes.db sample'
+    else:
+        names, texts = synthetic_corpus(args.docs)
+        source = 'synthetic'
+    query_rows = np.random.default_rng(1).choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+
+    # Previous builder settings
+    plain = HashingVectorizer(n_features=2**18, ngram_range=(1, 2), alternate_sign=False)
+    plain_matrix = plain.transform(texts)
+
+    frequencies = DocumentFrequencies()
+    for start in range(0, len(texts), 10000):
+        frequencies.update(texts[start:start + 10000])
+    weighted = WeightedHashingVectorizer.from_frequencies(frequencies)
+    weighted_matrix = weighted.transform(texts)
+
+    print(f"📊 Sparse index ({source}, {len(texts):,} docs, {len(query_rows)} name queries)")
+    print(f"   Weighted: {weighted.kept_features:,}/{len(weighted.idf):,} features kept, "
+          f"min_df={weighted.min_df}, max_df={weighted.max_df:.0%}, max_nnz={weighted.max_nnz}")
+    print(f"{'':<10} {'nnz':>12} {'RAM MB':>9} {'npz MB':>9} {'nnz/query':>14} {'p50 ms':>9} {'recall@10':>10}")
+    evaluate('plain', plain, plain_matrix, names, query_rows)
+    evaluate('weighted', weighted, weighted_matrix, names, query_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_workers.py
+"""
+serve.py throughput and memory from 1 to N workers
+
+Usage: python -m benchmarks.bench_workers [--max-workers 4] [--app app:app] [--path /similar/1]
+       python -m benchmarks.bench_workers --app dev_server:app --path /search --body '{"query": "chicken rice"}'
+For each worker count, serve.py is started on a free port, warmed up, then
+hit by --clients concurrent connections for --seconds. Reports requests/sec,
+latency percentiles and RSS/PSS summed over the workers (PSS splits shared
+pages between the processes mapping them, so it shows what sharing saves).
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from shared_index import memory_report
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def request_once(url, body):
+    data = body.encode() if body else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'} if data else {})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        resp.read()
+        return resp.status
+
+
+def wait_ready(url, body, proc, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'serve.py exited with {proc.returncode}')
+        try:
+            request_once(url, body)
+            return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError('serve.py did not become ready')
+
+
+def load(url, body, clients, seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        local = []
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                request_once(url, body)
+                local.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(latencies) * 1000, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default='app:app')
+    parser.add_argument('--path', default='/similar/1')
+    parser.add_argument('--body', default=None, help='JSON body (sends POST)')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--startup-timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    print(f"📊 serve.py {args.app} {args.path}: {args.clients} clients x {args.seconds:.0f}s per run")
+    print(f"{'workers':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} "
+          f"{'RSS MB':>8} {'PSS MB':>8} {'PSS/process':>11}")
+    for workers in range(1, args.max_workers + 1):
+        port = free_port()
+        url = f'http://127.0.0.1:{port}{args.path}'
+        proc = subprocess.Popen([sys.executable, 'serve.py', '--app', args.app, '--host', '127.0.0.1',
+                                 '--port', str(port), '--workers', str(workers)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url, args.body, proc, args.startup_timeout)
+            latencies, errors = load(url, args.body, args.clients, args.seconds)
+            reports = [r for r in (memory_report(p) for p in [proc.pid] + child_pids(proc.pid)) if r]
+            rss = sum(r['rss'] for r in reports) / 1e6
+            pss = sum(r['pss'] for r in reports) / 1e6
+            rate = len(latencies) / args.seconds
+            p50, p95 = (np.percentile(latencies, 50), np.percentile(latencies, 95)) if len(latencies) else (0, 0)
+            print(f"{workers:>8} {rate:>8.1f} {p50:>8.1f} {p95:>8.1f} {errors:>7} "
+                  f"{rss:>8.0f} {pss:>8.0f} {pss / max(len(reports), 1):>11.0f}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/synthetic.py
+"""
+Synthetic corpus: a recipes.db plus the full build_models.py output, at any scale
+
+Usage: python -m benchmarks.synthetic --rows 100000 [--out bench_data/100000] [--seed 0]
+Writes recipes.db (with recipes_fts), model_chunks/ and recipe_models.pkl
+into --out, so app.py or the retrieval benchmark can run against it from
+that directory. Recipes are drawn from per-cuisine ingredient pools with a
+Zipf long tail; the shards come from the real build_models.build(), with
+HashedTextEncoder standing in for the sentence transformer: a seeded random
+projection of hashed unigrams, so related texts get related vectors and
+queries can be encoded the same way. 100k rows take about a minute;
+rows are generated and inserted in batches, so 10M only needs disk.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+import create_db
+from build_models import build, CHUNK_SIZE
+from dense_index import PROJECTION_DIMS, normalize_rows
+from instructions import encode_step_timers, extract_durations
+
+SYNTHETIC_FILE = 'synthetic.json'
+
+CUISINES = {
+    'Indian': ['paneer', 'garam masala', 'cumin', 'turmeric', 'ghee', 'lentils', 'chickpeas', 'basmati rice',
+               'coriander', 'cardamom', 'green chili', 'yogurt', 'mustard seeds', 'curry leaves'],
+    'Italian': ['pasta', 'parmesan', 'basil', 'olive oil', 'tomato', 'mozzarella', 'oregano', 'garlic',
+                'pine nuts', 'ricotta', 'balsamic vinegar', 'prosciutto', 'arborio rice'],
+    'Mexican': ['tortilla', 'black beans', 'jalapeno', 'avocado', 'lime', 'cilantro', 'corn', 'chipotle',
+                'queso fresco', 'salsa', 'cumin', 'poblano'],
+    'Chinese': ['soy sauce', 'ginger', 'scallion', 'sesame oil', 'rice vinegar', 'bok choy', 'tofu',
+                'star anise', 'oyster sauce', 'noodles', 'shaoxing wine', 'chili oil'],
+    'American': ['butter', 'cheddar', 'bacon', 'potato', 'ground beef', 'brown sugar', 'flour', 'eggs',
+                 'milk', 'maple syrup', 'buttermilk', 'pecans'],
+    'Thai': ['coconut milk', 'fish sauce', 'lemongrass', 'thai basil', 'galangal', 'rice noodles', 'peanuts',
+             'kaffir lime', 'palm sugar', 'red curry paste', 'shrimp'],
+}
+COMMON = ['salt', 'pepper', 'onion', 'water', 'chicken', 'sugar', 'oil', 'carrot', 'spinach', 'mushroom']
+DISHES = ['curry', 'stew', 'salad', 'soup', 'stir fry', 'bake', 'casserole', 'tacos', 'bowl', 'pie',
+          'skillet', 'roast', 'fritters', 'pilaf', 'noodles', 'wraps']
+ADJECTIVES = ['spicy', 'creamy', 'quick', 'smoky', 'crispy', 'tangy', 'rustic', 'easy', 'hearty', 'zesty']
+VERBS = ['chop', 'simmer', 'stir', 'whisk', 'saute', 'bake', 'roast', 'fold', 'season', 'grill']
+LONG_TAIL = 5000
+
+
+class HashedTextEncoder:
+    """Deterministic stand-in for the sentence transformer: hashed unigrams x seeded Gaussian table"""
+
+    name = 'synthetic-hashed'
+
+    def __init__(self, dim=384, buckets=2 ** 14, seed=0):
+        self.dim = dim
+        self.vectorizer = HashingVectorizer(n_features=buckets, alternate_sign=False, norm='l2')
+        rng = np.random.default_rng(seed)
+        self.table = rng.standard_normal((buckets, dim)).astype(np.float32)
+        # A shared offset, like the mean direction real sentence embeddings have
+        self.table += 0.3 * rng.standard_normal(dim).astype(np.float32)
+
+    def encode(self, texts, **kwargs):
+        return normalize_rows(np.asarray(self.vectorizer.transform(texts) @ self.table, dtype=np.float32))
+
+    __call__ = encode
+
+
+def synthetic_recipe(rng, zipf_draws):
+    cuisine = rng.choice(list(CUISINES))
+    pool = CUISINES[cuisine]
+    main = rng.sample(pool, 4) + rng.sample(COMMON, 3)
+    tail = [f'spice{next(zipf_draws)}' for _ in range(rng.randint(1, 3))]
+    ingredients = main + tail
+    name = f"{rng.choice(ADJECTIVES).title()} {main[0].title()} {rng.choice(DISHES).title()}"
+    steps = [f"{rng.choice(VERBS).title()} the {ing} for {rng.randint(2, 30)} minutes." for ing in ingredients[:5]]
+    description = f"A {cuisine.lower()} {name.lower()} with {main[1]} and {main[2]}."
+    category = 'non-vegetarian' if any(m in ingredients for m in ('chicken', 'bacon', 'shrimp', 'ground beef',
+                                                                   'prosciutto', 'fish sauce')) else 'vegetarian'
+    search_text = ' '.join([name, description, cuisine, ' '.join(ingredients), ' '.join(steps)]).lower()
+    return (name, None, description, cuisine, 'Main Course', None, f"{rng.randint(10, 90)} min", None, None,
+            None, '|'.join(ingredients), '|'.join(steps), search_text, category, 'synthetic',
+            encode_step_timers([extract_durations(step) for step in steps]))
+
+
+def _zipf_draws(seed):
+    rng = np.random.default_rng(seed)
+    while True:
+        for value in (rng.zipf(1.3, 100000) - 1) % LONG_TAIL:
+            yield int(value)
+
+
+def write_database(db_file, rows, seed=0, batch_size=50000):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(db_file, with_indexes=False)
+    conn = sqlite3.connect(db_file)
+    for pragma in create_db.BULK_PRAGMAS:
+        conn.execute(pragma)
+    rng = random.Random(seed)
+    zipf_draws = _zipf_draws(seed)
+    for start in range(0, rows, batch_size):
+        batch = [synthetic_recipe(rng, zipf_draws) for _ in range(min(batch_size, rows - start))]
+        conn.executemany(create_db.INSERT_SQL, batch)
+    conn.commit()
+    create_db.create_indexes(conn)
+    create_db.rebuild_fts_index(conn)
+    create_db.create_fts_triggers(conn)
+    conn.commit()
+    conn.close()
+
+
+def generate(out_dir, rows, seed=0, dim=384, chunk_size=CHUNK_SIZE, proj_dims=PROJECTION_DIMS):
+    """Write the corpus into out_dir unless an identical one is already there; returns its config"""
+    config = {'rows': rows, 'seed': seed, 'dim': dim, 'chunk_size': chunk_size, 'proj_dims': proj_dims}
+    config_file = os.path.join(out_dir, SYNTHETIC_FILE)
+    if os.path.exists(config_file):
+        with open(config_file) as f:
+            if json.load(f) == config:
+                return config
+    os.makedirs(out_dir, exist_ok=True)
+    db_file = os.path.join(out_dir, 'recipes.db')
+    if os.path.exists(db_file):
+        os.remove(db_file)
+
+    start = time.perf_counter()
+    write_database(db_file, rows, seed)
+    print(f"🗄️  {rows:,} recipes -> {db_file} ({time.perf_counter() - start:.0f}s)")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        build(db_file=db_file, chunks_dir=os.path.abspath(os.path.join(out_dir, 'model_chunks')),
+              output_file=os.path.join(out_dir, 'recipe_models.pkl'), encode=HashedTextEncoder(dim, seed=seed),
+              chunk_size=chunk_size, rebuild=True, cache_dir=None, proj_dims=proj_dims)
+    print(f"🧮 Shards built ({time.perf_counter() - start:.0f}s)")
+
+    with open(config_file, 'w') as f:
+        json.dump(config, f)
+    return config
+
+
+def query_set(out_dir, num_queries, seed=0):
+    """[(source recipe id, query text)]: two ingredients and the dish word of a sampled recipe"""
+    conn = sqlite3.connect(os.path.join(out_dir, 'recipes.db'))
+    max_id = conn.execute('SELECT MAX(id) FROM recipes').fetchone()[0]
+    rng = random.Random(seed + 1)
+    ids = sorted(rng.sample(range(1, max_id + 1), min(num_queries, max_id)))
+    placeholders = ','.join('?' * len(ids))
+    rows = conn.execute(f'SELECT id, name, ingredients FROM recipes WHERE id IN ({placeholders})', ids).fetchall()
+    conn.close()
+    queries = []
+    for r_id, name, ingredients in rows:
+        picked = rng.sample(ingredients.split('|')[:7], 2)
+        queries.append((r_id, f"{picked[0]} {picked[1]} {name.split()[-1].lower()}"))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--out', default=None, help='Output directory (default bench_data/<rows>)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--proj-dims', type=int, default=PROJECTION_DIMS, help='0 disables the prefilter')
+    args = parser.parse_args()
+    out_dir = args.out or os.path.join('bench_data', str(args.rows))
+    generate(out_dir, args.rows, args.seed, args.dim, args.chunk_size, args.proj_dims)
+    print(f"✅ Synthetic corpus ready in {out_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,166 +1,648 @@
 # build_models.py
 """
 Save TF-IDF + embeddings to project folder (not temp)
+
+Incremental and resumable: each shard (emb_chunk_i.npy, tfidf_chunk_i.npz,
+ids_chunk_i.npy, hash_chunk_i.npy) is written with an atomic rename and
+checkpointed in model_chunks/manifest.json as soon as it is encoded.
+Re-running only encodes recipes beyond the indexed high-water mark or whose
+search_text hash changed; everything else is reused. Texts seen by any
+earlier build (even under other ids) come from the embedding cache.
+
+The sparse shards use a frozen IDF with DF pruning (sparse_weighting.py,
+saved as model_chunks/idf.npz); shards built under a different weighting
+get their sparse rows rewritten without re-encoding. Each shard also gets a
+PCA-projected copy (proj_chunk_i.npy) for dense_index.py's prefilter.
+
+With --publish the finished build is also copied into a new
+index_versions/<version>/ directory (index_versions.py), which a running
+app.py picks up and swaps in without a restart.
+
+Usage: python build_models.py [--rebuild] [--append-only] [--refit-idf] [--proj-dims N] [--no-cache] [--publish]
 """
 
 import sqlite3
 import pickle
 import numpy as np
-import torch
-from sklearn.feature_extraction.text import HashingVectorizer
-from sentence_transformers import SentenceTransformer
 from scipy import sparse
 from tqdm import tqdm
+import argparse
+import hashlib
+import json
 import gc
+import contextlib
 import os
+import time
+
+from dedup import indexable_where, INDEXABLE_WHERE, has_clusters
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
+from sparse_weighting import DocumentFrequencies, WeightedHashingVectorizer, IDF_FILE
+from dense_index import Projection, PROJECTION_FILE, PROJECTION_DIMS, PROJECTION_SAMPLE
+from index_versions import publish, KEEP_VERSIONS, VERSIONS_DIR
 
 DB_FILE = 'recipes.db'
 OUTPUT_FILE = 'recipe_models.pkl'
 CHUNKS_DIR = 'model_chunks'  # Save in project folder
+MANIFEST_FILE = 'manifest.json'
+ENCODER_NAME = 'all-MiniLM-L6-v2'
+CHUNK_SIZE = 10000
+CPU_WORKER_BATCH_SIZE = 64
+MANIFEST_VERSION = 1
+# Refit the IDF once the indexable corpus is this much larger than when it was fitted
+IDF_REFIT_GROWTH = 1.25
+
+
+def fit_tfidf_vectorizer(conn, batch_size=CHUNK_SIZE):
+    """Streaming document-frequency pass over indexable search_text -> WeightedHashingVectorizer"""
+    where = f'AND ({INDEXABLE_WHERE})' if has_clusters(conn) else ''
+    frequencies = DocumentFrequencies()
+    last_id = 0
+    with tqdm(desc="Document frequencies", unit=" docs") as progress:
+        while True:
+            rows = conn.execute(
+                f'SELECT id, search_text FROM recipes WHERE id > ? {where} ORDER BY id LIMIT ?',
+                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            frequencies.update([r[1] or '' for r in rows])
+            last_id = rows[-1][0]
+            progress.update(len(rows))
+    return WeightedHashingVectorizer.from_frequencies(frequencies)
+
+
+def load_tfidf_vectorizer(conn, chunks_dir, indexable, refit=False):
+    """Frozen weighting from chunks_dir, refitted when missing, requested, or the corpus grew a lot"""
+    path = os.path.join(chunks_dir, IDF_FILE)
+    if not refit and os.path.exists(path):
+        vectorizer = WeightedHashingVectorizer.load(path)
+        if indexable <= vectorizer.n_docs * IDF_REFIT_GROWTH:
+            return vectorizer
+        print(f"📈 Corpus grew from {vectorizer.n_docs:,} to {indexable:,} documents; refitting IDF")
+
+    print("\n🔢 Computing document frequencies...")
+    vectorizer = fit_tfidf_vectorizer(conn)
+    _atomic_write(path, vectorizer.save)
+    total = len(vectorizer.idf)
+    print(f"✅ Kept {vectorizer.kept_features:,}/{total:,} hashed features "
+          f"(min_df={vectorizer.min_df}, max_df={vectorizer.max_df:.0%}, max {vectorizer.max_nnz} per recipe)")
+    return vectorizer
+
+
+def load_encoder():
+    """SentenceTransformer on GPU if available. Returns (encoder, device, batch_size)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if torch.cuda.is_available():
+        device = 'cuda'
+        print(f"\n🚀 GPU: {torch.cuda.get_device_name(0)}")
+        print(f"   VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+    else:
+        device = 'cpu'
+
+    print(f"\n🤖 Loading transformer on {device.upper()}...")
+    encoder = SentenceTransformer(ENCODER_NAME, device=device)
+    batch_size = 64 if device == 'cuda' else 16
+    return encoder, device, batch_size
+
+
+# --- CPU encoder pool ---
+
+_worker_encoder = None
+
+
+def _init_encode_worker(threads, load_model=None):
+    """Pin BLAS/torch threads before torch is imported, then load the encoder once
+
+    load_model: optional picklable factory used instead of the SentenceTransformer (tests)
+    """
+    global _worker_encoder
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if load_model is not None:
+        _worker_encoder = load_model()
+        return
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_encoder = SentenceTransformer(ENCODER_NAME, device='cpu')
+
+
+def _encode_in_worker(texts):
+    return _worker_encoder.encode(texts, batch_size=CPU_WORKER_BATCH_SIZE, show_progress_bar=False,
+                                  convert_to_numpy=True)
+
+
+class EncoderPool:
+    """Fans a shard's texts out to worker processes, each with its own encoder
+
+    Several single/dual-threaded MiniLM copies beat one process using every
+    core: small CPU batches do not scale across threads. Use it as a context
+    manager: the workers are joined on exit, or terminated if encoding failed
+    (a worker's exception is re-raised by __call__).
+    """
+
+    def __init__(self, workers, threads, load_model=None):
+        import multiprocessing
+        # spawn: torch is not fork-safe once initialised
+        ctx = multiprocessing.get_context('spawn')
+        print(f"\n🤖 Starting {workers} encoder workers x {threads} thread(s) on CPU...")
+        self.pool = ctx.Pool(workers, initializer=_init_encode_worker, initargs=(threads, load_model))
+        self.workers = workers
+
+    def __call__(self, texts):
+        # A few slices per worker keeps them busy when text lengths are uneven
+        n_slices = min(len(texts), self.workers * 4)
+        bounds = np.linspace(0, len(texts), n_slices + 1).astype(int)
+        slices = [texts[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        return np.vstack(self.pool.map(_encode_in_worker, slices))
+
+    def close(self, terminate=False):
+        if terminate:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
 
-# Create chunks directory
-os.makedirs(CHUNKS_DIR, exist_ok=True)
-
-print("=" * 60)
-print("🔧 Building Models (TF-IDF + Embeddings)")
-print("=" * 60)
-
-# CUDA
-if torch.cuda.is_available():
-    device = 'cuda'
-    print(f"\n🚀 GPU: {torch.cuda.get_device_name(0)}")
-    print(f"   VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
-else:
-    device = 'cpu'
-
-# Load database
-print("\n📚 Loading database...")
-conn = sqlite3.connect(DB_FILE)
-cursor = conn.cursor()
-
-cursor.execute('SELECT COUNT(*) FROM recipes')
-total = cursor.fetchone()[0]
-print(f"✅ {total:,} recipes")
-
-cursor.execute('SELECT id FROM recipes')
-recipe_ids = [r[0] for r in cursor.fetchall()]
-
-# TF-IDF in chunks
-print("\n🔍 Building TF-IDF...")
-tfidf_vectorizer = HashingVectorizer(
-    n_features=2**18,
-    ngram_range=(1, 2),
-    alternate_sign=False
-)
-
-chunk_size = 10000
-tfidf_chunks = []
-
-print("   Processing TF-IDF chunks...")
-for i in tqdm(range(0, len(recipe_ids), chunk_size), desc="TF-IDF"):
-    end_idx = min(i + chunk_size, len(recipe_ids))
-    chunk_ids = recipe_ids[i:end_idx]
-    
-    placeholders = ','.join(['?'] * len(chunk_ids))
-    cursor.execute(f'SELECT search_text FROM recipes WHERE id IN ({placeholders})', chunk_ids)
-    texts = [r[0] for r in cursor.fetchall()]
-    
-    chunk_matrix = tfidf_vectorizer.transform(texts)
-    tfidf_chunks.append(chunk_matrix)
-    
-    del texts, chunk_matrix
-    gc.collect()
-
-# Combine TF-IDF chunks
-print("   Combining TF-IDF chunks...")
-tfidf_matrix = sparse.vstack(tfidf_chunks)
-del tfidf_chunks
-gc.collect()
-
-print(f"✅ TF-IDF shape: {tfidf_matrix.shape}")
-
-# Save TF-IDF to disk
-tfidf_file = os.path.join(CHUNKS_DIR, 'tfidf_matrix.npz')
-sparse.save_npz(tfidf_file, tfidf_matrix)
-print(f"💾 TF-IDF saved: {tfidf_file}")
-
-# Free memory
-del tfidf_matrix
-gc.collect()
-
-# Embeddings in chunks
-print(f"\n🤖 Loading transformer on {device.upper()}...")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-
-batch_size = 64 if device == 'cuda' else 16
-
-print(f"🔄 Creating embeddings (batch={batch_size})...")
-emb_chunks = []
-
-for i in tqdm(range(0, len(recipe_ids), chunk_size), desc="Embeddings"):
-    end_idx = min(i + chunk_size, len(recipe_ids))
-    chunk_ids = recipe_ids[i:end_idx]
-    
-    placeholders = ','.join(['?'] * len(chunk_ids))
-    cursor.execute(f'SELECT search_text FROM recipes WHERE id IN ({placeholders})', chunk_ids)
-    texts = [r[0] for r in cursor.fetchall()]
-    
-    chunk_emb = embedding_model.encode(
-        texts,
-        batch_size=batch_size,
-        show_progress_bar=False,
-        convert_to_numpy=True,
-        device=device
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(terminate=exc_type is not None)
+
+
+def default_worker_layout():
+    """(workers, threads per worker) covering the machine's cores"""
+    cores = os.cpu_count() or 1
+    threads = 2 if cores >= 4 else 1
+    return max(1, cores // threads), threads
+
+
+class LazyEncoder:
+    """Creates the encoder (GPU model or CPU pool) on first use, so no-op runs start instantly
+
+    A context manager like EncoderPool: a pool it started is shut down on exit.
+    """
+
+    def __init__(self, workers=None, threads=None):
+        self.workers = workers
+        self.threads = threads
+        self._encode = None
+        self._pool = None
+
+    def __call__(self, texts):
+        if self._encode is None:
+            import torch
+            if torch.cuda.is_available():
+                encoder, device, batch_size = load_encoder()
+                self._encode = lambda t: encoder.encode(t, batch_size=batch_size, show_progress_bar=False,
+                                                        convert_to_numpy=True, device=device)
+            else:
+                default_workers, default_threads = default_worker_layout()
+                self._pool = EncoderPool(self.workers or default_workers, self.threads or default_threads)
+                self._encode = self._pool
+        return self._encode(texts)
+
+    def close(self, terminate=False):
+        if self._pool is not None:
+            self._pool.close(terminate)
+            self._pool = self._encode = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(terminate=exc_type is not None)
+
+
+def text_hashes(texts):
+    """uint64 content hash per search_text (blake2b, 8 bytes)"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b((t or '').encode('utf-8'), digest_size=8).digest(), 'little')
+         for t in texts],
+        dtype=np.uint64,
     )
-    
-    emb_chunks.append(chunk_emb)
-    
-    del texts, chunk_emb
-    gc.collect()
-    if device == 'cuda':
-        torch.cuda.empty_cache()
-
-conn.close()
-
-# Combine embeddings
-print("   Combining embeddings...")
-recipe_embeddings = np.vstack(emb_chunks)
-del emb_chunks
-gc.collect()
-
-print(f"✅ Embeddings shape: {recipe_embeddings.shape}")
-
-# Save embeddings
-emb_file = os.path.join(CHUNKS_DIR, 'embeddings.npy')
-np.save(emb_file, recipe_embeddings)
-print(f"💾 Embeddings saved: {emb_file}")
-
-del recipe_embeddings
-gc.collect()
-
-# Save metadata
-print("\n💾 Saving model metadata...")
-models = {
-    'tfidf_vectorizer': tfidf_vectorizer,
-    'tfidf_file': tfidf_file,
-    'embeddings_file': emb_file,
-    'recipe_ids': recipe_ids,
-    'chunks_dir': CHUNKS_DIR
-}
-
-with open(OUTPUT_FILE, 'wb') as f:
-    pickle.dump(models, f, protocol=4)
-
-file_size = os.path.getsize(OUTPUT_FILE) / 1024
-print(f"✅ Metadata saved: {OUTPUT_FILE} ({file_size:.1f} KB)")
-
-# Show chunk sizes
-tfidf_size = os.path.getsize(tfidf_file) / (1024*1024)
-emb_size = os.path.getsize(emb_file) / (1024*1024)
-
-print("\n" + "=" * 60)
-print(f"✅ Processed {total:,} recipes!")
-print(f"   TF-IDF: {tfidf_size:.0f} MB")
-print(f"   Embeddings: {emb_size:.0f} MB")
-print(f"   Saved in: {CHUNKS_DIR}/")
-print("=" * 60)
+
+
+# --- Atomic file writes ---
+
+def _write_tmp(path, write):
+    """Write to path + '.tmp' and fsync; os.replace() it into place to publish"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def _atomic_write(path, write):
+    os.replace(_write_tmp(path, write), path)
+
+
+def save_manifest(chunks_dir, manifest):
+    data = json.dumps(manifest, indent=1).encode('utf-8')
+    _atomic_write(os.path.join(chunks_dir, MANIFEST_FILE), lambda f: f.write(data))
+
+
+def load_manifest(chunks_dir):
+    """Existing manifest, or None if missing or built with another encoder"""
+    path = os.path.join(chunks_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('encoder') != ENCODER_NAME:
+        print("⚠️  Manifest from a different builder/encoder; rebuilding from scratch")
+        return None
+    return recover_manifest(manifest)
+
+
+def recover_manifest(manifest):
+    """Roll back shards interrupted while their files were being replaced
+
+    A dirty entry's files may be a mix of old and new, so it reverts to the
+    previous range marked stale (rebuilt without reusing its files), or is
+    dropped if the shard was new.
+    """
+    shards = []
+    for entry in manifest['shards']:
+        if entry.get('dirty'):
+            if entry.get('previous'):
+                shards.append({**entry['previous'], 'stale': True})
+        else:
+            shards.append(entry)
+    manifest['shards'] = shards
+    return manifest
+
+
+def new_manifest(chunk_size):
+    return {
+        'version': MANIFEST_VERSION,
+        'encoder': ENCODER_NAME,
+        'chunk_size': chunk_size,
+        'high_water_id': 0,
+        'complete': False,
+        'shards': [],
+    }
+
+
+# --- Shard planning ---
+
+def shard_files(index):
+    return {
+        'emb': f'emb_chunk_{index}.npy',
+        'tfidf': f'tfidf_chunk_{index}.npz',
+        'ids': f'ids_chunk_{index}.npy',
+        'hashes': f'hash_chunk_{index}.npy',
+    }
+
+
+def plan_shards(conn, manifest, chunk_size):
+    """Id ranges to (re)build: existing shards, the open last shard topped up, then new shards.
+
+    Returns [(index, first_id, last_id, is_new_range), ...].
+    """
+    where = f'AND ({INDEXABLE_WHERE})' if has_clusters(conn) else ''
+    high_water = manifest['high_water_id']
+    new_ids = [r[0] for r in conn.execute(
+        f'SELECT id FROM recipes WHERE id > ? {where} ORDER BY id', (high_water,))]
+
+    plan = [(s['index'], s['first_id'], s['last_id'], False) for s in manifest['shards']]
+
+    # Top up a partially filled last shard before opening new ones
+    if plan and new_ids and manifest['shards'][-1]['count'] < chunk_size:
+        room = chunk_size - manifest['shards'][-1]['count']
+        index, first_id, _, _ = plan[-1]
+        plan[-1] = (index, first_id, new_ids[min(room, len(new_ids)) - 1], True)
+        new_ids = new_ids[room:]
+
+    next_index = max((s['index'] for s in manifest['shards']), default=-1) + 1
+    for i in range(0, len(new_ids), chunk_size):
+        group = new_ids[i:i + chunk_size]
+        plan.append((next_index, group[0], group[-1], True))
+        next_index += 1
+    return plan
+
+
+def fetch_range(conn, first_id, last_id):
+    """(ids, texts) of indexable recipes with first_id <= id <= last_id"""
+    where = f'AND ({INDEXABLE_WHERE})' if has_clusters(conn) else ''
+    rows = conn.execute(
+        f'SELECT id, search_text FROM recipes WHERE id BETWEEN ? AND ? {where} ORDER BY id',
+        (first_id, last_id)).fetchall()
+    return np.array([r[0] for r in rows], dtype=np.int64), [r[1] or '' for r in rows]
+
+
+# --- Projected prefilter vectors ---
+
+def sample_embeddings(chunks_dir, shards, sample_size=PROJECTION_SAMPLE, seed=0):
+    """Up to sample_size embedding rows drawn evenly across shards"""
+    rng = np.random.default_rng(seed)
+    total = sum(entry['count'] for entry in shards)
+    parts = []
+    for entry in shards:
+        emb = np.load(os.path.join(chunks_dir, entry['emb']), mmap_mode='r')
+        take = min(len(emb), max(1, round(sample_size * entry['count'] / max(total, 1))))
+        parts.append(np.asarray(emb[np.sort(rng.choice(len(emb), size=take, replace=False))]))
+    return np.concatenate(parts)
+
+
+def update_projections(chunks_dir, manifest, dims=PROJECTION_DIMS, refit=False):
+    """Fit (or reuse) the PCA projection and write proj_chunk_i.npy for shards missing it"""
+    path = os.path.join(chunks_dir, PROJECTION_FILE)
+    projection = None
+    if not refit and os.path.exists(path):
+        projection = Projection.load(path)
+        if projection.dims != min(dims, projection.components.shape[1]):
+            projection = None
+    if projection is None:
+        print(f"\n📐 Fitting {dims}-dim projection...")
+        projection = Projection.fit(sample_embeddings(chunks_dir, manifest['shards']), dims)
+        _atomic_write(path, projection.save)
+
+    fingerprint = projection.fingerprint()
+    for entry in tqdm(manifest['shards'], desc="Projections"):
+        if entry.get('projection') == fingerprint and os.path.exists(os.path.join(chunks_dir, entry['proj'])):
+            continue
+        emb = np.load(os.path.join(chunks_dir, entry['emb']), mmap_mode='r')
+        projected = projection.project(emb)
+        entry['proj'] = f"proj_chunk_{entry['index']}.npy"
+        _atomic_write(os.path.join(chunks_dir, entry['proj']), lambda f: np.save(f, projected))
+        entry['projection'] = fingerprint
+    return projection
+
+
+# --- Build ---
+
+class ShardBuilder:
+    """Builds one shard, reusing stored embeddings for unchanged rows"""
+
+    def __init__(self, chunks_dir, tfidf_vectorizer, encode, cache=None):
+        self.chunks_dir = chunks_dir
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.encode = encode
+        self.cache = cache
+        self.encoded = 0
+        self.reused = 0
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.encode_seconds = 0.0
+
+    def _path(self, name):
+        return os.path.join(self.chunks_dir, name)
+
+    def load_existing(self, entry):
+        """(ids, hashes, embeddings) stored for a manifest entry, or None"""
+        # Stale entries were interrupted while their files were being replaced
+        if entry is None or entry.get('stale'):
+            return None
+        try:
+            ids = np.load(self._path(entry['ids']))
+            hashes = np.load(self._path(entry['hashes']))
+            emb = np.load(self._path(entry['emb']), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if not (len(ids) == len(hashes) == len(emb) == entry['count']):
+            return None
+        return ids, hashes, emb
+
+    def build(self, index, ids, texts, hashes, existing):
+        """Encode what changed and stage all shard files as .tmp
+
+        Returns (manifest entry, staged tmp paths); publish with commit().
+        """
+        files = shard_files(index)
+        embeddings = None
+        todo = np.arange(len(ids))
+
+        if existing is not None and len(existing[0]):
+            old_ids, old_hashes, old_emb = existing
+            pos = np.searchsorted(old_ids, ids)
+            same = pos < len(old_ids)
+            same[same] = (old_ids[pos[same]] == ids[same]) & (old_hashes[pos[same]] == hashes[same])
+            if same.any():
+                embeddings = np.empty((len(ids), old_emb.shape[1]), dtype=old_emb.dtype)
+                embeddings[same] = old_emb[pos[same]]
+                self.reused += int(same.sum())
+            todo = np.flatnonzero(~same)
+
+        cache_keys = None
+        if self.cache is not None and len(todo):
+            cache_keys = self.cache.keys_for(texts)
+            hit, cached = self.cache.lookup(cache_keys[todo])
+            if hit.any():
+                if embeddings is None:
+                    embeddings = np.empty((len(ids), cached.shape[1]), dtype=np.float32)
+                embeddings[todo[hit]] = cached
+            self.cache_hits += int(hit.sum())
+            self.cache_lookups += len(todo)
+            todo = todo[~hit]
+
+        if len(todo):
+            encode_start = time.perf_counter()
+            new_emb = self.encode([texts[i] for i in todo])
+            self.encode_seconds += time.perf_counter() - encode_start
+            if embeddings is None:
+                embeddings = np.empty((len(ids), new_emb.shape[1]), dtype=new_emb.dtype)
+            embeddings[todo] = new_emb
+            self.encoded += len(todo)
+
+        if cache_keys is not None:
+            # Also backfills rows reused from the shard, so shards built before the cache get covered
+            self.cache.add(cache_keys, embeddings)
+
+        tfidf = self.tfidf_vectorizer.transform(texts)
+
+        staged = [
+            (_write_tmp(self._path(files['emb']), lambda f: np.save(f, embeddings)), self._path(files['emb'])),
+            (_write_tmp(self._path(files['tfidf']), lambda f: sparse.save_npz(f, tfidf)), self._path(files['tfidf'])),
+            (_write_tmp(self._path(files['hashes']), lambda f: np.save(f, hashes)), self._path(files['hashes'])),
+            (_write_tmp(self._path(files['ids']), lambda f: np.save(f, ids)), self._path(files['ids'])),
+        ]
+        entry = {
+            'index': index,
+            'first_id': int(ids[0]),
+            'last_id': int(ids[-1]),
+            'count': len(ids),
+            **files,
+        }
+        return entry, staged
+
+    @staticmethod
+    def commit(staged):
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+
+
+def build(db_file=DB_FILE, chunks_dir=CHUNKS_DIR, output_file=OUTPUT_FILE, encode=None,
+          chunk_size=CHUNK_SIZE, rebuild=False, append_only=False, workers=None, threads=None,
+          cache_dir=EMBEDDING_CACHE_DIR, refit_idf=False, proj_dims=PROJECTION_DIMS):
+    """Bring the shards in chunks_dir up to date with db_file"""
+    os.makedirs(chunks_dir, exist_ok=True)
+
+    manifest = None if rebuild else load_manifest(chunks_dir)
+    if manifest is None:
+        manifest = new_manifest(chunk_size)
+    else:
+        chunk_size = manifest['chunk_size']
+        status = 'complete' if manifest['complete'] else 'interrupted, resuming'
+        print(f"📒 Manifest: {len(manifest['shards'])} shards up to id {manifest['high_water_id']:,} ({status})")
+
+    print("\n📚 Loading database...")
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT COUNT(*) FROM recipes')
+    total = cursor.fetchone()[0]
+    cursor.execute(f'SELECT COUNT(*) FROM recipes {indexable_where(conn)}')
+    indexable = cursor.fetchone()[0]
+    print(f"✅ {total:,} recipes")
+    skipped = total - indexable
+    if skipped:
+        print(f"🧬 Indexing {indexable:,} cluster representatives ({skipped:,} near-duplicates skipped)")
+
+    lazy_encoder = None
+    if encode is None:
+        encode = lazy_encoder = LazyEncoder(workers, threads)
+
+    tfidf_vectorizer = load_tfidf_vectorizer(conn, chunks_dir, indexable, refit=rebuild or refit_idf)
+    weighting = tfidf_vectorizer.fingerprint()
+    cache = EmbeddingCache(cache_dir, ENCODER_NAME) if cache_dir else None
+    if cache is not None:
+        print(f"🗃️  Embedding cache: {len(cache):,} vectors in {cache_dir}/")
+    builder = ShardBuilder(chunks_dir, tfidf_vectorizer, encode, cache)
+    entries = {s['index']: s for s in manifest['shards']}
+    plan = plan_shards(conn, manifest, chunk_size)
+
+    build_start = time.perf_counter()
+    unchanged = 0
+    progress = tqdm(plan, desc="Shards")
+    with lazy_encoder or contextlib.nullcontext():
+        for index, first_id, last_id, is_new_range in progress:
+            entry = entries.get(index)
+            if (append_only and not is_new_range and entry is not None and not entry.get('stale')
+                    and entry.get('weighting') == weighting):
+                unchanged += 1
+                continue
+
+            ids, texts = fetch_range(conn, first_id, last_id)
+            hashes = text_hashes(texts)
+            existing = builder.load_existing(entry)
+
+            if (existing is not None and entry.get('weighting') == weighting
+                    and np.array_equal(existing[0], ids) and np.array_equal(existing[1], hashes)):
+                unchanged += 1
+                continue
+            if len(ids) == 0:
+                # Every row in the range was deleted; drop the shard from the manifest
+                entries.pop(index, None)
+                continue
+
+            # A new IDF only rewrites the sparse rows; embeddings are reused as unchanged
+            entry, staged = builder.build(index, ids, texts, hashes, existing)
+            entry['weighting'] = weighting
+            if builder.encode_seconds:
+                progress.set_postfix(docs_per_sec=f"{builder.encoded / builder.encode_seconds:,.0f}")
+
+            # Checkpoint: mark the shard dirty while its files are swapped, then clean
+            manifest['complete'] = False
+            entries[index] = {**entry, 'dirty': True, 'previous': entries.get(index)}
+            manifest['shards'] = [entries[i] for i in sorted(entries)]
+            save_manifest(chunks_dir, manifest)
+            builder.commit(staged)
+            entries[index] = entry
+            manifest['shards'] = [entries[i] for i in sorted(entries)]
+            manifest['high_water_id'] = max(manifest['high_water_id'], int(ids[-1]))
+            save_manifest(chunks_dir, manifest)
+
+            del ids, texts, hashes, existing
+            gc.collect()
+
+    conn.close()
+    if cache is not None:
+        cache.flush()
+
+    # Shard indexes stay stable (gaps allowed) so files never move
+    manifest['shards'] = [entries[i] for i in sorted(entries)]
+    if manifest['shards'] and proj_dims:
+        update_projections(chunks_dir, manifest, proj_dims, refit=rebuild)
+    manifest['complete'] = True
+    save_manifest(chunks_dir, manifest)
+
+    recipe_ids = []
+    chunk_offsets = []
+    for entry in manifest['shards']:
+        chunk_offsets.append(len(recipe_ids))
+        recipe_ids.extend(np.load(os.path.join(chunks_dir, entry['ids'])).tolist())
+
+    # Save metadata
+    print("\n💾 Saving model metadata...")
+    models = {
+        'tfidf_vectorizer': tfidf_vectorizer,
+        'recipe_ids': recipe_ids,
+        'chunks_dir': chunks_dir,
+        'num_chunks': len(manifest['shards']),
+        'chunk_size': chunk_size,
+        'chunk_offsets': chunk_offsets,
+        'chunk_files': [{'emb': e['emb'], 'tfidf': e['tfidf'], 'proj': e.get('proj')} for e in manifest['shards']],
+        'manifest_file': os.path.join(chunks_dir, MANIFEST_FILE),
+        'projection_file': os.path.join(chunks_dir, PROJECTION_FILE) if proj_dims else None,
+    }
+    with open(output_file, 'wb') as f:
+        pickle.dump(models, f, protocol=4)
+
+    build_seconds = time.perf_counter() - build_start
+    file_size = os.path.getsize(output_file) / 1024
+    print(f"✅ Metadata saved: {output_file} ({file_size:.1f} KB)")
+
+    print("\n" + "=" * 60)
+    print(f"✅ Indexed {len(recipe_ids):,} recipes in {len(manifest['shards'])} shards ({build_seconds:.0f}s)")
+    print(f"   Encoded: {builder.encoded:,}   Reused: {builder.reused:,}   Unchanged shards: {unchanged}")
+    if builder.cache_lookups:
+        print(f"   Embedding cache: {builder.cache_hits:,}/{builder.cache_lookups:,} hits "
+              f"({builder.cache_hits / builder.cache_lookups:.1%})")
+    if builder.encode_seconds:
+        print(f"   Throughput: {builder.encoded / builder.encode_seconds:,.0f} docs/sec encoding, "
+              f"{builder.encoded / build_seconds:,.0f} docs/sec end-to-end")
+    if skipped and builder.encoded:
+        saved = build_seconds / builder.encoded * skipped
+        print(f"   Near-duplicate collapse saved ~{saved / 60:.0f} min ({skipped:,} rows not encoded)")
+    print(f"   Saved in: {chunks_dir}/")
+    print("=" * 60)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or update TF-IDF + embedding shards')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the manifest and re-encode everything')
+    parser.add_argument('--append-only', action='store_true',
+                        help='Skip the search_text hash check on existing shards; only add new recipes')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='CPU encoder processes (default: cores / threads)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Torch threads per CPU encoder process (default: 2)')
+    parser.add_argument('--refit-idf', action='store_true',
+                        help='Recompute document frequencies and rewrite every sparse shard')
+    parser.add_argument('--proj-dims', type=int, default=PROJECTION_DIMS,
+                        help='Dimensions of the PCA prefilter vectors (0 disables them)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'Do not read or fill the content-hash embedding cache ({EMBEDDING_CACHE_DIR}/)')
+    parser.add_argument('--publish', action='store_true',
+                        help='Publish the build as a new index version under --versions-dir for hot reload')
+    parser.add_argument('--versions-dir', default=VERSIONS_DIR)
+    parser.add_argument('--keep-versions', type=int, default=KEEP_VERSIONS,
+                        help='Published versions to keep (0 = all)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔧 Building Models (TF-IDF + Embeddings)")
+    print("=" * 60)
+
+    build(rebuild=args.rebuild, append_only=args.append_only, workers=args.workers, threads=args.threads,
+          cache_dir=None if args.no_cache else EMBEDDING_CACHE_DIR, refit_idf=args.refit_idf,
+          proj_dims=args.proj_dims)
+
+    if args.publish:
+        path = publish(OUTPUT_FILE, args.versions_dir, keep=args.keep_versions)
+        print(f"📦 Published index version: {path}")
@@ -6,12 +6,78 @@ For local machine with data/ folder structure
 
 import sqlite3
 import pandas as pd
+import numpy as np
 import os
+import time
+import argparse
 import re
 import json
 import ast
 
-def create_database(db_file='recipes.db'):
+from list_parser import parse_quoted_list
+from ingredients import canonicalize_ingredient, build_ingredient_index, INGREDIENT_INDEX_FILE
+from pantry import build_pantry_matrix, PANTRY_MATRIX_FILE
+from dedup import MinHasher, cluster_signatures, has_clusters, recipe_token_hashes
+from instructions import ingest_steps, has_step_timers, recipe_steps, encode_step_timers
+
+_STEP_NUMBER_RE = re.compile(r'^\d+[\.\):\-\s]+')
+_STEP_SPLIT_RE = re.compile(r'\.\s+(?=[A-Z0-9])')
+
+INDEXES = [
+    ('idx_category', 'category'),
+    ('idx_cuisine', 'cuisine'),
+]
+
+INSERT_SQL = '''
+    INSERT INTO recipes (name, image_url, description, cuisine, 
+                       course, diet, prep_time, difficulty, spice_level,
+                       meal_type, ingredients, instructions, 
+                       search_text, category, source, step_timers)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+FTS_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+        name, ingredients, search_text,
+        content='recipes', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+'''
+
+FTS_TRIGGERS_SQL = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN
+        INSERT INTO recipes_fts(rowid, name, ingredients, search_text)
+        VALUES (new.id, new.name, new.ingredients, new.search_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN
+        INSERT INTO recipes_fts(recipes_fts, rowid, name, ingredients, search_text)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.search_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_au AFTER UPDATE OF name, ingredients, search_text ON recipes BEGIN
+        INSERT INTO recipes_fts(recipes_fts, rowid, name, ingredients, search_text)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.search_text);
+        INSERT INTO recipes_fts(rowid, name, ingredients, search_text)
+        VALUES (new.id, new.name, new.ingredients, new.search_text);
+    END
+    ''',
+]
+
+# Pragmas for bulk loading: no rollback journal, no fsync, ~1 GB page cache.
+# A crash mid-load leaves a corrupt file, which is fine for a full rebuild.
+BULK_PRAGMAS = [
+    'PRAGMA journal_mode=OFF',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA cache_size=-1000000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA locking_mode=EXCLUSIVE',
+]
+
+def create_database(db_file='recipes.db', with_indexes=True):
     """Create SQLite database"""
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
@@ -33,18 +99,71 @@ def create_database(db_file='recipes.db'):
             instructions TEXT NOT NULL,
             search_text TEXT,
             category TEXT,
-            source TEXT
+            source TEXT,
+            step_timers TEXT
         )
     ''')
+    # Per-step cooking times in seconds (instructions.encode_step_timers); added to older DBs here
+    if not has_step_timers(conn):
+        cursor.execute('ALTER TABLE recipes ADD COLUMN step_timers TEXT')
     
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_category ON recipes(category)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_search ON recipes(search_text)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cuisine ON recipes(cuisine)')
+    # search_text is kilobytes per row and only ever LIKE-scanned, so a B-tree on it
+    # doubles the DB size without serving any query
+    cursor.execute('DROP INDEX IF EXISTS idx_search')
+    
+    # Canonical ingredients and the recipe <-> ingredient join table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            recipe_id INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL,
+            PRIMARY KEY (recipe_id, ingredient_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Full-text index over recipes (external content: the text lives only in recipes)
+    cursor.execute(FTS_TABLE_SQL)
+    if with_indexes:
+        create_indexes(conn)
+        create_fts_triggers(conn)
     
     conn.commit()
     conn.close()
     print(f"✅ Database created\n")
 
+def create_indexes(conn):
+    """Create secondary indexes"""
+    for name, column in INDEXES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON recipes({column})')
+
+def drop_indexes(conn):
+    """Drop secondary indexes (rebuilt by create_indexes after a bulk load)"""
+    for name, _ in INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+def create_fts_triggers(conn):
+    """Keep recipes_fts in sync with inserts, deletes and updates of the indexed columns on recipes"""
+    # Databases created before the update trigger was scoped re-index on any UPDATE
+    conn.execute('DROP TRIGGER IF EXISTS recipes_fts_au')
+    for sql in FTS_TRIGGERS_SQL:
+        conn.execute(sql)
+
+def drop_fts_triggers(conn):
+    """Drop sync triggers (recipes_fts is rebuilt in one pass after a bulk load)"""
+    for name in ['recipes_fts_ai', 'recipes_fts_ad', 'recipes_fts_au']:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+def rebuild_fts_index(conn):
+    """Re-index recipes_fts from the recipes table and merge its b-trees"""
+    conn.execute(FTS_TABLE_SQL)
+    conn.execute("INSERT INTO recipes_fts(recipes_fts) VALUES('rebuild')")
+    conn.execute("INSERT INTO recipes_fts(recipes_fts) VALUES('optimize')")
+
 def clean_text(text):
     """Clean text"""
     if pd.isna(text):
@@ -61,6 +180,10 @@ def parse_json_list(text):
     
     text = str(text).strip()
     
+    fast = parse_quoted_list(text)
+    if fast is not None:
+        return fast
+    
     try:
         parsed = json.loads(text)
         if isinstance(parsed, list):
@@ -83,6 +206,19 @@ def parse_json_list(text):
     
     return [text.strip()] if text.strip() else []
 
+def _clean_steps(steps):
+    """Strip step numbering and terminate each step"""
+    cleaned = []
+    for step in steps:
+        step = step.strip()
+        if len(step) > 5:
+            if step[0].isdigit():
+                step = _STEP_NUMBER_RE.sub('', step)
+            if not step.endswith('.'):
+                step += '.'
+            cleaned.append(step)
+    return cleaned
+
 def parse_instructions(text):
     """Parse instructions"""
     if pd.isna(text) or not text:
@@ -92,27 +228,9 @@ def parse_instructions(text):
     
     parsed = parse_json_list(text)
     if parsed and len(parsed[0]) > 10:
-        cleaned = []
-        for step in parsed:
-            step = step.strip()
-            if len(step) > 5:
-                step = re.sub(r'^\d+[\.\):\-\s]+', '', step)
-                if not step.endswith('.'):
-                    step += '.'
-                cleaned.append(step)
-        return cleaned
-    
-    steps = re.split(r'\.\s+(?=[A-Z0-9])', text)
-    cleaned = []
-    for step in steps:
-        step = step.strip()
-        if len(step) > 5:
-            step = re.sub(r'^\d+[\.\):\-\s]+', '', step)
-            if not step.endswith('.'):
-                step += '.'
-            cleaned.append(step)
+        return _clean_steps(parsed)
     
-    return cleaned
+    return _clean_steps(_STEP_SPLIT_RE.split(text))
 
 def get_value(row, *names):
     """Get value from row"""
@@ -164,7 +282,7 @@ def process_row(row, source_name):
     ]
     
     instructions_raw = get_value(row, 'recipe', 'instructions', 'directions')
-    instructions_list = parse_instructions(instructions_raw)
+    instructions_list, step_timers = ingest_steps(parse_instructions(instructions_raw))
     
     if not instructions_list:
         return None
@@ -206,9 +324,181 @@ def process_row(row, source_name):
         'instructions': '|'.join(instructions_list),
         'search_text': search_text,
         'category': category,
-        'source': source_name
+        'source': source_name,
+        'step_timers': step_timers
     }
 
+def populate_ingredient_tables(db_file='recipes.db', batch_size=50000):
+    """Canonicalize ingredients of recipes not yet in recipe_ingredients
+
+    Incremental: only recipes with an id above the highest one already linked
+    are processed, so re-running after appending new files is cheap.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT id, name FROM ingredients')
+    vocab = {name: ing_id for ing_id, name in cursor.fetchall()}
+    next_id = max(vocab.values(), default=0) + 1
+    
+    cursor.execute('SELECT COALESCE(MAX(recipe_id), 0) FROM recipe_ingredients')
+    last_id = cursor.fetchone()[0]
+    
+    start = time.perf_counter()
+    processed = 0
+    links = 0
+    
+    while True:
+        cursor.execute('SELECT id, ingredients FROM recipes WHERE id > ? ORDER BY id LIMIT ?',
+                       (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        
+        new_ingredients = []
+        pairs = []
+        for recipe_id, ingredients in rows:
+            seen = set()
+            for raw in (ingredients or '').split('|'):
+                name = canonicalize_ingredient(raw)
+                if not name or name in seen:
+                    continue
+                seen.add(name)
+                ing_id = vocab.get(name)
+                if ing_id is None:
+                    ing_id = vocab[name] = next_id
+                    next_id += 1
+                    new_ingredients.append((ing_id, name))
+                pairs.append((recipe_id, ing_id))
+        
+        cursor.executemany('INSERT INTO ingredients (id, name) VALUES (?, ?)', new_ingredients)
+        cursor.executemany('INSERT OR IGNORE INTO recipe_ingredients (recipe_id, ingredient_id) VALUES (?, ?)', pairs)
+        conn.commit()
+        
+        last_id = rows[-1][0]
+        processed += len(rows)
+        links += len(pairs)
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient '
+                   'ON recipe_ingredients(ingredient_id, recipe_id)')
+    conn.commit()
+    conn.close()
+    
+    elapsed = time.perf_counter() - start
+    print(f"🥕 Ingredients: {processed:,} recipes, {links:,} links, {len(vocab):,} canonical names "
+          f"({elapsed:.1f}s)")
+
+def populate_step_timers(db_file='recipes.db', batch_size=50000):
+    """Normalize steps and store step_timers for recipes loaded before the column existed
+
+    Incremental: only rows with step_timers NULL are touched, and instructions
+    is only rewritten where normalization changed the steps.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    if not has_step_timers(conn):
+        cursor.execute('ALTER TABLE recipes ADD COLUMN step_timers TEXT')
+    
+    start = time.perf_counter()
+    processed = changed = 0
+    last_id = 0
+    while True:
+        cursor.execute('SELECT id, instructions FROM recipes WHERE id > ? AND step_timers IS NULL '
+                       'ORDER BY id LIMIT ?', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        timers_only = []
+        rewritten = []
+        for recipe_id, instructions in rows:
+            steps, parsed = recipe_steps(instructions)
+            step_timers = encode_step_timers([p['durations'] for p in parsed])
+            normalized = '|'.join(steps)
+            if normalized == instructions:
+                timers_only.append((step_timers, recipe_id))
+            else:
+                rewritten.append((normalized, step_timers, recipe_id))
+        cursor.executemany('UPDATE recipes SET step_timers = ? WHERE id = ?', timers_only)
+        cursor.executemany('UPDATE recipes SET instructions = ?, step_timers = ? WHERE id = ?', rewritten)
+        conn.commit()
+        last_id = rows[-1][0]
+        processed += len(rows)
+        changed += len(rewritten)
+    conn.close()
+    
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  Step timers: {processed:,} recipes backfilled, {changed:,} with re-normalized steps ({elapsed:.1f}s)")
+    return {'recipes': processed, 'rewritten': changed}
+
+def assign_clusters(db_file='recipes.db', batch_size=5000):
+    """MinHash/LSH near-duplicate clustering; sets recipes.cluster_id
+
+    cluster_id is the smallest recipe id in the cluster, so representatives
+    are the rows with cluster_id = id; recipes without near-duplicates keep
+    NULL (dedup.INDEXABLE_WHERE). Recomputed over the whole table, but only
+    rows whose cluster_id changes are written, and the update trigger does
+    not re-index FTS for them. Signatures for the whole table are held in
+    memory: 512 bytes per recipe (~1.1 GB at 2.2M recipes).
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    if not has_clusters(conn):
+        cursor.execute('ALTER TABLE recipes ADD COLUMN cluster_id INTEGER')
+    
+    start = time.perf_counter()
+    hasher = MinHasher()
+    ids = []
+    current = []
+    signatures = []
+    valid = []
+    last_id = 0
+    
+    while True:
+        cursor.execute('SELECT id, name, cluster_id FROM recipes WHERE id > ? ORDER BY id LIMIT ?',
+                       (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        first_id, last_id = rows[0][0], rows[-1][0]
+        
+        cursor.execute('SELECT recipe_id, ingredient_id FROM recipe_ingredients '
+                       'WHERE recipe_id BETWEEN ? AND ? ORDER BY recipe_id', (first_id, last_id))
+        by_recipe = {}
+        for recipe_id, ingredient_id in cursor.fetchall():
+            by_recipe.setdefault(recipe_id, []).append(ingredient_id)
+        
+        tokens = []
+        for recipe_id, name, _ in rows:
+            ingredient_ids = by_recipe.get(recipe_id, [])
+            tokens.append(recipe_token_hashes(name, ingredient_ids))
+            # Without ingredients, name words alone are too weak to call a duplicate
+            valid.append(bool(ingredient_ids))
+        ids.extend(r[0] for r in rows)
+        current.extend(r[2] for r in rows)
+        signatures.append(hasher.signatures(tokens))
+    
+    if not ids:
+        conn.close()
+        return
+    
+    ids = np.array(ids, dtype=np.int64)
+    labels = cluster_signatures(np.vstack(signatures), valid=np.array(valid))
+    sizes = np.bincount(labels, minlength=len(ids))
+    cluster_ids = [int(c) if size > 1 else None for c, size in zip(ids[labels], sizes[labels])]
+    updates = [(c, int(r_id)) for c, r_id, old in zip(cluster_ids, ids, current) if c != old]
+    cursor.executemany('UPDATE recipes SET cluster_id = ? WHERE id = ?', updates)
+    conn.commit()
+    conn.close()
+    
+    total = len(ids)
+    representatives = int(np.count_nonzero(labels == np.arange(total)))
+    elapsed = time.perf_counter() - start
+    print(f"🧬 Near-duplicates: {total:,} recipes -> {representatives:,} clusters "
+          f"({(1 - representatives / total) * 100:.1f}% reduction, {elapsed:.1f}s)")
+    print(f"   build_models.py will index {representatives:,} rows instead of {total:,} "
+          f"(~{(1 - representatives / total) * 100:.0f}% less encoding time)")
+    return {'recipes': total, 'clusters': representatives, 'updated': len(updates)}
+
 def load_file(file_path):
     """Load file"""
     ext = os.path.splitext(file_path)[1].lower()
@@ -223,16 +513,42 @@ def load_file(file_path):
             return pd.read_csv(file_path, encoding='latin-1')
     return None
 
-def files_to_database(files, db_file='recipes.db', clear_existing=False):
-    """Convert files to database"""
+def files_to_database(files, db_file='recipes.db', clear_existing=False, bulk=False):
+    """Convert files to database
+
+    bulk=True drops secondary indexes, loads each file in one transaction with
+    relaxed durability pragmas, then rebuilds indexes, ANALYZEs and VACUUMs.
+    Without a journal a failed file cannot be rolled back, so in bulk mode an
+    error aborts the load (rerun from scratch); otherwise the file's
+    uncommitted batch is rolled back and the next file is loaded.
+    Rows process_row cannot parse are skipped in both modes.
+    """
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
     
+    if bulk:
+        for pragma in BULK_PRAGMAS:
+            cursor.execute(pragma)
+        drop_indexes(conn)
+        drop_fts_triggers(conn)
+        cursor.execute(FTS_TABLE_SQL)
+        conn.commit()
+        print("⚡ Bulk-load mode: indexes deferred, journaling off\n")
+    
     if clear_existing:
         cursor.execute('DELETE FROM recipes')
+        cursor.execute('DELETE FROM recipe_ingredients')
+        cursor.execute('DELETE FROM ingredients')
+        if bulk:
+            cursor.execute("INSERT INTO recipes_fts(recipes_fts) VALUES('delete-all')")
         conn.commit()
         print("🗑️  Cleared existing data\n")
     
+    # Large batches in bulk mode; commit only at the end of each file
+    batch_size = 5000 if bulk else 500
+    load_start = time.perf_counter()
+    loaded = 0
+    
     for file_path in files:
         if not os.path.exists(file_path):
             print(f"⚠️  Not found: {file_path}\n")
@@ -249,43 +565,57 @@ def files_to_database(files, db_file='recipes.db', clear_existing=False):
             print(f"   Rows: {len(df):,}")
             
             success = 0
-            batch_size = 500
             batch_records = []
+            file_start = time.perf_counter()
             
             for idx, row in df.iterrows():
                 try:
                     record = process_row(row, source_name)
-                    if record:
-                        batch_records.append(record)
-                        success += 1
-                        
-                        if len(batch_records) >= batch_size:
-                            cursor.executemany('''
-                                INSERT INTO recipes (name, image_url, description, cuisine, 
-                                                   course, diet, prep_time, difficulty, spice_level,
-                                                   meal_type, ingredients, instructions, 
-                                                   search_text, category, source)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', [tuple(r.values()) for r in batch_records])
-                            conn.commit()
-                            batch_records = []
-                except:
+                except Exception:
                     continue
+                if record:
+                    batch_records.append(record)
+                    success += 1
+                    
+                    if len(batch_records) >= batch_size:
+                        cursor.executemany(INSERT_SQL, [tuple(r.values()) for r in batch_records])
+                        if not bulk:
+                            conn.commit()
+                        batch_records = []
             
             if batch_records:
-                cursor.executemany('''
-                    INSERT INTO recipes (name, image_url, description, cuisine, 
-                                       course, diet, prep_time, difficulty, spice_level,
-                                       meal_type, ingredients, instructions, 
-                                       search_text, category, source)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', [tuple(r.values()) for r in batch_records])
-                conn.commit()
+                cursor.executemany(INSERT_SQL, [tuple(r.values()) for r in batch_records])
+            conn.commit()
+            loaded += success
             
-            print(f"   ✅ Inserted: {success:,}/{len(df):,}\n")
+            elapsed = time.perf_counter() - file_start
+            print(f"   ✅ Inserted: {success:,}/{len(df):,} ({success / max(elapsed, 1e-9):,.0f} rows/sec)\n")
             
         except Exception as e:
             print(f"   ❌ Error: {str(e)}\n")
+            if bulk:
+                conn.close()
+                raise
+            conn.rollback()
+    
+    load_elapsed = time.perf_counter() - load_start
+    
+    if bulk:
+        print("🔧 Building indexes...")
+        create_indexes(conn)
+        conn.commit()
+        print("🔧 Building full-text index...")
+        rebuild_fts_index(conn)
+        create_fts_triggers(conn)
+        conn.commit()
+        print("🔧 ANALYZE + VACUUM...")
+        cursor.execute('ANALYZE')
+        conn.commit()
+        cursor.execute('VACUUM')
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    
+    total_elapsed = time.perf_counter() - load_start
     
     cursor.execute('SELECT COUNT(*) FROM recipes')
     total = cursor.fetchone()[0]
@@ -301,19 +631,43 @@ def files_to_database(files, db_file='recipes.db', clear_existing=False):
     
     conn.close()
     
+    db_size = os.path.getsize(db_file) / (1024 * 1024)
+    
     print("=" * 60)
     print(f"📊 Final Statistics:")
     print(f"   Total: {total:,}")
-    print(f"   Veg: {veg:,} ({veg/total*100:.1f}%)")
-    print(f"   Non-veg: {non_veg:,} ({non_veg/total*100:.1f}%)")
+    print(f"   Veg: {veg:,} ({veg/max(total, 1)*100:.1f}%)")
+    print(f"   Non-veg: {non_veg:,} ({non_veg/max(total, 1)*100:.1f}%)")
     print(f"   Cuisines: {cuisines}")
+    print(f"   Load: {loaded:,} rows in {load_elapsed:.1f}s ({loaded / max(load_elapsed, 1e-9):,.0f} rows/sec)")
+    print(f"   Total incl. indexes: {total_elapsed:.1f}s")
+    print(f"   DB size: {db_size:.1f} MB")
     print("=" * 60)
+    
+    return {
+        'rows': loaded,
+        'load_seconds': load_elapsed,
+        'total_seconds': total_elapsed,
+        'db_size_mb': db_size,
+    }
 
 if __name__ == "__main__":
     print("🔧 Recipe Database Creator")
     print("=" * 60 + "\n")
     
-    create_database()
+    parser = argparse.ArgumentParser(description='Build recipes.db from data/ files')
+    parser.add_argument('--no-bulk', action='store_true',
+                        help='Load with default journaling and per-batch commits')
+    parser.add_argument('--backfill-steps', action='store_true',
+                        help='Only add normalized steps and step_timers to an existing recipes.db')
+    args = parser.parse_args()
+    bulk = not args.no_bulk
+    
+    if args.backfill_steps:
+        populate_step_timers()
+        raise SystemExit(0)
+    
+    create_database(with_indexes=not bulk)
     
     # Files in data/ folder
     files = [
@@ -322,5 +676,14 @@ if __name__ == "__main__":
         'data/cuisines.csv'
     ]
     
-    files_to_database(files, clear_existing=True)
+    files_to_database(files, clear_existing=True, bulk=bulk)
+    
+    populate_ingredient_tables()
+    assign_clusters()
+    index = build_ingredient_index(output_file=INGREDIENT_INDEX_FILE)
+    print(f"💾 Ingredient postings saved: {INGREDIENT_INDEX_FILE} "
+          f"({index.num_ingredients:,} ingredients, {len(index.indices):,} postings)")
+    pantry_matrix = build_pantry_matrix(index, output_file=PANTRY_MATRIX_FILE)
+    print(f"💾 Pantry matrix saved: {PANTRY_MATRIX_FILE} "
+          f"({pantry_matrix.shape[0]:,} x {pantry_matrix.shape[1]:,}, {pantry_matrix.nnz:,} non-staple entries)")
     print("\n✅ Database ready!")
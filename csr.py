@@ -0,0 +1,62 @@
+# csr.py
+"""
+Read-only CSR matrices on plain NumPy arrays, for the query path
+
+Builds write the sparse shards and the pantry matrix with
+scipy.sparse.save_npz; at query time the only operations needed are "score
+every row against one (mostly zero) vector" and "take a few rows", so this
+reads the same .npz files with np.load and does both in NumPy. Serving
+processes never import scipy.
+"""
+
+import numpy as np
+
+
+class CSRMatrix:
+    def __init__(self, data, indices, indptr, shape):
+        self.data = np.asarray(data)
+        self.indices = np.asarray(indices)
+        self.indptr = np.asarray(indptr)
+        self.shape = (int(shape[0]), int(shape[1]))
+
+    @classmethod
+    def load_npz(cls, path):
+        """Matrix written by scipy.sparse.save_npz in CSR format"""
+        with np.load(path, allow_pickle=False) as f:
+            fmt = f['format'].item()
+            fmt = fmt.decode() if isinstance(fmt, bytes) else fmt
+            if fmt != 'csr':
+                raise ValueError(f"{path}: expected a CSR matrix, got {fmt}")
+            return cls(f['data'], f['indices'], f['indptr'], f['shape'])
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    def row_lengths(self):
+        return np.diff(self.indptr)
+
+    def dot(self, vec):
+        """self @ vec for a dense vector over the columns, as float32 row scores"""
+        scores = np.zeros(self.shape[0], dtype=np.float32)
+        if self.nnz == 0:
+            return scores
+        products = np.take(vec, self.indices) * self.data
+        # reduceat sums products[indptr[i]:indptr[i + 1]]; empty rows would get one stray element
+        lengths = self.row_lengths()
+        nonempty = lengths > 0
+        scores[nonempty] = np.add.reduceat(products, self.indptr[:-1][nonempty])
+        return scores
+
+    def take_rows(self, rows):
+        """New CSRMatrix of the given rows, in order"""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(self.indptr.dtype)
+        positions = (np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])).astype(np.int64)
+        return CSRMatrix(self.data[positions], self.indices[positions], indptr, (len(rows), self.shape[1]))
@@ -0,0 +1,133 @@
+# dedup.py
+"""
+MinHash + LSH near-duplicate detection for recipes
+
+Each recipe becomes a token set (canonical ingredient ids + name words).
+MinHash signatures are banded for LSH; recipes sharing a band bucket whose
+signatures agree on at least `threshold` of their hashes are linked, and
+connected components become clusters. create_db.assign_clusters() stores
+the cluster's representative id in recipes.cluster_id (NULL for recipes
+without near-duplicates).
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERM = 128
+NUM_BANDS = 16
+THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r'[a-z]+')
+
+# Clause selecting the rows build_models.py should index (cluster representatives)
+INDEXABLE_WHERE = 'cluster_id IS NULL OR cluster_id = id'
+
+
+def has_clusters(conn):
+    """True if recipes has a cluster_id column"""
+    columns = [r[1] for r in conn.execute('PRAGMA table_info(recipes)')]
+    return 'cluster_id' in columns
+
+
+def indexable_where(conn):
+    """WHERE clause (possibly empty) restricting recipes to cluster representatives"""
+    return f'WHERE {INDEXABLE_WHERE}' if has_clusters(conn) else ''
+
+
+def recipe_token_hashes(name, ingredient_ids):
+    """uint32 token hashes: ingredient ids (mixed) + crc32 of name words"""
+    ing = (np.asarray(ingredient_ids, dtype=np.uint64) * np.uint64(0x9E3779B1)) & _MAX_HASH
+    words = {zlib.crc32(b'n:' + w.encode()) for w in _WORD_RE.findall((name or '').lower())}
+    return np.concatenate([ing, np.fromiter(words, dtype=np.uint64, count=len(words))])
+
+
+class MinHasher:
+    """Universal-hash MinHash: h_i(x) = (a_i * x + b_i) mod (2^61 - 1), truncated to 32 bits"""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # a < 2^29 and x < 2^32 keep a*x + b below 2^61 without uint64 overflow
+        self.a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signatures(self, token_hash_lists):
+        """(len(lists), num_perm) uint32 signatures; empty sets get all-max rows"""
+        n = len(token_hash_lists)
+        sigs = np.full((n, self.num_perm), 0xFFFFFFFF, dtype=np.uint32)
+        lengths = np.array([len(t) for t in token_hash_lists], dtype=np.int64)
+        nonempty = np.flatnonzero(lengths)
+        if len(nonempty) == 0:
+            return sigs
+
+        tokens = np.concatenate([token_hash_lists[i] for i in nonempty]).astype(np.uint64)
+        offsets = np.zeros(len(nonempty), dtype=np.int64)
+        np.cumsum(lengths[nonempty][:-1], out=offsets[1:])
+
+        hashed = (tokens[:, None] * self.a[None, :] + self.b[None, :]) % _MERSENNE_PRIME
+        hashed &= _MAX_HASH
+        sigs[nonempty] = np.minimum.reduceat(hashed, offsets, axis=0).astype(np.uint32)
+        return sigs
+
+
+def _band_keys(band):
+    """Collapse a (n, rows) uint32 band into one uint64 key per row"""
+    key = np.zeros(len(band), dtype=np.uint64)
+    for j in range(band.shape[1]):
+        key = key * np.uint64(0x100000001B3) + band[:, j].astype(np.uint64)
+    return key
+
+
+def cluster_signatures(signatures, num_bands=NUM_BANDS, threshold=THRESHOLD, valid=None, block=200000):
+    """Cluster label per row: the smallest row index in its near-duplicate component
+
+    valid: optional bool mask; invalid rows (e.g. empty token sets) stay singletons.
+    """
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // num_bands
+    positions = np.arange(n)
+    src, dst = [], []
+
+    for b in range(num_bands):
+        key = _band_keys(signatures[:, b * rows_per_band:(b + 1) * rows_per_band])
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        starts = np.ones(n, dtype=bool)
+        starts[1:] = sorted_key[1:] != sorted_key[:-1]
+        # Stable sort: a bucket's first element is its smallest row
+        first = order[np.maximum.accumulate(np.where(starts, positions, 0))]
+        members, heads = order[~starts], first[~starts]
+        if valid is not None:
+            ok = valid[members] & valid[heads]
+            members, heads = members[ok], heads[ok]
+
+        # Verify LSH candidates against the estimated Jaccard similarity
+        for s in range(0, len(members), block):
+            m, h = members[s:s + block], heads[s:s + block]
+            agree = (signatures[m] == signatures[h]).mean(axis=1)
+            keep = agree >= threshold
+            src.append(m[keep])
+            dst.append(h[keep])
+
+    labels = positions.copy()
+    if not src:
+        return labels
+    src = np.concatenate(src)
+    dst = np.concatenate(dst)
+    if len(src) == 0:
+        return labels
+
+    # Min-label propagation with pointer jumping until components are stable
+    while True:
+        low = np.minimum(labels[src], labels[dst])
+        new = labels.copy()
+        np.minimum.at(new, src, low)
+        np.minimum.at(new, dst, low)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
@@ -0,0 +1,220 @@
+# dense_index.py
+"""
+Dense retrieval over the embedding shards with a PCA-projected prefilter
+
+build_models.py fits an uncentered PCA (top right-singular vectors of a
+sample of normalized embeddings) and writes a reduced copy of every shard
+(proj_chunk_i.npy). Because the projection is uncentered, projected dot
+products approximate the full ones, so a cheap first pass over the small
+vectors picks a few thousand candidates that are then reranked exactly with
+the 384-dim vectors read from the memory-mapped shards.
+
+anytime_search() scans shard by shard instead, most promising first (by the
+query's similarity to each shard's mean projected vector), and stops at a
+deadline with the best top-k so far and how many rows it covered.
+"""
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+PROJECTION_FILE = 'projection.npz'
+PROJECTION_DIMS = 128
+PROJECTION_SAMPLE = 200000
+RERANK_CANDIDATES = 2000
+
+
+def normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def top_k_desc(scores, k):
+    """Indices of the k largest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class Projection:
+    """dims x full-dim matrix; project(x) = normalize(x) @ components.T"""
+
+    def __init__(self, components):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, sample, dims=PROJECTION_DIMS):
+        sample = normalize_rows(sample)
+        dims = min(dims, sample.shape[1])
+        # Uncentered: keeps the dominant (mean) direction so dot products carry over
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        return cls(vt[:dims])
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path)['components'])
+
+    def save(self, file):
+        np.savez(file, components=self.components)
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    def fingerprint(self):
+        return hashlib.blake2b(self.components.tobytes(), digest_size=8).hexdigest()
+
+    def project(self, x):
+        return normalize_rows(x) @ self.components.T
+
+
+class DenseIndex:
+    """Top-k cosine search over the embedding shards listed in recipe_models.pkl
+
+    With a projection and every shard's 'proj' file present, the projected
+    vectors are held in memory and only rerank candidates touch the full
+    vectors; otherwise each shard is scanned exactly as before.
+    """
+
+    def __init__(self, chunks_dir, chunk_files, chunk_offsets, projection=None,
+                 rerank_candidates=RERANK_CANDIDATES):
+        self.chunks_dir = chunks_dir
+        self.chunk_files = chunk_files
+        self.chunk_offsets = np.asarray(chunk_offsets, dtype=np.int64)
+        self.rerank_candidates = rerank_candidates
+        self.projection = None
+        self.projected = None
+        self.centroids = None
+
+        if projection is not None and chunk_files and all(f.get('proj') for f in chunk_files):
+            parts = [np.load(self._path(f['proj'])) for f in chunk_files]
+            self.projected = np.ascontiguousarray(np.concatenate(parts), dtype=np.float32)
+            self.projection = projection
+            self.centroids = self._centroids()
+        self._full = [None] * len(chunk_files)
+
+    @classmethod
+    def from_models(cls, models_data, rerank_candidates=RERANK_CANDIDATES):
+        projection = None
+        projection_file = models_data.get('projection_file')
+        if projection_file and os.path.exists(projection_file):
+            projection = Projection.load(projection_file)
+        return cls(models_data['chunks_dir'], models_data['chunk_files'], models_data['chunk_offsets'],
+                   projection, rerank_candidates)
+
+    def _centroids(self):
+        """Mean projected vector of each shard, for ordering shards by a query"""
+        ends = np.append(self.chunk_offsets[1:], len(self.projected))
+        lengths = ends - self.chunk_offsets
+        centroids = np.zeros((len(lengths), self.projected.shape[1]), dtype=np.float32)
+        nonempty = lengths > 0
+        if nonempty.any():
+            sums = np.add.reduceat(self.projected, self.chunk_offsets[nonempty], axis=0)
+            centroids[nonempty] = sums / lengths[nonempty, None]
+        return centroids
+
+    def _path(self, name):
+        return os.path.join(self.chunks_dir, name)
+
+    def _shard(self, i):
+        """Full-dimension shard, memory-mapped on first use"""
+        if self._full[i] is None:
+            self._full[i] = np.load(self._path(self.chunk_files[i]['emb']), mmap_mode='r')
+        return self._full[i]
+
+    @property
+    def memory_bytes(self):
+        return 0 if self.projected is None else self.projected.nbytes
+
+    def exact_search(self, query_emb, top_k=10):
+        """(global rows, scores) by scanning every full shard"""
+        query = normalize_rows(np.atleast_2d(query_emb))[0]
+        rows, scores = [], []
+        for i, files in enumerate(self.chunk_files):
+            path = self._path(files['emb'])
+            if not os.path.exists(path):
+                continue
+            sims = normalize_rows(np.load(path)) @ query
+            top = top_k_desc(sims, top_k)
+            rows.append(self.chunk_offsets[i] + top)
+            scores.append(sims[top])
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        best = top_k_desc(scores, top_k)
+        return rows[best], scores[best]
+
+    def search(self, query_emb, top_k=10):
+        """(global rows, scores): projected prefilter + full rerank, or exact scan"""
+        if self.projected is None:
+            return self.exact_search(query_emb, top_k)
+
+        query = normalize_rows(np.atleast_2d(query_emb))
+        candidates = top_k_desc(self.projected @ self.projection.project(query)[0],
+                                max(self.rerank_candidates, top_k))
+        return self.rerank(query[0], candidates, top_k)
+
+    def shard_order(self, query_emb):
+        """Shard positions, most promising first; file order without the projected prefilter"""
+        if self.centroids is None:
+            return list(range(len(self.chunk_files)))
+        query = self.projection.project(np.atleast_2d(query_emb))[0]
+        return np.argsort(-(self.centroids @ query), kind='stable').tolist()
+
+    def anytime_search(self, query_emb, top_k=10, deadline=None):
+        """(global rows, scores, rows searched), shard by shard in shard_order()
+
+        Stops before the next shard once time.monotonic() passes deadline; the
+        first shard is always searched. With the prefilter each shard reranks
+        its share of rerank_candidates, so a complete pass matches search()
+        up to prefilter recall.
+        """
+        query = normalize_rows(np.atleast_2d(query_emb))
+        query_proj = self.projection.project(query)[0] if self.projected is not None else None
+        query = query[0]
+        rows, scores = [], []
+        searched = 0
+        for n, i in enumerate(self.shard_order(query_emb)):
+            if n and deadline is not None and time.monotonic() >= deadline:
+                break
+            start = self.chunk_offsets[i]
+            if query_proj is not None:
+                end = self.chunk_offsets[i + 1] if i + 1 < len(self.chunk_offsets) else len(self.projected)
+                if end == start:
+                    continue
+                share = -(-self.rerank_candidates * (end - start) // len(self.projected))
+                local = np.sort(top_k_desc(self.projected[start:end] @ query_proj, max(share, top_k)))
+                sims = normalize_rows(self._shard(i)[local]) @ query
+                searched += int(end - start)
+            else:
+                if not os.path.exists(self._path(self.chunk_files[i]['emb'])):
+                    continue
+                shard = self._shard(i)
+                local = np.arange(len(shard))
+                sims = normalize_rows(shard) @ query
+                searched += len(shard)
+            top = top_k_desc(sims, top_k)
+            rows.append(start + local[top])
+            scores.append(sims[top])
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), searched
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        best = top_k_desc(scores, top_k)
+        return rows[best], scores[best], searched
+
+    def rerank(self, query, rows, top_k):
+        """Exact cosine for the given global rows, read shard by shard"""
+        rows = np.sort(rows)
+        shard_of = np.searchsorted(self.chunk_offsets, rows, side='right') - 1
+        scores = np.empty(len(rows), dtype=np.float32)
+        for i in np.unique(shard_of):
+            mask = shard_of == i
+            local = rows[mask] - self.chunk_offsets[i]
+            scores[mask] = normalize_rows(self._shard(i)[local]) @ query
+        best = top_k_desc(scores, top_k)
+        return rows[best], scores[best]
@@ -2,57 +2,31 @@
 
 Use this for local testing of DB reads, normalization, and the UI without loading
 SentenceTransformer/scikit-learn/torch. It provides a `/search` endpoint that
-performs a simple SQL LIKE match and returns normalized recipes.
+ranks recipes with the FTS5 keyword index (falling back to a SQL LIKE match on
+databases built before recipes_fts existed) and returns normalized recipes.
 """
 from flask import Flask, request, jsonify, render_template
 import sqlite3
-import re
-import json
 import os
 
+from keyword_search import has_fts_index, keyword_search
+from instructions import has_step_timers, recipe_steps
+
 app = Flask(__name__)
 DB_FILE = 'recipes.db'
 
 
-def _normalize_instruction(step):
-    if not isinstance(step, str):
-        return step
-    s = step.strip()
-
-    # If looks like JSON array
-    if s.startswith('[') and s.endswith(']'):
-        try:
-            parsed = json.loads(s)
-            if isinstance(parsed, list):
-                text = ' '.join([str(t).strip() for t in parsed if t])
-                text = re.sub(r"\s+([.,;:!?])", r"\1", text)
-                s = text
-        except Exception:
-            pass
-
-    try:
-        if '\\u' in s or '\\n' in s:
-            s = s.encode('utf-8').decode('unicode_escape')
-    except Exception:
-        pass
-
-    s = s.replace('â', '')
-    s = s.replace('\u00b0', '')
-    s = s.replace('Â', '')
-    s = re.sub(r'[\x00-\x1f\x7f]', '', s)
-    s = s.replace('|', '\n')
-    s = s.strip()
-    return s
-
-
 def get_recipe_by_id(recipe_id):
     conn = sqlite3.connect(DB_FILE)
     cur = conn.cursor()
-    cur.execute('SELECT id, name, image_url, description, cuisine, course, diet, prep_time, ingredients, instructions, category FROM recipes WHERE id = ?', (recipe_id,))
+    step_timers = 'step_timers' if has_step_timers(conn) else 'NULL'
+    cur.execute(f'SELECT id, name, image_url, description, cuisine, course, diet, prep_time, ingredients, instructions, category, {step_timers} FROM recipes WHERE id = ?', (recipe_id,))
     row = cur.fetchone()
     conn.close()
     if not row:
         return None
+    # Steps and timers were normalized at ingest; older rows are normalized here
+    steps, parsed_steps = recipe_steps(row[9], row[11])
     return {
         'id': row[0],
         'name': row[1],
@@ -63,7 +37,8 @@ def get_recipe_by_id(recipe_id):
         'diet': row[6],
         'prep_time': row[7],
         'ingredients': [i.strip() for i in row[8].split('|') if i.strip()],
-        'instructions': [_normalize_instruction(i.strip()) for i in row[9].split('|') if i.strip()],
+        'instructions': steps,
+        'parsed_steps': parsed_steps,
         'category': row[10]
     }
 
@@ -84,15 +59,19 @@ def search():
     if not query:
         return jsonify({'success': False, 'error': 'No query provided'})
 
-    # Simple SQL LIKE search across name and ingredients
-    q = f"%{query}%"
     conn = sqlite3.connect(DB_FILE)
     cur = conn.cursor()
-    if category and category != 'all':
-        cur.execute("SELECT id FROM recipes WHERE (name LIKE ? OR ingredients LIKE ?) AND category = ? LIMIT 20", (q, q, category))
+    if has_fts_index(conn):
+        rows = keyword_search(conn, query, top_k=20,
+                              category=category if category and category != 'all' else None)
     else:
-        cur.execute("SELECT id FROM recipes WHERE name LIKE ? OR ingredients LIKE ? LIMIT 20", (q, q))
-    rows = cur.fetchall()
+        # Simple SQL LIKE search across name and ingredients
+        q = f"%{query}%"
+        if category and category != 'all':
+            cur.execute("SELECT id FROM recipes WHERE (name LIKE ? OR ingredients LIKE ?) AND category = ? LIMIT 20", (q, q, category))
+        else:
+            cur.execute("SELECT id FROM recipes WHERE name LIKE ? OR ingredients LIKE ? LIMIT 20", (q, q))
+        rows = cur.fetchall()
     conn.close()
 
     recipes = []
@@ -0,0 +1,158 @@
+# embedding_cache.py
+"""
+Content-addressed embedding cache shared across model builds
+
+Keys are 64-bit blake2b hashes of the encoder name plus the whitespace-
+normalized search_text, so re-ingesting the database (which reassigns ids)
+does not force re-encoding unchanged texts. Vectors are appended to a raw
+float32 file read through np.memmap; a sorted key -> row index is rewritten
+atomically on flush. Rows appended after the last flush are ignored (and
+overwritten) on the next open, so an interrupted build never corrupts it.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = 'embedding_cache'
+VECTORS_FILE = 'vectors.f32'
+INDEX_FILE = 'index.npz'
+FLUSH_ROWS = 100000
+
+
+def normalize_text(text):
+    """Collapse whitespace; the encoder's tokenizer ignores it anyway"""
+    return ' '.join((text or '').split())
+
+
+def content_keys(texts, encoder_name):
+    """uint64 cache key per text for the given encoder"""
+    prefix = encoder_name.encode('utf-8') + b'\0'
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(prefix + normalize_text(t).encode('utf-8'), digest_size=8).digest(),
+                        'little')
+         for t in texts],
+        dtype=np.uint64,
+    )
+
+
+class EmbeddingCache:
+    """Memory-mapped vector store with a sorted uint64 key index"""
+
+    def __init__(self, cache_dir=EMBEDDING_CACHE_DIR, encoder_name=''):
+        self.cache_dir = cache_dir
+        self.encoder_name = encoder_name
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.dim = None
+        self.count = 0
+        self.vectors = None
+        self._pending = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+        if os.path.exists(self._path(INDEX_FILE)):
+            # dim and count live in the index so one rename publishes a consistent state
+            data = np.load(self._path(INDEX_FILE))
+            self.keys, self.rows = data['keys'], data['rows']
+            self.dim, self.count = int(data['dim']), int(data['count'])
+            self._map()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _map(self):
+        self.vectors = None
+        if self.count:
+            self.vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r',
+                                     shape=(self.count, self.dim))
+
+    def __len__(self):
+        return len(self.keys) + len(self._pending)
+
+    def keys_for(self, texts):
+        return content_keys(texts, self.encoder_name)
+
+    def lookup(self, keys):
+        """(hit mask, (hits, dim) float32 vectors in key order)"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        hit = np.zeros(len(keys), dtype=bool)
+        if self.dim is None:
+            return hit, np.zeros((0, 0), dtype=np.float32)
+
+        out = np.empty((len(keys), self.dim), dtype=np.float32)
+        if len(self.keys):
+            pos = np.searchsorted(self.keys, keys)
+            found = pos < len(self.keys)
+            found[found] = self.keys[pos[found]] == keys[found]
+            if found.any():
+                rows = self.rows[pos[found]]
+                # Sorted row order turns the gather into a forward scan of the memmap
+                order = np.argsort(rows, kind='stable')
+                gathered = np.empty((len(rows), self.dim), dtype=np.float32)
+                gathered[order] = self.vectors[rows[order]]
+                out[found] = gathered
+                hit = found
+        for i in np.flatnonzero(~hit):
+            vec = self._pending.get(int(keys[i]))
+            if vec is not None:
+                out[i] = vec
+                hit[i] = True
+        return hit, out[hit]
+
+    def add(self, keys, vectors):
+        """Stage vectors for keys not already cached; flushes every FLUSH_ROWS rows"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f'embedding dim {vectors.shape[1]} does not match cache dim {self.dim}')
+
+        keys = np.asarray(keys, dtype=np.uint64)
+        if len(self.keys):
+            pos = np.searchsorted(self.keys, keys)
+            known = pos < len(self.keys)
+            known[known] = self.keys[pos[known]] == keys[known]
+        else:
+            known = np.zeros(len(keys), dtype=bool)
+        for i in np.flatnonzero(~known):
+            self._pending.setdefault(int(keys[i]), vectors[i])
+
+        if len(self._pending) >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Append staged vectors, then publish the merged index"""
+        if not self._pending:
+            return
+        new_keys = np.fromiter(self._pending.keys(), dtype=np.uint64, count=len(self._pending))
+        new_vectors = np.stack(list(self._pending.values()))
+
+        self.vectors = None  # release the memmap before touching the file
+        mode = 'r+b' if os.path.exists(self._path(VECTORS_FILE)) else 'wb'
+        with open(self._path(VECTORS_FILE), mode) as f:
+            # Drop rows from an interrupted flush that never reached the index
+            f.truncate(self.count * self.dim * 4)
+            f.seek(0, os.SEEK_END)
+            f.write(new_vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        keys = np.concatenate([self.keys, new_keys])
+        rows = np.concatenate([self.rows, np.arange(self.count, self.count + len(new_keys), dtype=np.int64)])
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.rows = keys[order], rows[order]
+        self.count += len(new_keys)
+        self._pending = {}
+
+        self._replace(INDEX_FILE, lambda f: np.savez(f, keys=self.keys, rows=self.rows,
+                                                     dim=self.dim, count=self.count))
+        self._map()
+
+    def _replace(self, name, write):
+        tmp_path = self._path(name) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(name))
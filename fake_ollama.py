@@ -0,0 +1,152 @@
+# fake_ollama.py
+"""
+Fake Ollama server for tests and offline load tests of /search
+
+Implements GET /api/tags and POST /api/generate (streaming NDJSON and
+non-streaming), answering with a JSON array of recipes built from the
+ingredients in the prompt, plus Ollama-style eval stats. Timing and faults
+are configurable:
+  latency          seconds before the first token (prompt eval)
+  tokens_per_sec   decode rate; 0 returns the whole answer at once
+  failure_rate     fraction of requests answered with HTTP 500
+  malformed_rate   fraction of answers that are not valid JSON
+
+Usage: python fake_ollama.py [--port 11434] [--latency 0.5] [--tokens-per-sec 200]
+                             [--failure-rate 0.01] [--malformed-rate 0.05]
+       OLLAMA_URL=http://127.0.0.1:11434 python app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import make_server
+
+MODEL_NAME = 'mistral:latest'
+
+
+class FakeOllamaConfig:
+    def __init__(self, latency=0.0, tokens_per_sec=0.0, failure_rate=0.0, malformed_rate=0.0, recipes=10,
+                 seed=None):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.recipes = recipes
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self, rate):
+        with self.lock:
+            return self.rng.random() < rate
+
+
+def prompt_ingredients(prompt):
+    """Ingredients from app.py's prompt ('...using ONLY these ingredients: "<query>"'), else generic ones"""
+    match = re.search(r'ingredients: "([^"]*)"', prompt or '')
+    words = re.split(r'[,\s]+', match.group(1)) if match else []
+    return [w for w in words if w] or ['rice', 'onion', 'tomato']
+
+
+def fake_answer(prompt, count, malformed=False):
+    ingredients = prompt_ingredients(prompt)
+    recipes = []
+    for i in range(count):
+        main = ingredients[i % len(ingredients)]
+        recipes.append({
+            'name': f"{main.title()} Special {i + 1}",
+            'description': f"A quick dish built around {main}.",
+            'ingredients': ingredients + ['salt', 'oil'],
+            'instructions': [f"Heat the oil and cook the {main} for {5 + i} minutes.",
+                             "Season with salt and serve hot."],
+        })
+    text = json.dumps(recipes, indent=2)
+    if malformed:
+        # Truncated mid-object, like a model that stopped early
+        text = text[:len(text) // 2]
+    return text
+
+
+def tokenize(text):
+    """Roughly word-sized pieces, whitespace kept so they concatenate back"""
+    return re.findall(r'\s*\S+', text) or [text]
+
+
+def create_app(config):
+    app = Flask(__name__)
+
+    @app.route('/api/tags')
+    def tags():
+        return jsonify({'models': [{'name': MODEL_NAME, 'model': MODEL_NAME, 'size': 4113301824}]})
+
+    @app.route('/api/generate', methods=['POST'])
+    def generate():
+        body = request.get_json(force=True, silent=True) or {}
+        start = time.perf_counter()
+        if config.roll(config.failure_rate):
+            return jsonify({'error': 'fake_ollama: injected failure'}), 500
+
+        prompt = body.get('prompt', '')
+        tokens = tokenize(fake_answer(prompt, config.recipes, malformed=config.roll(config.malformed_rate)))
+        prompt_tokens = len(tokenize(prompt))
+        model = body.get('model', MODEL_NAME)
+        delay = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+
+        def stats(decode_seconds):
+            total = time.perf_counter() - start
+            return {'done': True, 'done_reason': 'stop', 'total_duration': int(total * 1e9), 'load_duration': 0,
+                    'prompt_eval_count': prompt_tokens, 'prompt_eval_duration': int(config.latency * 1e9),
+                    'eval_count': len(tokens), 'eval_duration': int(max(decode_seconds, 1e-6) * 1e9)}
+
+        def created_at():
+            return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+        if body.get('stream', True):
+            def stream():
+                time.sleep(config.latency)
+                decode_start = time.perf_counter()
+                for token in tokens:
+                    if delay:
+                        time.sleep(delay)
+                    yield json.dumps({'model': model, 'created_at': created_at(), 'response': token,
+                                      'done': False}) + '\n'
+                yield json.dumps({'model': model, 'created_at': created_at(), 'response': '',
+                                  **stats(time.perf_counter() - decode_start)}) + '\n'
+            return Response(stream(), mimetype='application/x-ndjson')
+
+        time.sleep(config.latency + delay * len(tokens))
+        return jsonify({'model': model, 'created_at': created_at(), 'response': ''.join(tokens),
+                        **stats(delay * len(tokens))})
+
+    return app
+
+
+def start_in_thread(config, host='127.0.0.1', port=0):
+    """Serve in a daemon thread; returns (server, base URL). Stop with server.shutdown()"""
+    server = make_server(host, port, create_app(config), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fake Ollama server with configurable latency and faults')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds before the first token')
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0, help='Decode rate; 0 = instant')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--recipes', type=int, default=10, help='Recipes per answer')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(args.latency, args.tokens_per_sec, args.failure_rate, args.malformed_rate,
+                              args.recipes, args.seed)
+    print(f"[fake_ollama] Listening on http://{args.host}:{args.port} (latency {args.latency}s, "
+          f"{args.tokens_per_sec or 'instant'} tok/s, failures {args.failure_rate:.0%}, "
+          f"malformed {args.malformed_rate:.0%})", flush=True)
+    make_server(args.host, args.port, create_app(config), threaded=True).serve_forever()
@@ -5,22 +5,29 @@ import os
 from sklearn.feature_extraction.text import HashingVectorizer
 import sqlite3
 
+from dedup import indexable_where
+from sparse_weighting import WeightedHashingVectorizer, IDF_FILE
+
 # Get recipe IDs from database
 conn = sqlite3.connect('recipes.db')
 cursor = conn.cursor()
-cursor.execute('SELECT id FROM recipes ORDER BY id')
+cursor.execute(f'SELECT id FROM recipes {indexable_where(conn)} ORDER BY id')
 recipe_ids = [r[0] for r in cursor.fetchall()]
 conn.close()
 
-# Create vectorizer
-tfidf_vectorizer = HashingVectorizer(
-    n_features=2**18,
-    ngram_range=(1, 2),
-    alternate_sign=False
-)
-
 # Get chunk info from files
 chunks_dir = 'model_chunks'
+
+# Create vectorizer (the shards' saved IDF weighting if there is one)
+if os.path.exists(os.path.join(chunks_dir, IDF_FILE)):
+    tfidf_vectorizer = WeightedHashingVectorizer.load(os.path.join(chunks_dir, IDF_FILE))
+else:
+    tfidf_vectorizer = HashingVectorizer(
+        n_features=2**18,
+        ngram_range=(1, 2),
+        alternate_sign=False
+    )
+
 chunk_files = [f for f in os.listdir(chunks_dir) if f.startswith('tfidf_chunk_') and f.endswith('.npz')]
 chunk_indices = [int(f.split('_')[-1].split('.')[0]) for f in chunk_files]
 num_chunks = max(chunk_indices) + 1
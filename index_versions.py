@@ -0,0 +1,375 @@
+# index_versions.py
+"""
+Versioned index directories and hot swapping between them
+
+build_models.py --publish copies a finished build (recipe_models.pkl plus
+every shard file it references, hard-linked when possible) into
+index_versions/<version>/ and writes index.json, listing each file and its
+size, last; the directory is assembled under a temporary name and renamed
+into place, so a version is either complete or invisible.
+
+IndexManager serves queries from one active IndexVersion. A new version is
+loaded and warmed in a background thread, then swapped in under a lock, so
+requests never see a half-loaded index; requests already running keep the
+version they acquired, which is closed once the last of them releases it.
+ensure_watching() polls the versions directory for newer complete versions,
+reload() loads one on demand and rollback() goes back to the previously
+active version. Under serve.py all of this runs in the parent only (see
+app.update_index): it loads a version once and re-forks the workers, so
+they all serve the same version and share its pages.
+"""
+
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+VERSIONS_DIR = 'index_versions'
+VERSION_MANIFEST = 'index.json'
+MODELS_FILE = 'recipe_models.pkl'
+WATCH_INTERVAL = 10.0
+KEEP_VERSIONS = 3
+# Name of the version loaded from recipe_models.pkl in the working directory
+LEGACY_VERSION = 'legacy'
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def version_files(models_data):
+    """Files a recipe_models.pkl needs, relative to its chunks_dir"""
+    names = set()
+    for files in models_data.get('chunk_files') or []:
+        names.update(name for key, name in files.items() if name and key in ('emb', 'tfidf', 'proj'))
+    for key in ('projection_file', 'manifest_file'):
+        if models_data.get(key):
+            names.add(os.path.basename(models_data[key]))
+    return sorted(names)
+
+
+def publish(models_file=MODELS_FILE, versions_dir=VERSIONS_DIR, version=None, keep=KEEP_VERSIONS):
+    """Copy the build behind models_file into versions_dir/<version>; returns the version directory
+
+    Versions are named by UTC time, so they sort in publish order. All but
+    the newest `keep` versions are deleted afterwards (0 keeps everything);
+    processes still serving one keep their open files, and their rollback()
+    skips versions deleted here.
+    """
+    with open(models_file, 'rb') as f:
+        models_data = pickle.load(f)
+    chunks_dir = models_data['chunks_dir']
+    version = version or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    final = os.path.join(versions_dir, version)
+    if os.path.exists(final):
+        raise FileExistsError(f"index version {version} already exists")
+    tmp = os.path.join(versions_dir, f'.{version}.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    sizes = {}
+    for name in version_files(models_data):
+        src = os.path.join(chunks_dir, name)
+        if not os.path.exists(src):
+            continue
+        _link_or_copy(src, os.path.join(tmp, name))
+        sizes[name] = os.path.getsize(src)
+    # Paths inside the version are relative to its directory
+    models_data = {**models_data, 'chunks_dir': '.'}
+    for key in ('projection_file', 'manifest_file'):
+        if models_data.get(key):
+            models_data[key] = os.path.basename(models_data[key])
+    with open(os.path.join(tmp, MODELS_FILE), 'wb') as f:
+        pickle.dump(models_data, f, protocol=4)
+    sizes[MODELS_FILE] = os.path.getsize(os.path.join(tmp, MODELS_FILE))
+
+    manifest = {'version': version, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'recipes': len(models_data['recipe_ids']), 'files': sizes}
+    with open(os.path.join(tmp, VERSION_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, final)
+
+    if keep:
+        for name, path in list_versions(versions_dir)[:-keep]:
+            shutil.rmtree(path, ignore_errors=True)
+    return final
+
+
+def read_manifest(path):
+    """index.json of a complete version directory, else None"""
+    try:
+        with open(os.path.join(path, VERSION_MANIFEST)) as f:
+            manifest = json.load(f)
+        for name, size in manifest['files'].items():
+            if os.path.getsize(os.path.join(path, name)) != size:
+                return None
+        return manifest
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def list_versions(versions_dir=VERSIONS_DIR):
+    """[(version, path)] of complete versions, oldest first"""
+    try:
+        names = sorted(n for n in os.listdir(versions_dir) if not n.startswith('.'))
+    except FileNotFoundError:
+        return []
+    versions = []
+    for name in names:
+        path = os.path.join(versions_dir, name)
+        if os.path.isdir(path) and read_manifest(path) is not None:
+            versions.append((name, path))
+    return versions
+
+
+def version_exists(path):
+    """True if a version a manager once served is still on disk (publish may have deleted it)"""
+    return os.path.exists(os.path.join(path, MODELS_FILE))
+
+
+def resolve_paths(models_data, path):
+    """models_data with chunks_dir / projection_file / manifest_file taken relative to path"""
+    resolved = dict(models_data)
+    for key in ('chunks_dir', 'projection_file', 'manifest_file'):
+        if resolved.get(key):
+            resolved[key] = os.path.normpath(os.path.join(path, resolved[key]))
+    return resolved
+
+
+class IndexVersion:
+    """One loaded index and the number of requests using it
+
+    app.py fills in what it searches with (dense index, shard coordinator,
+    TF-IDF vectorizer, ...); on_close runs when a retired version is released.
+    """
+
+    def __init__(self, name, path, recipes=0, on_close=None, **parts):
+        self.name = name
+        self.path = path
+        self.recipes = recipes
+        self.on_close = on_close
+        self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.inflight = 0
+        self.retired = False
+        self.closed = False
+        for key, value in parts.items():
+            setattr(self, key, value)
+
+    def close(self):
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def describe(self):
+        return {'version': self.name, 'path': self.path, 'recipes': self.recipes, 'loaded_at': self.loaded_at,
+                'inflight': self.inflight}
+
+
+class IndexManager:
+    """The active IndexVersion, swapped atomically; retired versions close when idle
+
+    load(name, path) -> IndexVersion; warm(version) runs before it goes live.
+    """
+
+    def __init__(self, load, versions_dir=VERSIONS_DIR, warm=None):
+        self.load = load
+        self.versions_dir = versions_dir
+        self.warm = warm
+        self.lock = threading.Lock()
+        self.active = None
+        self.history = []  # [(name, path)] of previously active versions, newest last
+        self.retiring = []
+        self.loading = None
+        self.last_error = None
+        self.latest_seen = None
+        self._watcher_pid = None
+        self._stop = threading.Event()
+
+    @contextmanager
+    def acquire(self):
+        """The active version (or None) for one request; it stays open until the block exits"""
+        with self.lock:
+            version = self.active
+            if version is not None:
+                version.inflight += 1
+        try:
+            yield version
+        finally:
+            if version is not None:
+                self._release(version)
+
+    def _release(self, version):
+        with self.lock:
+            version.inflight -= 1
+            close = self._take_if_idle(version)
+        if close:
+            self._close(version)
+
+    def _take_if_idle(self, version):
+        """Under self.lock: True (once) if a retired version has no requests left"""
+        if version.retired and version.inflight == 0 and not version.closed:
+            version.closed = True
+            if version in self.retiring:
+                self.retiring.remove(version)
+            return True
+        return False
+
+    def _close(self, version):
+        try:
+            version.close()
+            print(f"[index] Released version {version.name}")
+        except Exception as e:
+            print(f"[index] Error closing version {version.name}: {e}")
+
+    def activate(self, version, record=True):
+        """Make version active; the previous one is closed after its in-flight requests"""
+        with self.lock:
+            old, self.active = self.active, version
+            close = False
+            if old is not None:
+                if record:
+                    self.history.append((old.name, old.path))
+                old.retired = True
+                self.retiring.append(old)
+                close = self._take_if_idle(old)
+        if close:
+            self._close(old)
+        print(f"[index] Active version: {version.name} ({version.recipes} recipes)")
+
+    def _load_and_activate(self, name, path, record, restore=False):
+        """restore: (name, path) was taken from history by rollback(); put it back if the load fails"""
+        start = time.perf_counter()
+        try:
+            version = self.load(name, path)
+            if self.warm is not None:
+                self.warm(version)
+            self.activate(version, record)
+            self.last_error = None
+            print(f"[index] Loaded and warmed {name} in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            self.last_error = f"{name}: {e}"
+            print(f"[index] Failed to load version {name}: {e}")
+            if restore:
+                with self.lock:
+                    self.history.append((name, path))
+        finally:
+            with self.lock:
+                self.loading = None
+
+    def _start_load(self, name, path, record=True, background=True, restore=False):
+        with self.lock:
+            if self.loading is not None:
+                return False
+            self.loading = name
+        if background:
+            threading.Thread(target=self._load_and_activate, args=(name, path, record, restore),
+                             name=f'index-load-{name}', daemon=True).start()
+        else:
+            self._load_and_activate(name, path, record, restore)
+        return True
+
+    def resolve(self, name=None):
+        """(name, path) of a published version (default: the newest); LookupError if there is none"""
+        versions = dict(list_versions(self.versions_dir))
+        if name is None:
+            if not versions:
+                raise LookupError(f"no complete versions in {self.versions_dir}/")
+            name = max(versions)
+        if name not in versions:
+            raise LookupError(f"no complete version {name} in {self.versions_dir}/")
+        return name, versions[name]
+
+    def reload(self, name=None, background=True):
+        """Load a published version (default: the newest) and swap it in
+
+        Returns the version name, or None if another load is still running.
+        """
+        name, path = self.resolve(name)
+        if not self._start_load(name, path, background=background):
+            return None
+        self.latest_seen = max(self.latest_seen or name, name)
+        return name
+
+    def _prune_history(self):
+        """Under self.lock: drop newest history entries whose directory was deleted (publish keep=...)"""
+        while self.history and not version_exists(self.history[-1][1]):
+            name, path = self.history.pop()
+            print(f"[index] Previous version {name} no longer exists at {path}; skipped")
+
+    def previous(self):
+        """Name of the version rollback() would load, or None"""
+        with self.lock:
+            self._prune_history()
+            return self.history[-1][0] if self.history else None
+
+    def rollback(self, background=True):
+        """Reload the previously active version that still exists; returns its name, or None if a load is running
+
+        If the load fails, the version stays in history for another attempt.
+        """
+        with self.lock:
+            self._prune_history()
+            if not self.history:
+                raise LookupError("no previous version to roll back to")
+            if self.loading is not None:
+                return None
+            name, path = self.history.pop()
+        if not self._start_load(name, path, record=False, background=background, restore=True):
+            with self.lock:
+                self.history.append((name, path))
+            return None
+        return name
+
+    def check_for_new_version(self, background=True):
+        """Start loading the newest published version if it is newer than any seen so far"""
+        versions = list_versions(self.versions_dir)
+        if not versions:
+            return False
+        name, path = versions[-1]
+        if self.latest_seen is not None and name <= self.latest_seen:
+            return False
+        if self.active is not None and self.active.name == name:
+            self.latest_seen = name
+            return False
+        # Only marked seen once its load starts; while another load runs, the next check retries it
+        if not self._start_load(name, path, background=background):
+            return False
+        self.latest_seen = name
+        return True
+
+    def ensure_watching(self, interval=WATCH_INTERVAL):
+        """Start the watcher thread in this process (again after a fork); cheap to call per request"""
+        if self._watcher_pid == os.getpid() or interval <= 0:
+            return
+        self._watcher_pid = os.getpid()
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.check_for_new_version()
+                except Exception as e:
+                    print(f"[index] Watcher error: {e}")
+        threading.Thread(target=watch, name='index-watch', daemon=True).start()
+
+    def stop_watching(self):
+        self._stop.set()
+        self._watcher_pid = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'active': self.active.describe() if self.active is not None else None,
+                'retiring': [v.describe() for v in self.retiring],
+                'loading': self.loading,
+                'history': [name for name, _ in self.history],
+                'available': [name for name, _ in list_versions(self.versions_dir)],
+                'last_error': self.last_error,
+            }
@@ -0,0 +1,213 @@
+# ingredients.py
+"""
+Canonical ingredient names and the ingredient -> recipe posting index
+
+create_db.py canonicalizes every ingredient line into the `ingredients` /
+`recipe_ingredients` tables; build_ingredient_index() then packs the join
+table into a CSR structure that app.py loads at startup.
+"""
+
+import re
+import sqlite3
+
+import numpy as np
+
+INGREDIENT_INDEX_FILE = 'ingredient_postings.npz'
+
+UNITS = {
+    'c', 'cup', 'cups', 'tbsp', 'tbs', 'tbl', 'tablespoon', 'tablespoons', 'tsp',
+    'teaspoon', 'teaspoons', 'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds',
+    'g', 'gm', 'gms', 'gram', 'grams', 'kg', 'kgs', 'kilogram', 'kilograms', 'mg',
+    'ml', 'l', 'liter', 'liters', 'litre', 'litres', 'qt', 'quart', 'quarts', 'pt',
+    'pint', 'pints', 'gal', 'gallon', 'gallons', 'pkg', 'pkgs', 'package', 'packages',
+    'pkt', 'packet', 'packets', 'can', 'cans', 'jar', 'jars', 'bottle', 'bottles',
+    'box', 'boxes', 'bag', 'bags', 'stick', 'sticks', 'slice', 'slices', 'piece',
+    'pieces', 'pinch', 'pinches', 'dash', 'dashes', 'clove', 'cloves', 'bunch',
+    'bunches', 'sprig', 'sprigs', 'handful', 'handfuls', 'inch', 'inches', 'cm',
+    'sheet', 'sheets', 'head', 'heads', 'stalk', 'stalks', 'envelope', 'envelopes',
+    'container', 'containers', 'carton', 'cartons', 'drop', 'drops', 'of',
+}
+
+DESCRIPTORS = {
+    'chopped', 'finely', 'coarsely', 'roughly', 'minced', 'diced', 'sliced', 'thinly',
+    'grated', 'shredded', 'crushed', 'ground', 'fresh', 'freshly', 'dried', 'frozen',
+    'thawed', 'large', 'medium', 'small', 'big', 'whole', 'peeled', 'seeded', 'cubed',
+    'halved', 'quartered', 'softened', 'melted', 'beaten', 'cooked', 'uncooked',
+    'boiled', 'raw', 'packed', 'firmly', 'lightly', 'heaping', 'level', 'rounded',
+    'optional', 'divided', 'plus', 'more', 'about', 'approximately', 'approx', 'to',
+    'taste', 'or', 'and', 'for', 'garnish', 'serving', 'needed', 'required', 'few',
+    'some', 'a', 'an', 'the', 'x',
+}
+
+# Words that look plural but are not (or have irregular singulars)
+PLURAL_EXCEPTIONS = {
+    'molasses': 'molasses', 'hummus': 'hummus', 'couscous': 'couscous',
+    'asparagus': 'asparagus', 'swiss': 'swiss', 'lemongrass': 'lemongrass',
+    'watercress': 'watercress', 'grits': 'grits', 'oats': 'oats', 'peas': 'pea',
+    'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'knives': 'knife',
+    'anchovies': 'anchovy', 'chilies': 'chili', 'chillies': 'chilli',
+    'tomatoes': 'tomato', 'potatoes': 'potato', 'mangoes': 'mango',
+    'chickpeas': 'chickpea',
+}
+
+_PARENS_RE = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+_QUANTITY_RE = re.compile(r'[\d½⅓⅔¼¾⅛⅜⅝⅞]+(?:[./-][\d½⅓⅔¼¾⅛⅜⅝⅞]+)*')
+_NON_WORD_RE = re.compile(r'[^a-z\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def singularize(word):
+    """Best-effort singular form of one English word"""
+    if word in PLURAL_EXCEPTIONS:
+        return PLURAL_EXCEPTIONS[word]
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'xes', 'sses', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def canonicalize_ingredient(text):
+    """'2 c. chopped onions (about 2 large)' -> 'onion'. Returns None if nothing is left."""
+    if not text:
+        return None
+    s = str(text).lower()
+    s = _PARENS_RE.sub(' ', s)
+    # Preparation notes follow the first comma ("onion, finely chopped")
+    s = s.split(',', 1)[0]
+    s = _QUANTITY_RE.sub(' ', s)
+    s = _NON_WORD_RE.sub(' ', s)
+
+    words = [w for w in _SPACE_RE.split(s) if w]
+    # Units are only stripped when something follows ("1 tsp cloves" keeps "cloves")
+    while len(words) > 1 and (words[0] in UNITS or words[0] in DESCRIPTORS):
+        words.pop(0)
+    words = [w for w in words if w not in DESCRIPTORS]
+    if not words:
+        return None
+
+    words[-1] = singularize(words[-1])
+    return ' '.join(words)
+
+
+def build_ingredient_index(db_file='recipes.db', output_file=INGREDIENT_INDEX_FILE, batch_size=1000000):
+    """Pack recipe_ingredients into a CSR posting index and save it as .npz"""
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT id, name FROM ingredients ORDER BY id')
+    ingredient_rows = cursor.fetchall()
+    ingredient_ids = np.array([r[0] for r in ingredient_rows], dtype=np.int64)
+    names = np.array([r[1] for r in ingredient_rows], dtype=np.str_)
+
+    cursor.execute('SELECT id FROM recipes ORDER BY id')
+    recipe_ids = np.fromiter((r[0] for r in cursor), dtype=np.int64)
+
+    pair_recipes = []
+    pair_ingredients = []
+    cursor.execute('SELECT recipe_id, ingredient_id FROM recipe_ingredients')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        pairs = np.array(rows, dtype=np.int64)
+        pair_recipes.append(pairs[:, 0])
+        pair_ingredients.append(pairs[:, 1])
+    conn.close()
+
+    if pair_recipes:
+        pair_recipes = np.concatenate(pair_recipes)
+        pair_ingredients = np.concatenate(pair_ingredients)
+    else:
+        pair_recipes = np.zeros(0, dtype=np.int64)
+        pair_ingredients = np.zeros(0, dtype=np.int64)
+
+    # Map DB ids to dense positions; drop pairs whose recipe no longer exists
+    rows = np.searchsorted(recipe_ids, pair_recipes)
+    keep = rows < len(recipe_ids)
+    keep[keep] = recipe_ids[rows[keep]] == pair_recipes[keep]
+    rows = rows[keep]
+    cols = np.searchsorted(ingredient_ids, pair_ingredients[keep])
+
+    order = np.lexsort((rows, cols))
+    indices = rows[order].astype(np.int32)
+    counts = np.bincount(cols, minlength=len(ingredient_ids))
+    indptr = np.zeros(len(ingredient_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    index = IngredientIndex(names, recipe_ids, indptr, indices)
+    index.save(output_file)
+    return index
+
+
+class IngredientIndex:
+    """CSR posting lists: canonical ingredient -> sorted recipe rows.
+
+    Rows are positions in `recipe_ids` (sorted DB ids), so posting lists can
+    be intersected with np.intersect1d and mapped back to ids in one take().
+    """
+
+    def __init__(self, names, recipe_ids, indptr, indices):
+        self.names = names
+        self.recipe_ids = recipe_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.positions = {name: i for i, name in enumerate(names.tolist())}
+
+    @classmethod
+    def load(cls, path=INGREDIENT_INDEX_FILE):
+        data = np.load(path, allow_pickle=False)
+        return cls(data['names'], data['recipe_ids'], data['indptr'], data['indices'])
+
+    def save(self, path=INGREDIENT_INDEX_FILE):
+        with open(path, 'wb') as f:
+            np.savez(f, names=self.names, recipe_ids=self.recipe_ids,
+                     indptr=self.indptr, indices=self.indices)
+
+    @property
+    def num_ingredients(self):
+        return len(self.names)
+
+    @property
+    def num_recipes(self):
+        return len(self.recipe_ids)
+
+    def position(self, name):
+        """Posting position for a raw or canonical ingredient name, or None"""
+        if name in self.positions:
+            return self.positions[name]
+        return self.positions.get(canonicalize_ingredient(name))
+
+    def rows_for(self, name):
+        """Sorted recipe rows containing the ingredient (a view, do not modify)"""
+        pos = self.position(name)
+        if pos is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def recipes_with(self, name):
+        """Recipe ids containing the ingredient"""
+        return self.recipe_ids[self.rows_for(name)]
+
+    def recipes_with_all(self, names):
+        """Recipe ids containing every ingredient in names"""
+        postings = sorted((self.rows_for(n) for n in names), key=len)
+        if not postings:
+            return self.recipe_ids[:0]
+        rows = postings[0]
+        for other in postings[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return self.recipe_ids[rows]
+
+    def recipes_with_any(self, names):
+        """Recipe ids containing at least one ingredient in names"""
+        postings = [self.rows_for(n) for n in names]
+        if not postings:
+            return self.recipe_ids[:0]
+        return self.recipe_ids[np.unique(np.concatenate(postings))]
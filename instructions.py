@@ -0,0 +1,180 @@
+# instructions.py
+"""
+Instruction normalization and timer extraction, shared by ingest and serving
+
+normalize_instructions() turns whatever a source gives (one string, a list
+of multi-step strings, numbered or run-on text) into a flat list of single
+steps; extract_durations() finds cooking times ("10 minutes", "1-2 hrs",
+"1 hour 30 minutes", "45 sec") in seconds. Every pattern is compiled once
+at import.
+
+create_db.py runs both at ingest: recipes.instructions holds the normalized
+steps ('|'-separated) and recipes.step_timers their durations
+(encode_step_timers: ',' between seconds, '|' between steps, so "||600|"
+for a timer on step 3 of 4). recipe_steps() then builds parsed_steps for a
+database recipe with two str.split calls and no regex; rows ingested before
+step_timers existed (NULL) are normalized on the fly.
+"""
+
+import json
+import re
+
+DEFAULT_STEPS = ["Follow the recipe instructions."]
+
+# Step splitting (the rules /search has always applied to LLM output)
+_NUMBERED_SPLIT_RE = re.compile(r'(?<!\d)(?=\d+[\.\)]\s+)')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z])')
+_BULLET_RE = re.compile(r'^[\d\-\*\•]+[\.\)\:]?\s*')
+
+# Cleanup of scraped database steps (formerly dev_server._normalize_instruction)
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([.,;:!?])")
+_CONTROL_RE = re.compile(r'[\x00-\x1f\x7f]')
+
+# "10 min", "1.5 hours", "1 1/2 hrs", "10-15 minutes", "30 seconds", "5-minute"
+_NUMBER = r'(\d+(?:\.\d+)?(?:\s+\d/\d)?|\d/\d)'
+_DURATION_RE = re.compile(
+    _NUMBER + r'(?:\s*(?:-|–|to)\s*' + _NUMBER + r')?\s*-?\s*'
+    r'(hours?|hrs?|minutes?|mins?|seconds?|secs?)\b', re.IGNORECASE)
+_UNIT_SECONDS = {'h': 3600, 'm': 60, 's': 1}
+# Between the parts of "1 hour 30 minutes" / "1 hr, 15 min" / "1 hour and 30 minutes"
+_COMPOUND_GAP_RE = re.compile(r'\s*,?\s*(?:and\s+)?\Z', re.IGNORECASE)
+
+
+def split_steps(instructions):
+    """Flat list of single steps: split on newlines, "1." / "2)" numbering and sentence ends
+
+    Leading numbers and bullets are removed, fragments of 3 characters or
+    fewer dropped and every step ends in punctuation. May be empty.
+    """
+    if isinstance(instructions, str):
+        instructions = [instructions]
+
+    steps = []
+    for item in instructions:
+        if not item or not isinstance(item, str):
+            continue
+        for line in item.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            for part in _NUMBERED_SPLIT_RE.split(line):
+                part = part.strip()
+                if not part:
+                    continue
+                for sentence in _SENTENCE_SPLIT_RE.split(part):
+                    sentence = _BULLET_RE.sub('', sentence.strip())
+                    if len(sentence) > 3:
+                        if sentence[-1] not in '.!?':
+                            sentence += '.'
+                        steps.append(sentence)
+    return steps
+
+
+def normalize_instructions(instructions):
+    """split_steps(), or a single placeholder step if nothing usable is left"""
+    return split_steps(instructions) or list(DEFAULT_STEPS)
+
+
+def clean_step(step):
+    """Undo scraping artefacts in one stored step: JSON-list text, literal escapes, mojibake, control chars"""
+    if not isinstance(step, str):
+        return step
+    s = step.strip()
+
+    if s.startswith('[') and s.endswith(']'):
+        try:
+            parsed = json.loads(s)
+            if isinstance(parsed, list):
+                s = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", ' '.join([str(t).strip() for t in parsed if t]))
+        except Exception:
+            pass
+
+    try:
+        if '\\u' in s or '\\n' in s:
+            s = s.encode('utf-8').decode('unicode_escape')
+    except Exception:
+        pass
+
+    s = s.replace('â', '').replace('°', '').replace('Â', '')
+    s = _CONTROL_RE.sub('', s)
+    return s.replace('|', '\n').strip()
+
+
+def _number(text):
+    if '/' in text:
+        whole, _, fraction = text.rpartition(' ')
+        numerator, denominator = fraction.split('/')
+        return (float(whole) if whole else 0.0) + (int(numerator) / int(denominator) if int(denominator) else 0.0)
+    return float(text)
+
+
+def extract_durations(text):
+    """Cooking times mentioned in text, in whole seconds, in order
+
+    A range counts as its upper bound ("10-15 minutes" -> 900) and adjacent
+    parts in decreasing units add up ("1 hour 30 minutes" -> 5400).
+    """
+    durations = []
+    last_end = last_unit = None
+    for match in _DURATION_RE.finditer(text):
+        unit = _UNIT_SECONDS[match.group(3)[0].lower()]
+        seconds = _number(match.group(2) or match.group(1)) * unit
+        if (durations and last_unit > unit
+                and _COMPOUND_GAP_RE.match(text, last_end, match.start())):
+            durations[-1] += seconds
+        else:
+            durations.append(seconds)
+        last_end, last_unit = match.end(), unit
+    return [int(round(seconds)) for seconds in durations]
+
+
+def parsed_steps(steps, durations=None):
+    """The cooking assistant's step dicts; timers are in minutes (as the UI expects), durations in seconds"""
+    if durations is None:
+        durations = [extract_durations(step) for step in steps]
+    result = []
+    for i, (step, seconds) in enumerate(zip(steps, durations)):
+        result.append({
+            'step_number': i + 1,
+            'text': step,
+            'timers': [s // 60 if s % 60 == 0 else round(s / 60, 2) for s in seconds],
+            'durations': seconds,
+            'has_timer': bool(seconds),
+        })
+    return result
+
+
+def encode_step_timers(durations):
+    """recipes.step_timers value for per-step duration lists"""
+    return '|'.join(','.join(str(s) for s in seconds) for seconds in durations)
+
+
+def decode_step_timers(value, num_steps):
+    """Per-step duration lists from recipes.step_timers; None if missing or not for num_steps steps"""
+    if value is None:
+        return None
+    parts = value.split('|')
+    if len(parts) != num_steps:
+        return None
+    return [[int(s) for s in part.split(',')] if part else [] for part in parts]
+
+
+def ingest_steps(steps):
+    """(normalized steps, step_timers value) for steps parsed from a source file"""
+    steps = split_steps([clean_step(step) for step in steps])
+    return steps, encode_step_timers([extract_durations(step) for step in steps])
+
+
+def recipe_steps(instructions, step_timers=None):
+    """(steps, parsed_steps) from a recipes row's instructions and step_timers columns"""
+    steps = [step for step in (instructions or '').split('|') if step]
+    durations = decode_step_timers(step_timers, len(steps))
+    if durations is None:
+        steps = split_steps([clean_step(step) for step in steps])
+    return steps, parsed_steps(steps, durations)
+
+
+def has_step_timers(conn):
+    """True if recipes has a step_timers column"""
+    columns = [r[1] for r in conn.execute('PRAGMA table_info(recipes)')]
+    return 'step_timers' in columns
@@ -0,0 +1,109 @@
+# keyword_search.py
+"""
+Keyword retrieval over the recipes_fts FTS5 index (built by create_db.py)
+
+Used as the sparse leg of app.hybrid_search_db and by dev_server.py's /search.
+
+With a deadline, matches are streamed in rowid order (FTS5's natural order)
+and the best top_k scored so far are returned when time runs out, like the
+anytime dense scan; ORDER BY rank cannot stop early, since SQLite only
+returns its first row after scoring every match. Streaming costs about 1.5x
+the ORDER BY query when it runs to the end, so it is only used with a
+deadline.
+"""
+
+import heapq
+import re
+import time
+
+# Column weights for bm25(): name, ingredients, search_text
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Matches scored per deadline check when streaming
+STREAM_BATCH = 2048
+
+
+def has_fts_index(conn):
+    """True if the DB has a recipes_fts table"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='recipes_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression: any of the query terms.
+
+    Each term is quoted so user input can never be parsed as FTS5 syntax
+    (AND/NOT/NEAR, column filters, unbalanced quotes).
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(query.lower()):
+        if token not in tokens:
+            tokens.append(token)
+    return ' OR '.join(f'"{t}"' for t in tokens)
+
+
+def keyword_search(conn, query, top_k=10, category=None, deadline=None, report=None):
+    """Return [(recipe_id, score), ...] ranked by bm25, best first
+
+    deadline (a time.monotonic() value) stops scoring when it passes, with
+    the best matches among the recipes scanned so far. If given, report is
+    filled with {'coverage': fraction of the id range scanned}.
+    """
+    if report is not None:
+        report['coverage'] = 1.0
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    if category:
+        sql = f'''
+            SELECT recipes_fts.rowid, bm25(recipes_fts, {weights}) AS rank
+            FROM recipes_fts JOIN recipes ON recipes.id = recipes_fts.rowid
+            WHERE recipes_fts MATCH ? AND recipes.category = ?'''
+        params = (match, category)
+    else:
+        sql = f'''
+            SELECT rowid, bm25(recipes_fts, {weights}) AS rank
+            FROM recipes_fts
+            WHERE recipes_fts MATCH ?'''
+        params = (match,)
+
+    if deadline is None:
+        rows = conn.execute(sql + ' ORDER BY rank, 1 LIMIT ?', params + (top_k,)).fetchall()
+    else:
+        rows = _stream_best(conn, sql, params, top_k, deadline, report)
+
+    # bm25() is lower-is-better; flip so callers can treat it like a similarity
+    return [(r[0], -r[1]) for r in rows]
+
+
+def _stream_best(conn, sql, params, top_k, deadline, report):
+    """[(rowid, rank)] best first (ties by rowid, as ORDER BY rank, rowid), scoring matches in rowid order
+
+    Stops when the matches run out or, after a batch, the deadline has passed.
+    """
+    cursor = conn.execute(sql, params)
+    best = []
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH)
+        if not rows:
+            break
+        batch = rows
+        if best and len(best) == top_k:
+            # Only matches beating the current k-th best can enter
+            worst = best[-1][1]
+            batch = [r for r in rows if r[1] <= worst]
+        if batch:
+            best = heapq.nsmallest(top_k, best + batch, key=lambda r: (r[1], r[0]))
+        if len(rows) == STREAM_BATCH and time.monotonic() >= deadline:
+            cursor.close()
+            if report is not None:
+                last_id = conn.execute('SELECT max(id) FROM recipes').fetchone()[0] or 1
+                report['coverage'] = min(rows[-1][0] / last_id, 1.0)
+            break
+    return best
@@ -0,0 +1,189 @@
+# knn.py
+"""
+Precomputed recipe -> recipe nearest-neighbour graph ("more like this")
+
+The offline job scores blocks of query rows against one embedding shard at
+a time (blocked matrix multiply over memory-mapped shards), keeping a
+running top-k per row, so memory stays at one block x one shard of scores
+per worker. Query blocks are spread over a process pool. The result is an
+int32 array of neighbour rows (positions in recipe_ids) plus float16
+similarities, saved as recipe_knn.npz; app.py answers /similar/<id> with
+one searchsorted and one row lookup.
+
+Usage: python knn.py [--k 20] [--workers N] [--block 2048]
+"""
+
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+from tqdm import tqdm
+
+KNN_FILE = 'recipe_knn.npz'
+KNN_K = 20
+QUERY_BLOCK = 2048
+
+# Per-worker state set by _init_worker
+_shards = None
+_offsets = None
+
+
+def _load_shards(chunks_dir, chunk_files):
+    return [np.load(os.path.join(chunks_dir, f['emb']), mmap_mode='r') for f in chunk_files]
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def _init_worker(chunks_dir, chunk_files, chunk_offsets):
+    """One BLAS thread per process; the pool supplies the parallelism"""
+    global _shards, _offsets
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    _shards = _load_shards(chunks_dir, chunk_files)
+    _offsets = np.asarray(chunk_offsets, dtype=np.int64)
+
+
+def _rows(start, end):
+    """Normalized embeddings for global rows [start, end)"""
+    first = np.searchsorted(_offsets, start, side='right') - 1
+    parts = []
+    i = first
+    while i < len(_shards) and _offsets[i] < end:
+        lo = max(start, _offsets[i]) - _offsets[i]
+        hi = min(end, _offsets[i] + len(_shards[i])) - _offsets[i]
+        parts.append(_shards[i][lo:hi])
+        i += 1
+    return _normalize(np.concatenate(parts))
+
+
+def _block_neighbors(task):
+    """(start, neighbours int32 (n, k), scores float32 (n, k)) for query rows [start, end)"""
+    start, end, k = task
+    queries = _rows(start, end)
+    n = len(queries)
+    best_rows = np.full((n, k), -1, dtype=np.int64)
+    best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    local = np.arange(n)
+
+    for i, shard in enumerate(_shards):
+        offset = _offsets[i]
+        scores = queries @ _normalize(shard).T
+        # Never list a recipe as its own neighbour
+        own = (start + local >= offset) & (start + local < offset + len(shard))
+        scores[local[own], start + local[own] - offset] = -np.inf
+
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+        merged_rows = np.concatenate([best_rows, top + offset], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows[~np.isfinite(best_scores)] = -1
+    return start, best_rows.astype(np.int32), best_scores
+
+
+def build_knn(chunks_dir, chunk_files, chunk_offsets, recipe_ids, k=KNN_K, workers=None,
+              block=QUERY_BLOCK, output_file=KNN_FILE):
+    """Compute and save the top-k neighbour graph; returns the neighbour array"""
+    import multiprocessing
+
+    total = len(recipe_ids)
+    k = min(k, max(total - 1, 1))
+    neighbors = np.full((total, k), -1, dtype=np.int32)
+    scores = np.zeros((total, k), dtype=np.float16)
+    tasks = [(start, min(start + block, total), k) for start in range(0, total, block)]
+
+    workers = workers or os.cpu_count() or 1
+    initargs = (chunks_dir, chunk_files, chunk_offsets)
+    if workers == 1:
+        _init_worker(*initargs)
+        results = map(_block_neighbors, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker, initargs=initargs)
+        results = pool.imap_unordered(_block_neighbors, tasks)
+
+    try:
+        for start, rows, block_scores in tqdm(results, total=len(tasks), desc="kNN blocks"):
+            neighbors[start:start + len(rows)] = rows
+            scores[start:start + len(rows)] = np.maximum(block_scores, -1.0)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    with open(output_file, 'wb') as f:
+        np.savez(f, recipe_ids=np.asarray(recipe_ids, dtype=np.int64), neighbors=neighbors, scores=scores)
+    return neighbors
+
+
+class NeighborGraph:
+    """recipe id -> precomputed neighbour ids"""
+
+    def __init__(self, recipe_ids, neighbors, scores):
+        self.recipe_ids = recipe_ids
+        self.neighbors = neighbors
+        self.scores = scores
+        # recipe_ids follow shard order (ascending id); sort only if an older build broke that
+        self._order = None if np.all(recipe_ids[1:] >= recipe_ids[:-1]) else np.argsort(recipe_ids)
+        self._sorted_ids = recipe_ids if self._order is None else recipe_ids[self._order]
+
+    @classmethod
+    def load(cls, path=KNN_FILE):
+        data = np.load(path, allow_pickle=False)
+        return cls(data['recipe_ids'], data['neighbors'], data['scores'])
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def row(self, recipe_id):
+        """Row of recipe_id, or None if it is not in the graph"""
+        ids = self._sorted_ids
+        pos = int(np.searchsorted(ids, recipe_id))
+        if pos >= len(ids) or ids[pos] != recipe_id:
+            return None
+        return pos if self._order is None else int(self._order[pos])
+
+    def similar(self, recipe_id, k=10):
+        """[(neighbour id, similarity), ...] best first; [] for unknown ids"""
+        row = self.row(recipe_id)
+        if row is None:
+            return []
+        rows = self.neighbors[row, :k]
+        valid = rows >= 0
+        return [(int(r_id), float(s)) for r_id, s in
+                zip(self.recipe_ids[rows[valid]], self.scores[row, :k][valid])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute the recipe kNN graph from the embedding shards')
+    parser.add_argument('--k', type=int, default=KNN_K)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--block', type=int, default=QUERY_BLOCK)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔗 Building recipe kNN graph")
+    print("=" * 60)
+    with open('recipe_models.pkl', 'rb') as f:
+        models = pickle.load(f)
+    chunk_files = models['chunk_files']
+    start = time.perf_counter()
+    neighbors = build_knn(models['chunks_dir'], chunk_files, models['chunk_offsets'], models['recipe_ids'],
+                          k=args.k, workers=args.workers, block=args.block)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(KNN_FILE) / 1e6
+    print(f"✅ {len(neighbors):,} recipes x {neighbors.shape[1]} neighbours in {elapsed:.0f}s "
+          f"({len(neighbors) / max(elapsed, 1e-9):,.0f} recipes/sec)")
+    print(f"   Saved: {KNN_FILE} ({size_mb:.1f} MB)")
@@ -0,0 +1,40 @@
+# list_parser.py
+"""
+Fast single-pass parser for quoted list literals
+
+RecipeNLG stores ingredients/directions as JSON or Python list literals
+(["1 c. sugar", "2 eggs"] or ['1 c. sugar', "Mom's oil"]). Going through
+json.loads and then ast.literal_eval for every row is the main ingest cost,
+so the common shape (a flat list of quoted strings without escapes) is
+matched here with one precompiled regex. Anything else returns None and the
+caller falls back to the general parsers.
+"""
+
+import re
+
+# One quoted item: double- or single-quoted, no backslashes or control chars.
+# Escapes/control chars have different JSON vs Python semantics, so those rows
+# are left to the slow path to keep results identical.
+_ITEM = r'''(?:"[^"\\\x00-\x1f]*"|'[^'\\\x00-\x1f]*')'''
+_WS = r'[ \t\n\r]*'
+
+_LIST_RE = re.compile(
+    r'\[' + _WS + r'(?:' + _ITEM + r'(?:' + _WS + r',' + _WS + _ITEM + r')*' + _WS + r')?\]\Z'
+)
+_ITEM_RE = re.compile(_ITEM)
+
+
+def parse_quoted_list(text):
+    """Parse a flat list of quoted strings, or return None if not in that shape.
+
+    Output matches create_db.parse_json_list for every input it accepts.
+    """
+    if not text or text[0] != '[' or not _LIST_RE.match(text):
+        return None
+
+    items = []
+    for match in _ITEM_RE.finditer(text):
+        item = match.group(0)[1:-1]
+        if item:
+            items.append(item.strip().strip('"\''))
+    return items
@@ -0,0 +1,282 @@
+# metrics.py
+"""
+In-process metrics: stage spans, counters, gauges and Prometheus text export
+
+    with span('dense_scan'):
+        ...
+    PARSE_FAILURES.inc()
+    INDEX_MEMORY.set_function(lambda: dense_index.memory_bytes, index='dense_prefilter')
+
+Every span feeds the recipe_stage_seconds histogram (fixed buckets, so
+observe() is a bisect plus two adds under a lock). render() writes all
+metrics in Prometheus text format for /metrics, with p50/p95/p99 estimated
+from the buckets as recipe_stage_seconds_quantile. Under serve.py each
+worker keeps its own registry, so a scrape shows the worker that answered.
+Inside `with trace() as stages:` spans are also appended to `stages`, giving
+one request's breakdown (work handed to executors must run in a copy of the
+caller's context, e.g. executor.submit(contextvars.copy_context().run, fn)).
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+from shared_index import memory_report
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _label_str(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [f'{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}' for k, v in items]
+
+
+class Gauge(Metric):
+    """Set directly, or from a callback evaluated at scrape time"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, fn, **labels):
+        self.set(fn, **labels)
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        lines = self.header()
+        for key, value in items:
+            if callable(value):
+                try:
+                    value = value()
+                except Exception:
+                    continue
+            if value is not None:
+                lines.append(f'{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def quantile(self, q, **labels):
+        """Estimate from the buckets, interpolating linearly inside the one holding q; None if empty"""
+        with self.lock:
+            state = self.values.get(self._key(labels))
+            counts = list(state[0]) if state else None
+        return self._quantile(counts, q)
+
+    def _quantile(self, counts, q):
+        total = sum(counts) if counts else 0
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        with self.lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self.values.items())
+        lines = self.header()
+        quantile_lines = [f'# HELP {self.name}_quantile {self.help} (p50/p95/p99 estimated from buckets)',
+                          f'# TYPE {self.name}_quantile gauge']
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _label_str(self.labelnames, key, [('le', _fmt(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(total)}')
+            lines.append(f'{self.name}_count{_label_str(self.labelnames, key)} {cumulative}')
+            for q in QUANTILES:
+                value = self._quantile(counts, q)
+                labels = _label_str(self.labelnames, key, [('quantile', q)])
+                quantile_lines.append(f'{self.name}_quantile{labels} {_fmt(value)}')
+        return lines + (quantile_lines if items else [])
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'metric {metric.name} already registered')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text, labelnames=()):
+    return REGISTRY.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def render():
+    return REGISTRY.render()
+
+
+STAGE_SECONDS = histogram('recipe_stage_seconds', 'Wall time per request stage', ('stage',))
+CACHE_REQUESTS = counter('recipe_cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+PARSE_FAILURES = counter('recipe_llm_parse_failures_total', 'LLM outputs that did not parse into recipes')
+LLM_TOKENS = counter('recipe_llm_tokens_total', 'Tokens processed by Ollama', ('phase',))
+LLM_EVAL_SECONDS = counter('recipe_llm_eval_seconds_total', 'Ollama evaluation time', ('phase',))
+LLM_TOKENS_PER_SECOND = gauge('recipe_llm_tokens_per_second', 'Ollama throughput of the last call', ('phase',))
+SHARD_FAILURES = counter('recipe_shard_failures_total', 'Shard requests that failed or timed out', ('shard',))
+PARTIAL_RESULTS = counter('recipe_partial_results_total', 'Retrieval legs that returned before searching every row',
+                          ('leg',))
+INDEX_MEMORY = gauge('recipe_index_memory_bytes', 'Resident size of in-memory index structures', ('index',))
+PROCESS_MEMORY = gauge('recipe_process_memory_bytes', 'Memory of this process from /proc smaps_rollup', ('kind',))
+for _kind in ('rss', 'pss', 'shared', 'private'):
+    PROCESS_MEMORY.set_function(lambda kind=_kind: (memory_report() or {}).get(kind), kind=_kind)
+
+
+_trace = contextvars.ContextVar('recipe_trace', default=None)
+
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _trace.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+class trace:
+    """Collect [(stage, seconds)] for the spans run inside this block (and its copied contexts)"""
+
+    def __enter__(self):
+        self.stages = []
+        self.token = _trace.set(self.stages)
+        return self.stages
+
+    def __exit__(self, exc_type, exc, tb):
+        _trace.reset(self.token)
+        return False
+
+
+class span:
+    """Time a block into recipe_stage_seconds{stage=...}; also usable as a decorator"""
+
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def observe_ollama(result):
+    """Record prompt-eval / decode time and token counts from an /api/generate response"""
+    for phase, count_key, duration_key in (('prompt_eval', 'prompt_eval_count', 'prompt_eval_duration'),
+                                           ('decode', 'eval_count', 'eval_duration')):
+        count = result.get(count_key)
+        seconds = (result.get(duration_key) or 0) / 1e9
+        if seconds > 0:
+            record_stage(f'llm_{phase}', seconds)
+            LLM_EVAL_SECONDS.inc(seconds, phase=phase)
+        if count:
+            LLM_TOKENS.inc(count, phase=phase)
+            if seconds > 0:
+                LLM_TOKENS_PER_SECOND.set(count / seconds, phase=phase)
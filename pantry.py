@@ -0,0 +1,166 @@
+# pantry.py
+"""
+Pantry-coverage ranking over a sparse recipe x canonical-ingredient matrix
+
+For a user's pantry, summing the ingredient -> recipe postings of its few
+ingredients gives every recipe's covered ingredient count (the mat-vec
+matrix @ pantry, touching only the pantry's columns); with per-recipe
+totals that yields the fraction covered and the number missing. Staples
+(salt, oil, water, ...) are dropped from the matrix so they never count as
+missing. create_db.py builds the matrix with scipy; scoring reads it back
+as a csr.CSRMatrix.
+"""
+
+import re
+
+import numpy as np
+
+from csr import CSRMatrix
+from ingredients import canonicalize_ingredient
+
+PANTRY_MATRIX_FILE = 'pantry_matrix.npz'
+
+# Canonical names (see ingredients.canonicalize_ingredient) assumed in every kitchen
+STAPLES = {
+    'salt', 'pepper', 'black pepper', 'salt pepper', 'oil', 'vegetable oil',
+    'cooking oil', 'olive oil', 'water', 'warm water', 'cold water', 'hot water',
+    'boiling water', 'ice water', 'sugar', 'white sugar', 'granulated sugar',
+}
+
+_PANTRY_SPLIT_RE = re.compile(r',|;|\n|\band\b|&|\+')
+
+
+def parse_pantry(query):
+    """'chicken, rice and tomatoes' -> ['chicken', 'rice', 'tomato']"""
+    names = []
+    for part in _PANTRY_SPLIT_RE.split(query.lower()):
+        name = canonicalize_ingredient(part)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def build_pantry_matrix(ingredient_index, output_file=PANTRY_MATRIX_FILE):
+    """Recipe x ingredient CSR matrix (float32 ones, staple columns removed) from the postings"""
+    from scipy import sparse
+    csc = sparse.csc_matrix(
+        (np.ones(len(ingredient_index.indices), dtype=np.float32),
+         ingredient_index.indices, ingredient_index.indptr),
+        shape=(ingredient_index.num_recipes, ingredient_index.num_ingredients),
+    )
+    keep = np.ones(ingredient_index.num_ingredients, dtype=np.float32)
+    for name in STAPLES:
+        pos = ingredient_index.positions.get(name)
+        if pos is not None:
+            keep[pos] = 0.0
+    matrix = (csc @ sparse.diags(keep)).tocsr()
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    sparse.save_npz(output_file, matrix)
+    return matrix
+
+
+class PantryScorer:
+    """Scores every recipe (or a candidate subset) against a pantry"""
+
+    def __init__(self, matrix, ingredient_index):
+        """matrix: CSRMatrix, or a scipy sparse matrix (converted)"""
+        if not isinstance(matrix, CSRMatrix):
+            matrix = matrix.tocsr()
+            matrix = CSRMatrix(matrix.data, matrix.indices, matrix.indptr, matrix.shape)
+        self.matrix = matrix
+        self.ingredient_index = ingredient_index
+        self.required = self.matrix.row_lengths().astype(np.float32)
+        # Columns kept in the matrix (staples are not)
+        self.counted = np.bincount(self.matrix.indices, minlength=self.matrix.shape[1]) > 0
+
+    @classmethod
+    def load(cls, ingredient_index, path=PANTRY_MATRIX_FILE):
+        return cls(CSRMatrix.load_npz(path), ingredient_index)
+
+    def pantry_vector(self, names):
+        """Dense 0/1 vector over ingredient columns; unknown names are ignored"""
+        vec = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        for name in names:
+            pos = self.ingredient_index.position(name)
+            if pos is not None:
+                vec[pos] = 1.0
+        return vec
+
+    def known(self, names):
+        """The names that are counted (non-staple) ingredients; free text like 'quick dinner idea' is dropped"""
+        known = []
+        for name in names:
+            pos = self.ingredient_index.position(name)
+            if pos is not None and self.counted[pos]:
+                known.append(name)
+        return known
+
+    def _covered(self, pantry):
+        """matrix @ pantry for a 0/1 pantry vector, from the postings of its counted columns"""
+        index = self.ingredient_index
+        columns = np.flatnonzero((pantry > 0) & self.counted)
+        if len(columns) == 0:
+            return np.zeros(self.matrix.shape[0], dtype=np.float32)
+        rows = np.concatenate([index.indices[index.indptr[c]:index.indptr[c + 1]] for c in columns])
+        return np.bincount(rows, minlength=self.matrix.shape[0]).astype(np.float32)
+
+    def _coverage(self, pantry):
+        covered = self._covered(pantry)
+        missing = self.required - covered
+        coverage = np.divide(covered, self.required, out=np.ones_like(covered), where=self.required > 0)
+        return covered, coverage, missing
+
+    def score(self, names):
+        """(coverage, missing) for every recipe row"""
+        _, coverage, missing = self._coverage(self.pantry_vector(names))
+        return coverage, missing
+
+    def rank(self, names, top_k=10, max_missing=None):
+        """Best-covered recipes: [(recipe_id, coverage, missing), ...]
+
+        Ordered by fewest missing ingredients, then highest coverage. Recipes
+        sharing nothing with the pantry are never returned.
+        """
+        pantry = self.pantry_vector(names)
+        if not pantry.any():
+            return []
+        covered = self._covered(pantry)
+
+        # Only recipes sharing at least one ingredient are ranked
+        rows = np.flatnonzero(covered)
+        covered = covered[rows]
+        required = self.required[rows]
+        missing = required - covered
+        coverage = covered / required
+        if max_missing is not None:
+            keep = missing <= max_missing
+            rows, coverage, missing = rows[keep], coverage[keep], missing[keep]
+        if len(rows) == 0:
+            return []
+
+        # missing is integral and coverage is in [0, 1], so this orders by missing then coverage
+        key = missing * 2.0 - coverage
+        k = min(top_k, len(key))
+        top = np.argpartition(key, k - 1)[:k]
+        top = top[np.argsort(key[top], kind='stable')]
+        ids = self.ingredient_index.recipe_ids[rows[top]]
+        return [(int(r), float(coverage[i]), int(missing[i])) for r, i in zip(ids, top)]
+
+    def score_candidates(self, recipe_ids, names):
+        """(coverage, missing) for specific recipe ids; unknown ids get (0, inf)"""
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        all_ids = self.ingredient_index.recipe_ids
+        rows = np.searchsorted(all_ids, recipe_ids)
+        found = rows < len(all_ids)
+        found[found] = all_ids[rows[found]] == recipe_ids[found]
+
+        coverage = np.zeros(len(recipe_ids), dtype=np.float32)
+        missing = np.full(len(recipe_ids), np.inf, dtype=np.float32)
+        if found.any():
+            sub = self.matrix.take_rows(rows[found])
+            covered = sub.dot(self.pantry_vector(names))
+            required = self.required[rows[found]]
+            missing[found] = required - covered
+            coverage[found] = np.divide(covered, required, out=np.ones_like(covered), where=required > 0)
+        return coverage, missing
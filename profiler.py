@@ -0,0 +1,153 @@
+# profiler.py
+"""
+On-demand diagnostics for a running app: stack sampling and a slow-request log
+
+SamplingProfiler.run(seconds) samples every thread's Python stack with
+sys._current_frames() at a fixed interval, from the calling thread, and
+returns collapsed stacks ("thread;outer;...;leaf count"), the input format of
+flamegraph.pl and speedscope. Nothing runs between profiles, and while one is
+running the cost is one stack walk per thread per interval. Threads parked
+in the server's select loop or as idle executor workers are dropped unless
+include_idle is set.
+
+SlowRequestLog keeps the last N requests slower than a threshold with their
+parameters and per-stage timings (from metrics.trace), and prints a line
+for each.
+"""
+
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+
+from metrics import trace
+
+PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60
+SLOW_REQUEST_SECONDS = 10.0
+SLOW_LOG_SIZE = 100
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(stack):
+    """stack: [(filename, function)] root first"""
+    if not stack:
+        return True
+    if stack[-1][0].endswith('selectors.py'):
+        return True
+    # ThreadPoolExecutor worker blocked on its (C) work queue
+    filename, name = stack[-1]
+    return name == '_worker' and filename.endswith(os.path.join('concurrent', 'futures', 'thread.py'))
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler over all threads; one profile at a time"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.lock.locked()
+
+    def run(self, seconds, include_idle=False):
+        """Block for `seconds`, return (Counter of collapsed stacks, number of sampling rounds)
+
+        Raises RuntimeError if another profile is already running.
+        """
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError('a profile is already running')
+        try:
+            seconds = min(max(seconds, self.interval), MAX_PROFILE_SECONDS)
+            own = threading.get_ident()
+            stacks = collections.Counter()
+            rounds = 0
+            deadline = time.perf_counter() + seconds
+            next_sample = time.perf_counter()
+            while next_sample < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame)
+                        frame = frame.f_back
+                    stack.reverse()
+                    if not include_idle and _is_idle([(f.f_code.co_filename, f.f_code.co_name) for f in stack]):
+                        continue
+                    labels = [names.get(ident, f'thread-{ident}')] + [_frame_label(f) for f in stack]
+                    stacks[';'.join(label.replace(';', ':') for label in labels)] += 1
+                frame = stack = None
+                rounds += 1
+                next_sample += self.interval
+                time.sleep(max(0.0, next_sample - time.perf_counter()))
+            return stacks, rounds
+        finally:
+            self.lock.release()
+
+
+def collapsed(stacks):
+    """Collapsed-stack text, heaviest first"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class SlowRequestLog:
+    """Ring buffer of requests slower than `threshold` seconds"""
+
+    def __init__(self, threshold=SLOW_REQUEST_SECONDS, size=SLOW_LOG_SIZE):
+        self.threshold = threshold
+        self.entries = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, params, stages):
+        totals = collections.defaultdict(float)
+        for stage, stage_seconds in stages:
+            totals[stage] += stage_seconds
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'request': name,
+            'seconds': round(seconds, 3),
+            'params': params,
+            'stages': {stage: round(total, 4) for stage, total in totals.items()},
+        }
+        with self.lock:
+            self.entries.append(entry)
+        breakdown = ', '.join(f'{stage}={total:.2f}s' for stage, total in
+                              sorted(totals.items(), key=lambda item: -item[1]))
+        print(f"[slow] {name} took {seconds:.2f}s params={params} ({breakdown})")
+
+    def recent(self, limit=None):
+        with self.lock:
+            entries = list(self.entries)
+        return entries[::-1][:limit]
+
+    def watch(self, params=None):
+        """Decorator: trace the call and record it if it ran longer than the threshold
+
+        params: zero-argument callable returning what to log (e.g. the request JSON)
+        """
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                with trace() as stages:
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        seconds = time.perf_counter() - start
+                        if seconds >= self.threshold:
+                            try:
+                                logged = params() if params else None
+                            except Exception:
+                                logged = None
+                            self.record(fn.__name__, seconds, logged, stages)
+            return wrapper
+        return decorate
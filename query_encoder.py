@@ -0,0 +1,83 @@
+# query_encoder.py
+"""
+Query encoder loaded in the background
+
+Importing sentence_transformers pulls in torch and transformers, which
+take seconds and hundreds of MB; on the query path only encode() is ever
+called. BackgroundEncoder starts the import and model load in a daemon
+thread, so app.py can load its indexes and answer keyword / pantry
+searches meanwhile; encode() blocks until the model is ready and raises
+the load error if it failed.
+
+torch is not fork-safe once initialised, so under serve.py the parent
+never loads the model (start=False): each worker starts its own load after
+the fork, and a process that forked with a loader running or a model
+loaded loads again on first use.
+
+ENCODER_MODEL picks the sentence-transformers model.
+"""
+
+import os
+import threading
+import time
+
+ENCODER_MODEL = os.environ.get('ENCODER_MODEL', 'all-MiniLM-L6-v2')
+
+
+def load_sentence_transformer(model_name=ENCODER_MODEL):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class BackgroundEncoder:
+    """encode() proxy for a model built by `load` in a daemon thread"""
+
+    def __init__(self, load=load_sentence_transformer, name=ENCODER_MODEL, start=True):
+        self.name = name
+        self.load = load
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the load in this process, unless it already started here"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.model = self.error = self.load_seconds = None
+            self._ready = threading.Event()
+            threading.Thread(target=self._load, args=(self.load,), name='encoder-load', daemon=True).start()
+
+    def _load(self, load):
+        start = time.perf_counter()
+        try:
+            self.model = load()
+            self.load_seconds = time.perf_counter() - start
+            print(f"[INFO] Encoder {self.name} loaded in {self.load_seconds:.1f}s")
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] Failed to load encoder {self.name}: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self._pid == os.getpid() and self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """The loaded model (starting the load if needed); raises TimeoutError, or RuntimeError if loading failed"""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"encoder {self.name} still loading")
+        if self.error is not None:
+            raise RuntimeError(f"encoder {self.name} failed to load: {self.error}")
+        return self.model
+
+    def encode(self, texts, **kwargs):
+        return self.wait().encode(texts, **kwargs)
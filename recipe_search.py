@@ -0,0 +1,324 @@
+# recipe_search.py
+"""
+Ranking and paging helpers for /recipes/search
+
+fuse_rankings() merges the keyword, embedding (and pantry) candidate lists
+by reciprocal rank, so a recipe near the top of either list ranks high and
+one found by both ranks higher, at any depth; hybrid_search_db's
+"keyword top 10 + embedding top 10" concatenation only works for a short
+LLM context.
+
+Cursors are opaque to clients: URL-safe base64 of the offset into the
+filtered ranking, a digest of the query and filters, the index version and
+the id of the snapshot being paged, so a cursor replayed against a
+different search is rejected instead of silently paging the wrong list.
+
+fuse_candidates(), filter_rows(), visible_candidates() and recipe_payloads()
+are the ranking, filtering, near-duplicate collapse and hydration steps of a
+search, taking the pantry scorer and database connection as arguments;
+app.py supplies its loaded index and recipes.db.
+
+SearchSnapshots keeps each ranking as a snapshot for a few minutes, so the
+first page pays for retrieval and the following pages (cursor) only for
+hydrating their ids. A snapshot's id is a digest of its index version and
+ranked ids, so an id always names the same list. A cursor whose snapshot
+is not in this process (expired, evicted, or ranked by another serve.py
+worker) is served by ranking again without a deadline, which on the same
+index version gives the same list; the digest confirms it. A cursor whose
+index version is no longer active, whose list was cut short by the
+deadline (it cannot be reproduced), or whose list ranks differently now
+gets CursorExpired, HTTP 410; the client starts the search again.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from instructions import recipe_steps
+from metrics import CACHE_REQUESTS
+
+RRF_K = 60
+
+
+def fuse_rankings(rankings, k=RRF_K):
+    """Reciprocal rank fusion of ranked id lists, best first; ties keep first-seen order"""
+    scores = {}
+    for ids in rankings:
+        for rank, r_id in enumerate(dict.fromkeys(ids)):
+            scores[r_id] = scores.get(r_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda r_id: -scores[r_id])
+
+
+def fuse_candidates(candidates, pantry=None, pantry_scorer=None):
+    """(ranked ids, pantry_info {id: (coverage, missing)}) from the legs' candidate lists.
+
+    The keyword and embedding legs are fused by reciprocal rank; with a
+    pantry, the pantry leg's ids join them and recipes missing fewer
+    ingredients come first (stable, so fused order breaks ties). Names that
+    are not known ingredients are ignored; with none left the fused order
+    stands and no pantry_info is given.
+    """
+    ranked = fuse_rankings([candidates['keyword'], candidates['embedding']])
+    pantry = pantry_scorer.known(pantry) if pantry else []
+    if not pantry:
+        return ranked, {}
+    ranked = list(dict.fromkeys(candidates.get('pantry', []) + ranked))
+    coverage, missing = pantry_scorer.score_candidates(ranked, pantry)
+    pantry_info = {r_id: (float(c), float(m)) for r_id, c, m in zip(ranked, coverage, missing)}
+    return sorted(ranked, key=lambda r_id: pantry_info[r_id][1]), pantry_info
+
+
+def filter_rows(conn, ids, cluster_column='cluster_id'):
+    """{id: (cuisine, category, cluster)} for the candidates, in one IN query"""
+    if not ids:
+        return {}
+    placeholders = ','.join('?' * len(ids))
+    rows = conn.execute(f'SELECT id, cuisine, category, {cluster_column} FROM recipes WHERE id IN ({placeholders})',
+                        [int(r_id) for r_id in ids]).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def matches_filters(row, filters, pantry_info, r_id):
+    """True if a filter_rows() row passes cuisine, category and (pantry searches only) max_missing"""
+    cuisine, category = row[0], row[1]
+    if filters.get('cuisine') and (cuisine or '').lower() != filters['cuisine'].lower():
+        return False
+    if filters.get('category') and (category or '').replace('-', '_') != filters['category'].replace('-', '_'):
+        return False
+    if filters.get('max_missing') is not None and pantry_info:
+        if pantry_info.get(r_id, (0.0, np.inf))[1] > filters['max_missing']:
+            return False
+    return True
+
+
+def visible_candidates(ranked, rows, filters, pantry_info):
+    """(visible ids, their pantry_info): ranked ids passing the filters, the best of each near-duplicate cluster"""
+    visible = []
+    seen_clusters = set()
+    for r_id in ranked:
+        row = rows.get(r_id)
+        if row is None or not matches_filters(row, filters, pantry_info, r_id):
+            continue
+        cluster_id = row[2] if row[2] is not None else r_id
+        if cluster_id in seen_clusters:
+            continue
+        seen_clusters.add(cluster_id)
+        visible.append(r_id)
+    return visible, {r_id: pantry_info[r_id] for r_id in visible if r_id in pantry_info}
+
+
+def recipe_payloads(conn, ids, step_timers=True):
+    """Full recipe dicts for ids, in order: ingredient and step lists plus parsed_steps.
+
+    Steps and timers come from the columns create_db.py filled at ingest
+    (step_timers=False for databases without that column), so this is one
+    IN query and string splits.
+    """
+    if not ids:
+        return []
+    timers_column = 'step_timers' if step_timers else 'NULL'
+    placeholders = ','.join('?' * len(ids))
+    rows = conn.execute(
+        f'SELECT id, name, image_url, description, cuisine, course, diet, prep_time, category, ingredients, '
+        f'instructions, {timers_column} FROM recipes WHERE id IN ({placeholders})', [int(r_id) for r_id in ids]).fetchall()
+    by_id = {row[0]: row for row in rows}
+    recipes = []
+    for r_id in ids:
+        row = by_id.get(r_id)
+        if row is None:
+            continue
+        steps, steps_parsed = recipe_steps(row[10], row[11])
+        recipes.append({
+            'id': row[0],
+            'name': row[1],
+            'image_url': row[2],
+            'description': row[3],
+            'cuisine': row[4],
+            'course': row[5],
+            'diet': row[6],
+            'prep_time': row[7],
+            'category': row[8],
+            'ingredients': [i.strip() for i in (row[9] or '').split('|') if i.strip()],
+            'instructions': steps,
+            'parsed_steps': steps_parsed,
+        })
+    return recipes
+
+
+def search_key(query, filters):
+    """Short digest of a search: the normalized query text and its filters"""
+    key = json.dumps([' '.join(query.lower().split()), sorted(filters.items())])
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def request_deadline(deadline_ms, default_seconds, clock=time.monotonic):
+    """clock() deadline for a request's deadline_ms, as /search and /recipes/search take it
+
+    Missing (None or '') means default_seconds from now; 0 or less means no
+    deadline (None), as does a default of 0. ValueError if it is not a
+    finite number.
+    """
+    if deadline_ms is None or deadline_ms == '':
+        budget = default_seconds
+    else:
+        try:
+            if isinstance(deadline_ms, bool):
+                raise TypeError
+            budget = float(deadline_ms) / 1000
+        except (TypeError, ValueError):
+            raise ValueError('deadline_ms must be a number of milliseconds')
+        if not math.isfinite(budget):
+            raise ValueError('deadline_ms must be a number of milliseconds')
+    return clock() + budget if budget > 0 else None
+
+
+class CursorExpired(LookupError):
+    """A cursor whose snapshot is gone or whose index version is no longer active"""
+
+
+def encode_cursor(key, offset, version=None, snapshot=None, partial=False):
+    payload = json.dumps({'k': key, 'o': offset, 'v': version, 's': snapshot, 'p': int(partial)},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key):
+    """(offset, version, snapshot, partial) from encode_cursor(key, ...); ValueError if malformed or for another search"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset = int(payload['o'])
+        cursor_key = payload['k']
+        version, snapshot, partial = payload.get('v'), payload.get('s'), bool(payload.get('p'))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError('invalid cursor')
+    if cursor_key != key or offset < 0:
+        raise ValueError('cursor does not belong to this search')
+    return offset, version, snapshot, partial
+
+
+def snapshot_id(version, visible):
+    """Digest naming a ranked list: the same ids on the same index version give the same id in every process"""
+    text = f"{version}:{' '.join(str(r_id) for r_id in visible)}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class CandidateCache:
+    """Short-lived LRU of search results by key: at most max_entries, each for ttl seconds"""
+
+    def __init__(self, max_entries=1024, ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SearchSnapshots:
+    """Ranked candidate lists of recent searches, paged by cursor
+
+    Snapshots are keyed by snapshot_id(); a new search (query, filters,
+    index version) reuses that search's newest snapshot. At most
+    max_entries snapshots, each for ttl seconds.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0, clock=time.monotonic):
+        self.snapshots = CandidateCache(max_entries, ttl, clock)
+        self.latest = CandidateCache(max_entries, ttl, clock)  # (version, search key) -> snapshot id
+
+    def page(self, query, filters, version, rank, hydrate, limit, cursor=None, deadline=None):
+        """One page of a search: {'recipes', 'next_cursor', 'total', 'retrieval'}.
+
+        version is the index version the request holds; rank(deadline) ->
+        (visible ids, pantry_info, retrieval) ranks on it, with deadline for
+        a new search and None when rebuilding a cursor's snapshot.
+        hydrate(ids) -> recipe dicts. Raises ValueError for a cursor from
+        another search and CursorExpired for one that cannot be served from
+        the list it was issued for.
+        """
+        key = search_key(query, filters)
+        if cursor:
+            offset, cursor_version, snapshot, partial = decode_cursor(cursor, key)
+            if cursor_version != version:
+                raise CursorExpired('the recipe index changed since this search started; search again')
+            candidates = self.snapshots.get(snapshot)
+            CACHE_REQUESTS.inc(cache='recipes_search', result='hit' if candidates is not None else 'miss')
+            if candidates is None:
+                if partial:
+                    raise CursorExpired('this search has expired; search again')
+                # Ranked by another worker or evicted: the same ranking again, checked by its digest
+                candidates = rank(None)
+                if candidates[2]['partial'] or snapshot_id(version, candidates[0]) != snapshot:
+                    raise CursorExpired('the results of this search have changed; search again')
+                self.snapshots.put(snapshot, candidates)
+        else:
+            offset = 0
+            snapshot = self.latest.get((version, key))
+            candidates = self.snapshots.get(snapshot) if snapshot is not None else None
+            if candidates is not None and candidates[2]['partial']:
+                # A new search retries a list cut short by the deadline; cursors keep paging the old snapshot
+                candidates = None
+            CACHE_REQUESTS.inc(cache='recipes_search', result='hit' if candidates is not None else 'miss')
+            if candidates is None:
+                candidates = rank(deadline)
+                snapshot = snapshot_id(version, candidates[0])
+                self.snapshots.put(snapshot, candidates)
+                self.latest.put((version, key), snapshot)
+        visible, pantry_info, retrieval = candidates
+
+        ids = visible[offset:offset + limit]
+        recipes = hydrate(ids)
+        for recipe in recipes:
+            if recipe['id'] in pantry_info:
+                coverage, missing = pantry_info[recipe['id']]
+                recipe['pantry_coverage'] = round(coverage, 3)
+                recipe['missing_count'] = int(missing) if np.isfinite(missing) else None
+        next_offset = offset + len(ids)
+        next_cursor = None
+        if next_offset < len(visible):
+            next_cursor = encode_cursor(key, next_offset, version, snapshot, retrieval['partial'])
+        return {
+            'recipes': recipes,
+            'next_cursor': next_cursor,
+            'total': len(visible),
+            'retrieval': retrieval,
+        }
+
+    def clear(self):
+        self.snapshots.clear()
+        self.latest.clear()
+
+    def __len__(self):
+        return len(self.snapshots)
@@ -0,0 +1,221 @@
+# serve.py
+"""
+Pre-fork production server for app.py
+
+The parent imports the app once (metadata, indexes), moves the large
+read-only arrays into shared memory (app.share_index_memory), binds the
+listening socket, then forks the workers. Each worker serves the inherited
+socket with werkzeug, so index pages are shared copy-on-write instead of
+loaded once per worker. Dead workers are restarted; SIGUSR1 (and startup)
+prints a per-worker RSS/PSS report.
+
+Index versions are swapped in the parent only: on SIGHUP (sent by the
+app's /admin/index/reload and /rollback) and every INDEX_WATCH_SECONDS it
+calls app.update_index(), and if the active version changed, shares the new
+arrays and replaces every worker with a fresh fork. Replaced workers stop
+accepting and finish their in-flight requests before exiting.
+
+torch is not fork-safe once initialised, so the sentence transformer is
+not loaded before the fork: PREFORK_SERVER=1 tells the app to skip it at
+import, and each worker loads its own copy in app.after_fork(), with its
+BLAS/torch threads limited to --threads-per-worker. Start Ollama
+separately (`ollama serve`); app.py only starts it when run directly.
+
+Usage: python serve.py [--workers N] [--host 0.0.0.0] [--port 5000] [--app app:app]
+"""
+
+import argparse
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from shared_index import memory_report
+
+
+def load_app(spec):
+    """'module:attribute' -> (module, WSGI app)"""
+    module_name, _, attr = spec.partition(':')
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attr or 'app')
+
+
+def bind_socket(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(module, wsgi_app, sock, host, port, threads_per_worker):
+    """Serve the inherited listening socket until SIGTERM, then finish in-flight requests"""
+    signal.set_wakeup_fd(-1)
+    for signum in (signal.SIGINT, signal.SIGCHLD, signal.SIGHUP):
+        signal.signal(signum, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    # Set before the worker imports torch
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads_per_worker)
+    after_fork = getattr(module, 'after_fork', None)
+    if after_fork is not None:
+        after_fork()
+    if 'torch' in sys.modules:
+        # N workers x all-core intra-op pools would oversubscribe the CPU
+        sys.modules['torch'].set_num_threads(threads_per_worker)
+    server = make_server(host, port, wsgi_app, threaded=True, fd=sock.fileno())
+    # server_close() then joins the request threads still running
+    server.daemon_threads = False
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    server.serve_forever()
+    server.server_close()
+
+
+def print_memory_report(pids):
+    print(f"[serve] Memory per process (MB): {'pid':>8} {'RSS':>8} {'PSS':>8} {'shared':>8} {'private':>8}")
+    for label, pid in [('parent', os.getpid())] + [('worker', p) for p in sorted(pids)]:
+        report = memory_report(pid)
+        if report is None:
+            print(f"[serve]   {label:<6} {pid:>8}  (no /proc smaps_rollup on this platform)")
+            continue
+        print(f"[serve]   {label:<6} {pid:>8} {report['rss'] / 1e6:>8.0f} {report['pss'] / 1e6:>8.0f} "
+              f"{report['shared'] / 1e6:>8.0f} {report['private'] / 1e6:>8.0f}")
+    sys.stdout.flush()
+
+
+def serve(app_spec='app:app', host='0.0.0.0', port=5000, workers=2, threads_per_worker=1):
+    os.environ['PREFORK_SERVER'] = '1'
+    module, wsgi_app = load_app(app_spec)
+    share = getattr(module, 'share_index_memory', None)
+    if share is not None:
+        share()
+    update_index = getattr(module, 'update_index', None)
+    watch_seconds = getattr(module, 'INDEX_WATCH_SECONDS', 0) if update_index is not None else 0
+
+    sock = bind_socket(host, port)
+    children = set()
+    retiring = set()
+    hup = threading.Event()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                run_worker(module, wsgi_app, sock, host, port, threads_per_worker)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def replace_workers():
+        """Fork a new set of workers, then let the old ones drain and exit"""
+        old = set(children)
+        children.clear()
+        for _ in range(workers):
+            spawn()
+        retiring.update(old)
+        for pid in old:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children | retiring:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    # Signals only wake the loop below; the work happens outside the handlers
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    signal.signal(signal.SIGHUP, lambda signum, frame: hup.set())
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print_memory_report(children))
+
+    for _ in range(workers):
+        spawn()
+    print(f"[serve] {workers} workers on http://{host}:{port} (parent pid {os.getpid()})")
+    sys.stdout.flush()
+    startup_report = threading.Timer(5.0, print_memory_report, args=(children,))
+    startup_report.daemon = True
+    startup_report.start()
+
+    next_check = time.monotonic() + watch_seconds if watch_seconds > 0 else None
+    while children or retiring:
+        timeout = None if next_check is None else max(0.0, next_check - time.monotonic())
+        select.select([wakeup_r], [], [], timeout)
+        try:
+            os.read(wakeup_r, 4096)
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid == 0:
+                break
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            children.discard(pid)
+            if not stopping:
+                print(f"[serve] Worker {pid} exited (status {status}); restarting")
+                spawn()
+        if stopping:
+            continue
+
+        due = next_check is not None and time.monotonic() >= next_check
+        if hup.is_set() or due:
+            hup.clear()
+            if next_check is not None:
+                next_check = time.monotonic() + watch_seconds
+            try:
+                changed = update_index is not None and update_index()
+                if changed and share is not None:
+                    share()
+            except Exception as e:
+                print(f"[serve] Index update failed: {e}")
+                changed = False
+            if changed:
+                print(f"[serve] Index version changed; replacing {len(children)} workers")
+                replace_workers()
+            elif update_index is None:
+                print(f"[serve] SIGHUP: replacing {len(children)} workers")
+                replace_workers()
+        sys.stdout.flush()
+
+    sock.close()
+    shared = getattr(module, 'shared_arrays', None)
+    if shared is not None:
+        shared.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pre-fork server with shared index memory')
+    parser.add_argument('--app', default='app:app', help='WSGI app as module:attribute')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='Torch intra-op threads per worker')
+    args = parser.parse_args()
+    serve(args.app, args.host, args.port, args.workers, args.threads_per_worker)
@@ -0,0 +1,91 @@
+# shard_server.py
+"""
+Shard server: owns a subset of the embedding/TF-IDF chunks and answers top-k requests
+
+app.py (via shards.RemoteShard) POSTs the already-encoded query to /topk:
+{"dense": [384 floats], "sparse": {"n_features", "indices", "data"}, "top_k": 10, "budget": 0.2}
+and gets {"dense": [[recipe_id, score], ...], "sparse": [...], "searched": {leg: rows}, "rows": n}
+back; with a budget (seconds) the shard stops scanning chunks when it runs out.
+Several servers can split one build on a single machine or across nodes.
+
+Usage: python shard_server.py --shards 0-9 [--port 6001] [--models recipe_models.pkl]
+       (--shards takes positions in the build's chunk list: "0-9", "10,12,14", "all")
+"""
+
+import argparse
+import os
+import pickle
+import time
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+from dense_index import Projection
+from metrics import span, render as render_metrics
+from shards import LocalShard, decode_request
+
+
+def parse_shard_spec(spec, num_chunks):
+    """'0-3,7' -> [0, 1, 2, 3, 7]; 'all' -> every chunk"""
+    if spec == 'all':
+        return list(range(num_chunks))
+    indices = []
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            indices.extend(range(int(first), int(last) + 1))
+        elif part:
+            indices.append(int(part))
+    return [i for i in indices if 0 <= i < num_chunks]
+
+
+def create_app(shard):
+    app = Flask(__name__)
+
+    @app.route('/health')
+    def health():
+        return jsonify({'success': True, 'name': shard.name, 'recipes': len(shard.recipe_ids),
+                        'chunks': len(shard.chunk_files)})
+
+    @app.route('/topk', methods=['POST'])
+    def topk():
+        query_emb, query_vec, top_k, deadline = decode_request(request.get_json(force=True))
+        with span('shard_topk'):
+            result = shard.search(query_emb, query_vec, top_k, deadline)
+        return jsonify({'dense': [[r_id, score] for r_id, score in result['dense']],
+                        'sparse': [[r_id, score] for r_id, score in result['sparse']],
+                        'searched': result['searched'], 'rows': result['rows']})
+
+    @app.route('/metrics')
+    def metrics():
+        return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    return app
+
+
+def load_shard(models_file, spec, name=None):
+    with open(models_file, 'rb') as f:
+        models_data = pickle.load(f)
+    chunk_indices = parse_shard_spec(spec, len(models_data['chunk_files']))
+    projection = None
+    projection_file = models_data.get('projection_file')
+    if projection_file and os.path.exists(projection_file):
+        projection = Projection.load(projection_file)
+    return LocalShard.from_models(name or f'shard[{spec}]', models_data, chunk_indices, projection,
+                                  cache_sparse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve top-k requests for a subset of the model chunks')
+    parser.add_argument('--shards', required=True, help='Chunk positions to own, e.g. "0-9" or "all"')
+    parser.add_argument('--models', default='recipe_models.pkl')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6001)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    shard = load_shard(args.models, args.shards)
+    print(f"[shard_server] {shard.name}: {len(shard.chunk_files)} chunks, {len(shard.recipe_ids):,} recipes "
+          f"({time.perf_counter() - start:.1f}s)")
+    print(f"[shard_server] Listening on http://{args.host}:{args.port}", flush=True)
+    make_server(args.host, args.port, create_app(shard), threaded=True).serve_forever()
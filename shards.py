@@ -0,0 +1,289 @@
+# shards.py
+"""
+Shard abstraction behind hybrid_search_db: local or remote, merged by a coordinator
+
+A shard owns a subset of the emb_chunk_* / tfidf_chunk_* files and answers
+"top-k by dense and/or sparse score" with recipe ids, so results from
+different shards merge without any shared row numbering. LocalShard scores
+files on this machine; RemoteShard asks a shard_server.py process over
+HTTP. The Coordinator fans a query out to every shard in parallel, waits at
+most `timeout` seconds, and merges whatever came back, listing shards that
+failed or were too slow so the caller can report a partial result.
+
+With a deadline (a time.monotonic() value) each shard scans its chunks in
+priority order (DenseIndex.shard_order for the dense leg, file order for the
+sparse one) and stops starting new chunks once it has passed, so the merged
+top-k is the best found in time and `coverage` says what fraction of the
+corpus it was drawn from.
+"""
+
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from csr import CSRMatrix
+from dense_index import DenseIndex, top_k_desc
+from metrics import CACHE_REQUESTS, SHARD_FAILURES
+from sparse_weighting import SparseQuery
+
+SHARD_TIMEOUT = 0.5
+# How long past a deadline the coordinator waits for shards finishing their current chunk
+DEADLINE_GRACE = 0.05
+
+
+def merge_top_k(lists, top_k):
+    """Merge [(recipe_id, score), ...] lists into the best top_k, one entry per id"""
+    best = {}
+    for results in lists:
+        for r_id, score in results:
+            if r_id not in best or score > best[r_id]:
+                best[r_id] = score
+    return sorted(best.items(), key=lambda item: -item[1])[:top_k]
+
+
+def select_shards(models_data, chunk_indices):
+    """(chunk_files, chunk_offsets, recipe_ids) restricted to the given positions in chunk_files"""
+    files = models_data['chunk_files']
+    offsets = list(models_data['chunk_offsets']) + [len(models_data['recipe_ids'])]
+    recipe_ids = np.asarray(models_data['recipe_ids'], dtype=np.int64)
+    chunk_files, chunk_offsets, ids = [], [], []
+    local = 0
+    for i in chunk_indices:
+        chunk_files.append(files[i])
+        chunk_offsets.append(local)
+        ids.append(recipe_ids[offsets[i]:offsets[i + 1]])
+        local += offsets[i + 1] - offsets[i]
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    return chunk_files, chunk_offsets, ids
+
+
+class LocalShard:
+    """Scores a set of chunk files in this process
+
+    dense_index: optional prebuilt DenseIndex over exactly these files
+    (e.g. the app's, with its projected prefilter). cache_sparse keeps the
+    TF-IDF matrices in memory instead of reading them per query.
+    """
+
+    def __init__(self, name, chunks_dir, chunk_files, chunk_offsets, recipe_ids, dense_index=None,
+                 cache_sparse=False):
+        self.name = name
+        self.chunks_dir = chunks_dir
+        self.chunk_files = chunk_files
+        self.chunk_offsets = np.asarray(chunk_offsets, dtype=np.int64)
+        self.recipe_ids = recipe_ids
+        self.dense_index = dense_index or DenseIndex(chunks_dir, chunk_files, chunk_offsets)
+        self.cache_sparse = cache_sparse
+        self._sparse = [None] * len(chunk_files)
+
+    @classmethod
+    def from_models(cls, name, models_data, chunk_indices, projection=None, cache_sparse=False):
+        chunk_files, chunk_offsets, recipe_ids = select_shards(models_data, chunk_indices)
+        dense = DenseIndex(models_data['chunks_dir'], chunk_files, chunk_offsets, projection)
+        return cls(name, models_data['chunks_dir'], chunk_files, chunk_offsets, recipe_ids, dense, cache_sparse)
+
+    def _tfidf(self, i):
+        if self._sparse[i] is not None:
+            CACHE_REQUESTS.inc(cache='shard_tfidf', result='hit')
+            return self._sparse[i]
+        path = os.path.join(self.chunks_dir, self.chunk_files[i]['tfidf'])
+        if not os.path.exists(path):
+            return None
+        matrix = CSRMatrix.load_npz(path)
+        if self.cache_sparse:
+            CACHE_REQUESTS.inc(cache='shard_tfidf', result='miss')
+            self._sparse[i] = matrix
+        return matrix
+
+    @property
+    def rows(self):
+        return len(self.recipe_ids)
+
+    def _dense_scan(self, query_emb, top_k, deadline=None):
+        """([(id, score)], rows searched)"""
+        if deadline is None:
+            rows, scores = self.dense_index.search(query_emb, top_k=top_k)
+            searched = self.rows
+        else:
+            rows, scores, searched = self.dense_index.anytime_search(query_emb, top_k=top_k, deadline=deadline)
+        hits = [(int(self.recipe_ids[r]), float(s)) for r, s in zip(rows, scores) if r < len(self.recipe_ids)]
+        return hits, searched
+
+    def _sparse_scan(self, query_vec, top_k, deadline=None):
+        """([(id, score)], rows searched); query_vec as for sparse_search"""
+        query = np.zeros(query_vec.shape[1], dtype=np.float32)
+        np.add.at(query, query_vec.indices, query_vec.data)
+        results = []
+        searched = 0
+        for i in range(len(self.chunk_files)):
+            if i and deadline is not None and time.monotonic() >= deadline:
+                break
+            matrix = self._tfidf(i)
+            if matrix is None:
+                continue
+            scores = matrix.dot(query)
+            searched += matrix.shape[0]
+            top = top_k_desc(scores, top_k)
+            top = top[scores[top] > 0]
+            results.extend((int(self.recipe_ids[self.chunk_offsets[i] + t]), float(scores[t])) for t in top)
+        return merge_top_k([results], top_k), searched
+
+    def dense_search(self, query_emb, top_k, deadline=None):
+        return self._dense_scan(query_emb, top_k, deadline)[0]
+
+    def sparse_search(self, query_vec, top_k, deadline=None):
+        """query_vec: SparseQuery (or 1-row CSR), already L2-normalized like the shard rows"""
+        return self._sparse_scan(query_vec, top_k, deadline)[0]
+
+    def search(self, query_emb=None, query_vec=None, top_k=10, deadline=None):
+        """{'dense': [(id, score)], 'sparse': [(id, score)], 'searched': {leg: rows}, 'rows': n}
+
+        Only the legs whose query part is given are searched (and listed in 'searched').
+        """
+        result = {'dense': [], 'sparse': [], 'searched': {}, 'rows': self.rows}
+        if query_emb is not None:
+            result['dense'], result['searched']['dense'] = self._dense_scan(query_emb, top_k, deadline)
+        if query_vec is not None:
+            result['sparse'], result['searched']['sparse'] = self._sparse_scan(query_vec, top_k, deadline)
+        return result
+
+
+def encode_request(query_emb, query_vec, top_k, budget=None):
+    """JSON body for /topk; budget: seconds the shard may spend (sent relative, clocks differ)"""
+    body = {'top_k': top_k}
+    if budget is not None:
+        body['budget'] = max(0.0, budget)
+    if query_emb is not None:
+        body['dense'] = np.asarray(query_emb, dtype=np.float32).ravel().tolist()
+    if query_vec is not None:
+        body['sparse'] = {'n_features': query_vec.shape[1], 'indices': query_vec.indices.tolist(),
+                          'data': query_vec.data.tolist()}
+    return body
+
+
+def decode_request(body):
+    """(query_emb, query_vec, top_k, deadline) from encode_request()'s JSON"""
+    query_emb = np.asarray(body['dense'], dtype=np.float32) if body.get('dense') is not None else None
+    query_vec = None
+    if body.get('sparse') is not None:
+        s = body['sparse']
+        query_vec = SparseQuery(s['indices'], s['data'], s['n_features'])
+    deadline = time.monotonic() + float(body['budget']) if body.get('budget') is not None else None
+    return query_emb, query_vec, int(body.get('top_k', 10)), deadline
+
+
+class RemoteShard:
+    """A shard_server.py process reached over HTTP"""
+
+    def __init__(self, url, timeout=SHARD_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.name = self.url
+        self.timeout = timeout
+        self.rows = None  # learned from the first answer
+
+    def search(self, query_emb=None, query_vec=None, top_k=10, deadline=None):
+        budget = deadline - time.monotonic() if deadline is not None else None
+        data = json.dumps(encode_request(query_emb, query_vec, top_k, budget)).encode('utf-8')
+        req = urllib.request.Request(self.url + '/topk', data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            body = json.loads(resp.read())
+        result = {leg: [(int(r_id), float(score)) for r_id, score in body.get(leg, [])] for leg in ('dense', 'sparse')}
+        if body.get('rows') is not None:
+            self.rows = int(body['rows'])
+        # Older shard servers search everything and don't say so
+        result['rows'] = self.rows
+        result['searched'] = body.get('searched') or {leg: self.rows for leg, part in
+                                                       (('dense', query_emb), ('sparse', query_vec))
+                                                       if part is not None}
+        return result
+
+
+class Coordinator:
+    """Scatter a query to all shards, gather within the timeout, merge the top-k
+
+    The thread pool belongs to the process that created it: a forked child
+    (serve.py worker) inherits the pool but none of its threads, so it gets a
+    new one on first use.
+    """
+
+    def __init__(self, shards, timeout=SHARD_TIMEOUT):
+        self.shards = shards
+        self.timeout = timeout
+        self._executor = None
+        self._executor_pid = None
+
+    @property
+    def executor(self):
+        if self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.shards)), thread_name_prefix='shard')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def close(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = self._executor_pid = None
+
+    def search(self, query_emb=None, query_vec=None, top_k=10, deadline=None):
+        """{'dense', 'sparse': merged [(id, score)], 'failed': [shard names], 'shards': total,
+        'coverage': fraction of rows searched, 'partial': True if coverage < 1}
+
+        deadline: time.monotonic() value; shards stop scanning there and the
+        wait ends DEADLINE_GRACE later (or after `timeout`, if sooner).
+        """
+        timeout = self.timeout
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic()) + DEADLINE_GRACE
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        futures = {self.executor.submit(shard.search, query_emb, query_vec, top_k, deadline): shard
+                   for shard in self.shards}
+        done, pending = wait(futures, timeout=timeout)
+
+        failed = [futures[f].name for f in pending]
+        dense, sparse_results = [], []
+        answered = {}
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[shards] {futures[future].name} failed: {e}")
+                failed.append(futures[future].name)
+                SHARD_FAILURES.inc(shard=futures[future].name)
+                continue
+            dense.append(result['dense'])
+            sparse_results.append(result['sparse'])
+            answered[futures[future]] = result
+        for f in pending:
+            print(f"[shards] {futures[f].name} timed out after {timeout}s")
+            SHARD_FAILURES.inc(shard=futures[f].name)
+        coverage = self._coverage(answered, [leg for leg, part in (('dense', query_emb), ('sparse', query_vec))
+                                             if part is not None])
+        return {
+            'dense': merge_top_k(dense, top_k),
+            'sparse': merge_top_k(sparse_results, top_k),
+            'failed': failed,
+            'shards': len(self.shards),
+            'coverage': coverage,
+            'partial': bool(failed) or coverage < 1.0,
+        }
+
+    def _coverage(self, answered, legs):
+        """Fraction of all shards' rows searched by the least-covered leg
+
+        Shards that never answered count as unsearched; their size is the
+        last one they reported, else the mean of the known sizes.
+        """
+        if not legs:
+            return 1.0
+        sizes = {shard: shard.rows for shard in self.shards if shard.rows}
+        default = sum(sizes.values()) / len(sizes) if sizes else 1
+        total = sum(sizes.get(shard, default) for shard in self.shards)
+        if not total:
+            return 1.0
+        searched = [sum(min(result.get('searched', {}).get(leg, 0) or 0, sizes.get(shard, default))
+                        for shard, result in answered.items()) for leg in legs]
+        return float(min(searched) / total)
@@ -0,0 +1,99 @@
+# shared_index.py
+"""
+Read-only index arrays in one multiprocessing.shared_memory segment
+
+serve.py loads app.py once in the parent, then app.share_index_memory()
+copies the large arrays (recipe ids, projected prefilter vectors) into a
+single segment before forking, so every worker maps the same physical pages
+instead of holding its own copy. A Python list of 2.2M ids would also be
+un-shared page by page as workers touch refcounts; a numpy array is not.
+"""
+
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_ALIGN = 64
+
+
+class SharedArrays:
+    """Named numpy views over one shared-memory segment
+
+    The views point straight into the mapping: keep this object referenced
+    for as long as any view is used, and close() only at shutdown.
+    """
+
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {}
+        for name, (offset, dtype, shape) in layout.items():
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            view.flags.writeable = False
+            self.arrays[name] = view
+
+    @classmethod
+    def create(cls, arrays):
+        """Copy {name: ndarray} into a new segment; the creating process owns (unlinks) it"""
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            size = -(-size // _ALIGN) * _ALIGN
+            layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, array in arrays.items():
+            offset, dtype, shape = layout[name]
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[...] = array
+        return cls(shm, layout, owner=os.getpid())
+
+    @classmethod
+    def attach(cls, name, layout):
+        """Map an existing segment by name
+
+        Meant for processes spawned by the creator: they share its resource
+        tracker, which only unlinks leftovers once every user has exited.
+        """
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=None)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        """Drop the views and unmap; the owner also unlinks the segment"""
+        self.arrays = {}
+        self.shm.close()
+        if self.owner == os.getpid():
+            self.shm.unlink()
+
+
+def memory_report(pid=None):
+    """{'rss', 'pss', 'shared', 'private'} in bytes from /proc/<pid>/smaps_rollup, or None"""
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    fields = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3 and parts[0].endswith(':') and parts[2] == 'kB':
+            fields[parts[0][:-1]] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
@@ -0,0 +1,228 @@
+# sparse_weighting.py
+"""
+Document-frequency weighting and feature pruning for the hashed TF-IDF shards
+
+build_models.py streams every search_text through the HashingVectorizer once
+to count document frequencies, then freezes an IDF vector: hashed features
+seen in fewer than `min_df` documents (typos, one-off bigrams) or in more
+than `max_df` of them ("salt pepper", "preheat oven") get weight zero and
+are dropped from both the shards and the query vector. Each document also
+keeps only its `max_nnz` highest-weighted features.
+
+Building uses sklearn's HashingVectorizer; queries go through
+transform_query(), a pure-Python copy of the same tokenizer and
+MurmurHash3 feature hashing, so the serving path imports neither sklearn
+nor scipy (see benchmarks/bench_startup.py).
+"""
+
+import hashlib
+import re
+import struct
+from collections import Counter
+
+import numpy as np
+
+N_FEATURES = 2**18
+MIN_DF = 3
+MAX_DF = 0.4
+MAX_NNZ = 128
+# Below this many documents DF thresholds mostly remove useful words
+PRUNE_MIN_DOCS = 1000
+IDF_FILE = 'idf.npz'
+NGRAM_RANGE = (1, 2)
+
+# HashingVectorizer defaults: lowercase, then tokens of 2+ word characters
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+_UINT32 = 0xFFFFFFFF
+
+
+def make_hashing_vectorizer(n_features=N_FEATURES):
+    """Raw term counts; weighting and normalization happen afterwards"""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=NGRAM_RANGE,
+        alternate_sign=False,
+        norm=None,
+    )
+
+
+def _rotl32(x, r):
+    return ((x << r) | (x >> (32 - r))) & _UINT32
+
+
+def murmurhash3_32(key, seed=0):
+    """Signed 32-bit MurmurHash3 (x86_32) of bytes, as sklearn.utils.murmurhash3_32"""
+    c1, c2 = 0xCC9E2D51, 0x1B873593
+    h = seed & _UINT32
+    body = len(key) - len(key) % 4
+    for (k,) in struct.iter_unpack('<I', key[:body]):
+        k = _rotl32((k * c1) & _UINT32, 15) * c2 & _UINT32
+        h = (_rotl32(h ^ k, 13) * 5 + 0xE6546B64) & _UINT32
+    tail = key[body:]
+    if tail:
+        k = int.from_bytes(tail, 'little')
+        h ^= _rotl32((k * c1) & _UINT32, 15) * c2 & _UINT32
+    h ^= len(key)
+    h = ((h ^ (h >> 16)) * 0x85EBCA6B) & _UINT32
+    h = ((h ^ (h >> 13)) * 0xC2B2AE35) & _UINT32
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+def hashed_features(text, n_features=N_FEATURES, ngram_range=NGRAM_RANGE):
+    """Feature index of every word n-gram in text, as make_hashing_vectorizer() would hash them"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    low, high = ngram_range
+    features = []
+    for n in range(low, min(high, len(tokens)) + 1):
+        for i in range(len(tokens) - n + 1):
+            h = murmurhash3_32(' '.join(tokens[i:i + n]).encode('utf-8'))
+            # abs(-2**31) overflows in sklearn's int32 arithmetic; this is what it computes instead
+            features.append((2147483647 - (n_features - 1)) % n_features if h == -2**31 else abs(h) % n_features)
+    return features
+
+
+class SparseQuery:
+    """One hashed TF-IDF query vector: sorted feature indices and their weights
+
+    Has the indices/data/shape attributes of a 1-row CSR matrix, which is
+    all the shards read.
+    """
+
+    def __init__(self, indices, data, n_features):
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.shape = (1, n_features)
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+
+class DocumentFrequencies:
+    """Streaming per-feature document counts"""
+
+    def __init__(self, n_features=N_FEATURES):
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.hashing = make_hashing_vectorizer(n_features)
+
+    def update(self, texts):
+        counts = self.hashing.transform(texts)
+        counts.sum_duplicates()
+        self.df += np.bincount(counts.indices, minlength=len(self.df))
+        self.n_docs += counts.shape[0]
+
+
+def idf_weights(df, n_docs, min_df=MIN_DF, max_df=MAX_DF):
+    """Smoothed IDF per feature; pruned (and unseen) features get 0"""
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    if n_docs >= PRUNE_MIN_DOCS:
+        idf[(df < min_df) | (df > max_df * n_docs)] = 0.0
+    idf[df == 0] = 0.0
+    return idf
+
+
+def cap_row_nnz(matrix, max_nnz):
+    """Keep each CSR row's max_nnz largest entries"""
+    lengths = np.diff(matrix.indptr)
+    if max_nnz is None or lengths.max(initial=0) <= max_nnz:
+        return matrix
+    from scipy import sparse
+    rows = np.repeat(np.arange(matrix.shape[0]), lengths)
+    # Within each row, largest first; rank = position inside the row
+    order = np.lexsort((-matrix.data, rows))
+    rank = np.arange(matrix.nnz) - matrix.indptr[rows[order]]
+    keep = np.zeros(matrix.nnz, dtype=bool)
+    keep[order[rank < max_nnz]] = True
+    capped = sparse.csr_matrix((matrix.data[keep], matrix.indices[keep],
+                                np.concatenate([[0], np.cumsum(np.minimum(lengths, max_nnz))])),
+                               shape=matrix.shape)
+    return capped
+
+
+class WeightedHashingVectorizer:
+    """HashingVectorizer + frozen IDF + per-row nnz cap, L2-normalized
+
+    Drop-in for the old 'tfidf_vectorizer' entry in recipe_models.pkl.
+    transform() (batches, scipy CSR) is for builds; app.py calls
+    transform_query(), which gives the same vector without sklearn. The
+    sklearn HashingVectorizer is created on first transform() and is not
+    pickled.
+    """
+
+    def __init__(self, idf, max_nnz=MAX_NNZ, n_docs=0, min_df=MIN_DF, max_df=MAX_DF):
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.max_nnz = max_nnz
+        self.n_docs = n_docs
+        self.min_df = min_df
+        self.max_df = max_df
+        self._hashing = None
+
+    @classmethod
+    def from_frequencies(cls, frequencies, max_nnz=MAX_NNZ, min_df=MIN_DF, max_df=MAX_DF):
+        idf = idf_weights(frequencies.df, frequencies.n_docs, min_df, max_df)
+        return cls(idf, max_nnz, frequencies.n_docs, min_df, max_df)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['idf'], int(data['max_nnz']), int(data['n_docs']),
+                   int(data['min_df']), float(data['max_df']))
+
+    def save(self, file):
+        np.savez(file, idf=self.idf, max_nnz=self.max_nnz, n_docs=self.n_docs,
+                 min_df=self.min_df, max_df=self.max_df)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_hashing'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Pickles from before transform_query() carry a HashingVectorizer as 'hashing'
+        state.pop('hashing', None)
+        state.setdefault('_hashing', None)
+        self.__dict__.update(state)
+
+    @property
+    def hashing(self):
+        if self._hashing is None:
+            self._hashing = make_hashing_vectorizer(len(self.idf))
+        return self._hashing
+
+    @property
+    def kept_features(self):
+        return int(np.count_nonzero(self.idf))
+
+    def fingerprint(self):
+        """Short hash identifying the weighting; shards built with another need new sparse rows"""
+        h = hashlib.blake2b(self.idf.tobytes(), digest_size=8)
+        h.update(str(self.max_nnz).encode())
+        return h.hexdigest()
+
+    def transform(self, texts):
+        counts = self.hashing.transform(texts)
+        counts.sum_duplicates()
+        # Sublinear tf so one long instruction list does not swamp the name
+        weighted = counts.astype(np.float32)
+        weighted.data = (1.0 + np.log(weighted.data)) * self.idf[weighted.indices]
+        weighted.eliminate_zeros()
+        weighted = cap_row_nnz(weighted, self.max_nnz)
+        from sklearn.preprocessing import normalize
+        return normalize(weighted, norm='l2', copy=False)
+
+    def transform_query(self, text):
+        """SparseQuery for one text; same values as transform([text])"""
+        counts = Counter(hashed_features(text, len(self.idf)))
+        indices = np.array(sorted(counts), dtype=np.int32)
+        tf = np.array([counts[i] for i in indices], dtype=np.float32)
+        weights = (1.0 + np.log(tf)) * self.idf[indices]
+        keep = weights != 0
+        indices, weights = indices[keep], weights[keep]
+        if self.max_nnz is not None and len(weights) > self.max_nnz:
+            top = np.sort(np.argsort(-weights, kind='stable')[:self.max_nnz])
+            indices, weights = indices[top], weights[top]
+        norm = np.sqrt(np.dot(weights, weights))
+        return SparseQuery(indices, weights / norm if norm > 0 else weights, len(self.idf))
@@ -0,0 +1,233 @@
+import os
+import io
+import json
+import pickle
+import sqlite3
+import tempfile
+import contextlib
+import hashlib
+
+import numpy as np
+from scipy import sparse
+
+import create_db
+import build_models
+
+
+class FakeEncoder:
+    """Deterministic text -> vector; counts encoded texts and can fail on demand"""
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.texts = 0
+        self.fail_after = fail_after
+
+    def __call__(self, texts):
+        if self.fail_after is not None and self.calls >= self.fail_after:
+            raise RuntimeError('simulated crash')
+        self.calls += 1
+        self.texts += len(texts)
+        return np.array([fake_vector(t) for t in texts], dtype=np.float32)
+
+
+def fake_vector(text):
+    seed = int.from_bytes(hashlib.md5(text.encode()).digest()[:4], 'little')
+    return np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+
+
+class StubModel:
+    """Stands in for the SentenceTransformer in EncoderPool workers: the text's number, or a failure"""
+
+    def encode(self, texts, **kwargs):
+        if 'boom' in texts:
+            raise ValueError('bad text')
+        return np.array([[float(t), os.getpid()] for t in texts])
+
+
+def _make_db(path, n):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(path)
+    _add_recipes(path, 0, n)
+
+
+def _add_recipes(path, start, n):
+    conn = sqlite3.connect(path)
+    for i in range(start, start + n):
+        conn.execute('INSERT INTO recipes (name, ingredients, instructions, search_text) VALUES (?, ?, ?, ?)',
+                     (f'Recipe {i}', 'salt', 'Cook.', f'recipe {i} text'))
+    conn.commit()
+    conn.close()
+
+
+def _build(tmp, encoder, **kwargs):
+    kwargs.setdefault('cache_dir', None)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return build_models.build(
+            db_file=os.path.join(tmp, 'r.db'), chunks_dir=os.path.join(tmp, 'chunks'),
+            output_file=os.path.join(tmp, 'models.pkl'), encode=encoder, chunk_size=4, **kwargs)
+
+
+def _check_consistent(tmp):
+    """Every indexed row's embedding matches its current search_text"""
+    with open(os.path.join(tmp, 'models.pkl'), 'rb') as f:
+        models = pickle.load(f)
+    conn = sqlite3.connect(os.path.join(tmp, 'r.db'))
+    texts = dict(conn.execute('SELECT id, search_text FROM recipes'))
+    conn.close()
+    assert sorted(models['recipe_ids']) == sorted(texts)
+    for files, offset in zip(models['chunk_files'], models['chunk_offsets']):
+        emb = np.load(os.path.join(models['chunks_dir'], files['emb']))
+        for local, vec in enumerate(emb):
+            r_id = models['recipe_ids'][offset + local]
+            assert np.allclose(vec, fake_vector(texts[r_id]))
+        assert os.path.exists(os.path.join(models['chunks_dir'], files['proj']))
+    return models
+
+
+def test_incremental_build():
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_db(os.path.join(tmp, 'r.db'), 10)
+
+        enc = FakeEncoder()
+        manifest = _build(tmp, enc)
+        assert enc.texts == 10
+        assert [s['count'] for s in manifest['shards']] == [4, 4, 2]
+        assert manifest['complete'] and manifest['high_water_id'] == 10
+        _check_consistent(tmp)
+
+        # Nothing changed: nothing encoded
+        enc = FakeEncoder()
+        _build(tmp, enc)
+        assert enc.texts == 0
+
+        # New recipes top up the partial shard, then open a new one
+        _add_recipes(os.path.join(tmp, 'r.db'), 10, 5)
+        enc = FakeEncoder()
+        manifest = _build(tmp, enc, append_only=True)
+        assert enc.texts == 5
+        assert [s['count'] for s in manifest['shards']] == [4, 4, 4, 3]
+        _check_consistent(tmp)
+
+        # Changed search_text: only that row is re-encoded
+        conn = sqlite3.connect(os.path.join(tmp, 'r.db'))
+        conn.execute("UPDATE recipes SET search_text = 'changed' WHERE id = 6")
+        conn.commit()
+        conn.close()
+        enc = FakeEncoder()
+        _build(tmp, enc)
+        assert enc.texts == 1
+        _check_consistent(tmp)
+
+
+def test_resume_after_crash():
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_db(os.path.join(tmp, 'r.db'), 10)
+
+        try:
+            _build(tmp, FakeEncoder(fail_after=2))
+            assert False, 'expected simulated crash'
+        except RuntimeError:
+            pass
+        with open(os.path.join(tmp, 'chunks', build_models.MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        assert not manifest['complete']
+        assert [s['count'] for s in manifest['shards']] == [4, 4]
+
+        enc = FakeEncoder()
+        manifest = _build(tmp, enc)
+        assert enc.texts == 2
+        assert manifest['complete']
+        _check_consistent(tmp)
+
+
+def test_dirty_shard_is_rebuilt():
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_db(os.path.join(tmp, 'r.db'), 8)
+        _build(tmp, FakeEncoder())
+
+        # Simulate a crash while shard 1's files were being swapped
+        path = os.path.join(tmp, 'chunks', build_models.MANIFEST_FILE)
+        with open(path) as f:
+            manifest = json.load(f)
+        previous = dict(manifest['shards'][1])
+        manifest['shards'][1] = {**previous, 'dirty': True, 'previous': previous}
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+        np.save(os.path.join(tmp, 'chunks', 'emb_chunk_1.npy'), np.zeros((4, 8), dtype=np.float32))
+
+        enc = FakeEncoder()
+        _build(tmp, enc, append_only=True)
+        assert enc.texts == 4
+        _check_consistent(tmp)
+
+
+def test_refit_idf_rewrites_sparse_rows_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_db(os.path.join(tmp, 'r.db'), 10)
+        manifest = _build(tmp, FakeEncoder())
+        weighting = manifest['shards'][0]['weighting']
+
+        # Grow the corpus past the refit threshold: old shards get new sparse rows, no re-encoding
+        _add_recipes(os.path.join(tmp, 'r.db'), 10, 10)
+        enc = FakeEncoder()
+        manifest = _build(tmp, enc)
+        assert enc.texts == 10
+        assert all(s['weighting'] != weighting for s in manifest['shards'])
+        models = _check_consistent(tmp)
+        assert models['tfidf_vectorizer'].n_docs == 20
+        query = models['tfidf_vectorizer'].transform(['recipe 13 text'])
+        scores = (sparse.load_npz(os.path.join(tmp, 'chunks', 'tfidf_chunk_3.npz')) @ query.T).toarray().ravel()
+        assert scores.argmax() == 1
+
+
+def test_reingest_hits_embedding_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        _make_db(os.path.join(tmp, 'r.db'), 10)
+        enc = FakeEncoder()
+        _build(tmp, enc, cache_dir=cache_dir)
+        assert enc.texts == 10
+
+        # Re-ingest shifts every id; only the one new text is encoded
+        os.remove(os.path.join(tmp, 'r.db'))
+        _make_db(os.path.join(tmp, 'r.db'), 0)
+        _add_recipes(os.path.join(tmp, 'r.db'), 5, 6)
+        _add_recipes(os.path.join(tmp, 'r.db'), 0, 5)
+        enc = FakeEncoder()
+        _build(tmp, enc, cache_dir=cache_dir, rebuild=True)
+        assert enc.texts == 1
+        _check_consistent(tmp)
+
+
+def test_encoder_pool_keeps_order_and_propagates_errors():
+    texts = [str(i) for i in range(37)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        with build_models.EncoderPool(2, 1, load_model=StubModel) as pool:
+            out = pool(texts)
+        assert out[:, 0].tolist() == list(range(37))
+        assert os.getpid() not in out[:, 1]
+
+        try:
+            with build_models.EncoderPool(2, 1, load_model=StubModel) as pool:
+                pool(texts[:5] + ['boom'] + texts[5:])
+        except ValueError as e:
+            assert str(e) == 'bad text'
+        else:
+            raise AssertionError('worker error was swallowed')
+    # The failed pool was shut down on the way out
+    try:
+        pool.pool.map(len, ['x'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('pool still running')
+
+
+if __name__ == "__main__":
+    test_incremental_build()
+    test_resume_after_crash()
+    test_dirty_shard_is_rebuilt()
+    test_refit_idf_rewrites_sparse_rows_only()
+    test_reingest_hits_embedding_cache()
+    test_encoder_pool_keeps_order_and_propagates_errors()
+    print("✅ All tests passed!")
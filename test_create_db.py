@@ -0,0 +1,92 @@
+import os
+import io
+import sqlite3
+import tempfile
+import contextlib
+
+import pandas as pd
+
+import create_db
+from keyword_search import keyword_search
+
+ROWS = [
+    {'name': 'Chicken Biryani', 'ingredients': '["chicken", "basmati rice", "onion"]',
+     'instructions': '["Marinate the chicken for 30 minutes.", "Layer with rice and cook."]', 'cuisine': 'Indian'},
+    {'name': 'Paneer Butter Masala', 'ingredients': '["paneer", "butter", "tomato"]',
+     'instructions': '["Cook the tomato gravy 10 min.", "Add paneer."]', 'cuisine': 'Indian'},
+    {'name': 'Tomato Soup', 'ingredients': '["tomato", "cream"]',
+     'instructions': '["Simmer tomatoes 20 minutes. Blend with cream."]', 'cuisine': 'Italian'},
+    {'name': 'x', 'ingredients': '["skipped: name too short"]', 'instructions': '["Nothing."]'},
+]
+
+
+def _load(tmp, name, files, bulk):
+    db = os.path.join(tmp, name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(db, with_indexes=not bulk)
+        create_db.files_to_database(files, db, clear_existing=True, bulk=bulk)
+    return db
+
+
+def _snapshot(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute('SELECT * FROM recipes ORDER BY id').fetchall()
+    schema = sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+    hits = {q: keyword_search(conn, q) for q in ('tomato', 'chicken rice', 'paneer', 'cream')}
+    conn.close()
+    return rows, schema, hits
+
+
+def test_bulk_and_default_loads_match():
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'recipes.csv')
+        pd.DataFrame(ROWS).to_csv(data, index=False)
+
+        bulk = _snapshot(_load(tmp, 'bulk.db', [data], bulk=True))
+        default = _snapshot(_load(tmp, 'default.db', [data], bulk=False))
+        assert len(bulk[0]) == 3
+        assert bulk == default
+        assert [r_id for r_id, _ in bulk[2]['tomato']] and bulk[2]['paneer'][0][0] == 2
+
+
+class _FailingFrame:
+    """Yields the first rows of ROWS, then fails as a broken file read would"""
+
+    def __len__(self):
+        return len(ROWS)
+
+    def iterrows(self):
+        for i, row in enumerate(ROWS[:2]):
+            yield i, pd.Series(row)
+        raise OSError('read error')
+
+
+def test_failed_file_is_not_half_loaded():
+    load_file = create_db.load_file
+    with tempfile.TemporaryDirectory() as tmp:
+        broken, good = os.path.join(tmp, 'broken.csv'), os.path.join(tmp, 'good.csv')
+        pd.DataFrame(ROWS[2:3]).to_csv(good, index=False)
+        open(broken, 'w').close()
+        create_db.load_file = lambda path: _FailingFrame() if path == broken else load_file(path)
+        try:
+            # Default mode: the broken file's batch is rolled back and the next file still loads
+            db = _load(tmp, 'default.db', [broken, good], bulk=False)
+            conn = sqlite3.connect(db)
+            assert [r[0] for r in conn.execute('SELECT name FROM recipes')] == ['Tomato Soup']
+            conn.close()
+
+            # Bulk mode has no journal to roll back with, so the load fails
+            try:
+                _load(tmp, 'bulk.db', [broken, good], bulk=True)
+            except OSError:
+                pass
+            else:
+                raise AssertionError('bulk load did not fail')
+        finally:
+            create_db.load_file = load_file
+
+
+if __name__ == "__main__":
+    test_bulk_and_default_loads_match()
+    test_failed_file_is_not_half_loaded()
+    print("✅ All tests passed!")
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+from csr import CSRMatrix
+
+
+def _matrix():
+    rng = np.random.default_rng(0)
+    dense = rng.random((40, 30)).astype(np.float32)
+    dense[dense < 0.8] = 0
+    dense[[3, 17, 39]] = 0  # empty rows, including the last one
+    return sparse.csr_matrix(dense)
+
+
+def test_load_npz_and_dot_match_scipy():
+    matrix = _matrix()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'm.npz')
+        sparse.save_npz(path, matrix)
+        loaded = CSRMatrix.load_npz(path)
+    assert loaded.shape == matrix.shape and loaded.nnz == matrix.nnz
+    vec = np.zeros(30, dtype=np.float32)
+    vec[[1, 4, 29]] = [0.5, 2.0, 1.0]
+    scores = loaded.dot(vec)
+    assert scores.dtype == np.float32
+    assert np.allclose(scores, matrix @ vec)
+    assert (scores[[3, 17, 39]] == 0).all()
+
+
+def test_take_rows():
+    matrix = _matrix()
+    loaded = CSRMatrix(matrix.data, matrix.indices, matrix.indptr, matrix.shape)
+    rows = [39, 0, 3, 5, 5]
+    vec = np.arange(30, dtype=np.float32)
+    assert np.allclose(loaded.take_rows(rows).dot(vec), matrix[rows] @ vec)
+
+
+def test_rejects_other_formats():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'm.npz')
+        sparse.save_npz(path, _matrix().tocsc())
+        try:
+            CSRMatrix.load_npz(path)
+            assert False, 'CSC should be rejected'
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_load_npz_and_dot_match_scipy()
+    test_take_rows()
+    test_rejects_other_formats()
+    print("✅ All tests passed!")
@@ -0,0 +1,84 @@
+import os
+import io
+import sqlite3
+import tempfile
+import contextlib
+
+import numpy as np
+
+import create_db
+from dedup import MinHasher, cluster_signatures, recipe_token_hashes, indexable_where
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a = np.arange(100, dtype=np.uint64)
+    b = np.arange(50, 150, dtype=np.uint64)  # Jaccard 50/150
+    sigs = hasher.signatures([a, b, np.zeros(0, dtype=np.uint64)])
+    estimate = (sigs[0] == sigs[1]).mean()
+    assert abs(estimate - 1 / 3) < 0.1
+    assert (sigs[2] == 0xFFFFFFFF).all()
+
+
+def test_cluster_signatures_links_near_duplicates():
+    hasher = MinHasher()
+    base = recipe_token_hashes('Fried Rice', [1, 2, 3, 4, 5, 6, 7, 8, 9])
+    dup = recipe_token_hashes('Fried Rice', [1, 2, 3, 4, 5, 6, 7, 8, 9])
+    near = recipe_token_hashes('Easy Fried Rice', [1, 2, 3, 4, 5, 6, 7, 8, 9])
+    other = recipe_token_hashes('Chocolate Cake', [20, 21, 22, 23, 24])
+    dup_of_near = recipe_token_hashes('Easy Fried Rice', [1, 2, 3, 4, 5, 6, 7, 8, 9])
+    labels = cluster_signatures(hasher.signatures([base, other, dup, near, dup_of_near]))
+    assert labels.tolist() == [0, 1, 0, 0, 0]
+
+
+def test_invalid_rows_stay_singletons():
+    hasher = MinHasher()
+    empty = np.zeros(0, dtype=np.uint64)
+    labels = cluster_signatures(hasher.signatures([empty, empty]), valid=np.array([False, False]))
+    assert labels.tolist() == [0, 1]
+
+
+def test_assign_clusters():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'r.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_database(db)
+            conn = sqlite3.connect(db)
+            rows = [
+                ('Fried Rice', 'rice|egg|soy sauce|onion|peas|carrot'),
+                ('Chocolate Cake', 'flour|cocoa|sugar|egg|butter'),
+                ('Fried Rice', '2 c. rice|2 eggs|soy sauce|1 onion|peas|carrots'),
+                ('No Ingredients', ''),
+            ]
+            for name, ingredients in rows:
+                conn.execute('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)',
+                             (name, ingredients, 'Cook.'))
+            conn.commit()
+            conn.close()
+            create_db.populate_ingredient_tables(db)
+            stats = create_db.assign_clusters(db)
+            # Only the duplicate pair is written; singletons keep NULL
+            assert stats['updated'] == 2
+
+        conn = sqlite3.connect(db)
+        clusters = dict(conn.execute('SELECT id, cluster_id FROM recipes'))
+        assert clusters == {1: 1, 2: None, 3: 1, 4: None}
+        reps = [r[0] for r in conn.execute(f'SELECT id FROM recipes {indexable_where(conn)} ORDER BY id')]
+        assert reps == [1, 2, 4]
+
+        # A recompute writes only rows whose cluster changed
+        conn.execute('UPDATE recipes SET cluster_id = 1 WHERE id = 4')
+        conn.commit()
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert create_db.assign_clusters(db)['updated'] == 1
+            assert create_db.assign_clusters(db)['updated'] == 0
+        assert conn.execute('SELECT cluster_id FROM recipes WHERE id = 4').fetchone() == (None,)
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_minhash_estimates_jaccard()
+    test_cluster_signatures_links_near_duplicates()
+    test_invalid_rows_stay_singletons()
+    test_assign_clusters()
+    print("✅ All tests passed!")
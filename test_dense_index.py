@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+import numpy as np
+
+from dense_index import DenseIndex, Projection, normalize_rows
+
+
+def _write_shards(tmp, emb, projection, sizes):
+    chunk_files, chunk_offsets, start = [], [], 0
+    for i, size in enumerate(sizes):
+        part = emb[start:start + size]
+        files = {'emb': f'emb_chunk_{i}.npy', 'proj': f'proj_chunk_{i}.npy'}
+        np.save(os.path.join(tmp, files['emb']), part)
+        np.save(os.path.join(tmp, files['proj']), projection.project(part))
+        chunk_files.append(files)
+        chunk_offsets.append(start)
+        start += size
+    return chunk_files, chunk_offsets
+
+
+def test_projected_search_reranks_exactly():
+    rng = np.random.default_rng(0)
+    emb = (rng.standard_normal((500, 6)) @ rng.standard_normal((6, 32))).astype(np.float32)
+    emb += 0.01 * rng.standard_normal(emb.shape).astype(np.float32)
+    projection = Projection.fit(emb, 8)
+    assert projection.dims == 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_files, chunk_offsets = _write_shards(tmp, emb, projection, [200, 150, 150])
+        index = DenseIndex(tmp, chunk_files, chunk_offsets, projection, rerank_candidates=50)
+        exact_index = DenseIndex(tmp, chunk_files, chunk_offsets)
+        assert index.projected.shape == (500, 8) and exact_index.projected is None
+
+        for q in emb[[3, 250, 499]] + 0.1:
+            rows, scores = index.search(q, top_k=5)
+            exact_rows, exact_scores = exact_index.search(q, top_k=5)
+            truth = normalize_rows(emb) @ normalize_rows(q[None, :])[0]
+            assert rows.tolist() == exact_rows.tolist() == np.argsort(-truth)[:5].tolist()
+            assert np.allclose(scores, truth[rows], atol=1e-5)
+
+
+def test_missing_projection_files_fall_back_to_exact():
+    rng = np.random.default_rng(1)
+    emb = rng.standard_normal((40, 16)).astype(np.float32)
+    projection = Projection.fit(emb, 4)
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_files, chunk_offsets = _write_shards(tmp, emb, projection, [20, 20])
+        chunk_files[1]['proj'] = None
+        index = DenseIndex(tmp, chunk_files, chunk_offsets, projection)
+        assert index.projected is None
+        rows, _ = index.search(emb[25], top_k=1)
+        assert rows.tolist() == [25]
+
+
+
+def test_anytime_search_scans_closest_shard_first():
+    rng = np.random.default_rng(2)
+    centers = 5 * rng.standard_normal((3, 16)).astype(np.float32)
+    emb = np.concatenate([c + rng.standard_normal((100, 16)).astype(np.float32) for c in centers])
+    projection = Projection.fit(emb, 6)
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_files, chunk_offsets = _write_shards(tmp, emb, projection, [100, 100, 100])
+        index = DenseIndex(tmp, chunk_files, chunk_offsets, projection, rerank_candidates=60)
+        query = centers[2] + 0.1
+
+        assert index.shard_order(query)[0] == 2
+        rows, scores, searched = index.anytime_search(query, top_k=5)
+        exact_rows, exact_scores = index.exact_search(query, top_k=5)
+        assert searched == 300 and rows.tolist() == exact_rows.tolist()
+        assert np.allclose(scores, exact_scores)
+
+        # Deadline already passed: only the most promising shard is searched
+        rows, _, searched = index.anytime_search(query, top_k=5, deadline=0)
+        assert searched == 100 and rows.tolist() == exact_rows.tolist()
+
+        chunk_files[0]['proj'] = None
+        exact_index = DenseIndex(tmp, chunk_files, chunk_offsets)
+        assert exact_index.shard_order(query) == [0, 1, 2]
+        rows, _, searched = exact_index.anytime_search(query, top_k=5, deadline=0)
+        assert searched == 100 and all(r < 100 for r in rows)
+
+
+if __name__ == "__main__":
+    test_projected_search_reranks_exactly()
+    test_missing_projection_files_fall_back_to_exact()
+    test_anytime_search_scans_closest_shard_first()
+    print("✅ All tests passed!")
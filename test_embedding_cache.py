@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, VECTORS_FILE
+
+
+def test_lookup_and_persist():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(tmp, 'enc-a')
+        keys = cache.keys_for(['chicken rice', 'tomato  soup'])
+        vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+        cache.add(keys, vectors)
+
+        # Pending rows are visible before the flush
+        hit, found = cache.lookup(keys[::-1])
+        assert hit.all() and np.array_equal(found, vectors[::-1])
+        cache.flush()
+
+        reopened = EmbeddingCache(tmp, 'enc-a')
+        assert len(reopened) == 2
+        hit, found = reopened.lookup(reopened.keys_for(['tomato soup', 'pasta', 'chicken rice']))
+        assert hit.tolist() == [True, False, True]
+        assert np.array_equal(found, vectors[[1, 0]])
+
+        # Same text under another encoder is a different key
+        other = EmbeddingCache(tmp, 'enc-b')
+        assert not other.lookup(other.keys_for(['chicken rice']))[0].any()
+
+
+def test_unflushed_rows_are_discarded():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(tmp, 'enc')
+        cache.add(cache.keys_for(['a']), np.ones((1, 4), dtype=np.float32))
+        cache.flush()
+
+        # Simulate a crash after vectors were appended but before the index was published
+        with open(os.path.join(tmp, VECTORS_FILE), 'ab') as f:
+            f.write(np.full(4, 9, dtype=np.float32).tobytes())
+
+        cache = EmbeddingCache(tmp, 'enc')
+        cache.add(cache.keys_for(['b', 'a']), np.array([[2] * 4, [7] * 4], dtype=np.float32))
+        cache.flush()
+
+        cache = EmbeddingCache(tmp, 'enc')
+        assert len(cache) == 2
+        hit, found = cache.lookup(cache.keys_for(['a', 'b']))
+        assert hit.all()
+        assert np.array_equal(found, np.array([[1] * 4, [2] * 4], dtype=np.float32))
+
+
+if __name__ == "__main__":
+    test_lookup_and_persist()
+    test_unflushed_rows_are_discarded()
+    print("✅ All tests passed!")
@@ -0,0 +1,66 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+from fake_ollama import FakeOllamaConfig, start_in_thread
+
+PROMPT = 'A user wants recipes using ONLY these ingredients: "paneer spinach" (plus basic pantry staples)'
+
+
+def _post(url, body):
+    req = urllib.request.Request(url + '/api/generate', data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return resp.read().decode('utf-8')
+
+
+def test_generate_streaming_and_non_streaming():
+    server, url = start_in_thread(FakeOllamaConfig(latency=0.05, tokens_per_sec=2000, recipes=3, seed=0))
+    try:
+        with urllib.request.urlopen(url + '/api/tags', timeout=10) as resp:
+            assert json.loads(resp.read())['models'][0]['name'].startswith('mistral')
+
+        start = time.perf_counter()
+        result = json.loads(_post(url, {'model': 'mistral', 'prompt': PROMPT, 'stream': False}))
+        assert time.perf_counter() - start >= 0.05
+        recipes = json.loads(result['response'])
+        assert len(recipes) == 3 and 'paneer' in recipes[0]['ingredients']
+        assert result['done'] and result['eval_count'] > 0 and result['eval_duration'] > 0
+        assert result['prompt_eval_duration'] == 50_000_000
+
+        lines = [json.loads(line) for line in _post(url, {'prompt': PROMPT}).splitlines()]
+        assert all(not line['done'] for line in lines[:-1]) and lines[-1]['done']
+        assert ''.join(line['response'] for line in lines) == result['response']
+        assert lines[-1]['eval_count'] == len(lines) - 1
+    finally:
+        server.shutdown()
+
+
+def test_injected_failures_and_malformed_answers():
+    server, url = start_in_thread(FakeOllamaConfig(failure_rate=1.0))
+    try:
+        try:
+            _post(url, {'prompt': PROMPT, 'stream': False})
+            assert False, 'expected HTTP 500'
+        except urllib.error.HTTPError as e:
+            assert e.code == 500
+    finally:
+        server.shutdown()
+
+    server, url = start_in_thread(FakeOllamaConfig(malformed_rate=1.0))
+    try:
+        response = json.loads(_post(url, {'prompt': PROMPT, 'stream': False}))['response']
+        try:
+            json.loads(response)
+            assert False, 'expected a malformed answer'
+        except ValueError:
+            pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_generate_streaming_and_non_streaming()
+    test_injected_failures_and_malformed_answers()
+    print("✅ All tests passed!")
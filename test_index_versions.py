@@ -0,0 +1,185 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from index_versions import (IndexManager, IndexVersion, list_versions, publish, read_manifest, resolve_paths,
+                            MODELS_FILE, VERSION_MANIFEST)
+
+
+def _write_build(tmp, recipes):
+    chunks_dir = os.path.join(tmp, 'model_chunks')
+    os.makedirs(chunks_dir, exist_ok=True)
+    np.save(os.path.join(chunks_dir, 'emb_chunk_0.npy'), np.ones((len(recipes), 4), dtype=np.float32))
+    models_file = os.path.join(tmp, MODELS_FILE)
+    with open(models_file, 'wb') as f:
+        pickle.dump({'recipe_ids': recipes, 'chunks_dir': chunks_dir, 'chunk_offsets': [0],
+                     'chunk_files': [{'emb': 'emb_chunk_0.npy', 'tfidf': 'tfidf_chunk_0.npz', 'proj': None}]}, f)
+    return models_file
+
+
+def _load(name, path):
+    with open(os.path.join(path, MODELS_FILE), 'rb') as f:
+        models_data = resolve_paths(pickle.load(f), path)
+    emb = np.load(os.path.join(models_data['chunks_dir'], 'emb_chunk_0.npy'))
+    released = []
+    return IndexVersion(name, path, recipes=len(models_data['recipe_ids']), on_close=lambda v: released.append(v.name),
+                        emb=emb, released=released)
+
+
+def test_publish_is_complete_and_relocatable():
+    with tempfile.TemporaryDirectory() as tmp:
+        versions_dir = os.path.join(tmp, 'versions')
+        models_file = _write_build(tmp, [1, 2, 3])
+        path = publish(models_file, versions_dir, version='v1')
+        manifest = read_manifest(path)
+        assert manifest['version'] == 'v1' and manifest['recipes'] == 3
+        # The missing tfidf file is skipped, not listed
+        assert set(manifest['files']) == {'emb_chunk_0.npy', MODELS_FILE}
+        assert _load('v1', path).emb.shape == (3, 4)
+
+        # Half-written and corrupted versions are not listed
+        os.makedirs(os.path.join(versions_dir, 'v2'))
+        os.makedirs(os.path.join(versions_dir, '.v3.tmp'))
+        publish(models_file, versions_dir, version='v4')
+        os.remove(os.path.join(versions_dir, 'v4', 'emb_chunk_0.npy'))
+        assert [name for name, _ in list_versions(versions_dir)] == ['v1']
+
+        for version in ('v5', 'v6', 'v7'):
+            publish(models_file, versions_dir, version=version, keep=2)
+        assert [name for name, _ in list_versions(versions_dir)] == ['v6', 'v7']
+
+
+def test_swap_waits_for_inflight_requests_and_rolls_back():
+    with tempfile.TemporaryDirectory() as tmp:
+        versions_dir = os.path.join(tmp, 'versions')
+        models_file = _write_build(tmp, [1, 2])
+        publish(models_file, versions_dir, version='v1', keep=0)
+        manager = IndexManager(_load, versions_dir)
+        assert manager.reload(background=False) == 'v1'
+
+        with manager.acquire() as old:
+            _write_build(tmp, [1, 2, 3, 4])
+            publish(models_file, versions_dir, version='v2', keep=0)
+            assert manager.check_for_new_version()
+            for thread in threading.enumerate():
+                if thread.name.startswith('index-load'):
+                    thread.join(5)
+            with manager.acquire() as new:
+                assert new.name == 'v2' and new.emb.shape == (4, 4)
+            # The request that started on v1 still has it, unclosed
+            assert old.name == 'v1' and old.emb.shape == (2, 4)
+            assert old.released == [] and manager.status()['retiring'][0]['version'] == 'v1'
+        assert old.released == ['v1'] and manager.status()['retiring'] == []
+
+        status = manager.status()
+        assert status['active']['version'] == 'v2' and status['history'] == ['v1']
+        assert manager.check_for_new_version() is False
+        assert manager.previous() == 'v1' and manager.resolve() == ('v2', os.path.join(versions_dir, 'v2'))
+        assert manager.rollback(background=False) == 'v1'
+        assert manager.active.name == 'v1' and manager.status()['history'] == [] and manager.previous() is None
+        # The watcher does not re-apply the version that was rolled back
+        assert manager.check_for_new_version() is False
+        try:
+            manager.rollback()
+            assert False, 'nothing left to roll back to'
+        except LookupError:
+            pass
+
+        # serve.py's parent checks in the foreground: the new version is active on return
+        publish(models_file, versions_dir, version='v3', keep=0)
+        assert manager.check_for_new_version(background=False) and manager.active.name == 'v3'
+        try:
+            manager.resolve('v9')
+            assert False, 'v9 was never published'
+        except LookupError:
+            pass
+
+
+def test_failed_load_keeps_active_version():
+    with tempfile.TemporaryDirectory() as tmp:
+        versions_dir = os.path.join(tmp, 'versions')
+        models_file = _write_build(tmp, [1])
+        publish(models_file, versions_dir, version='v1', keep=0)
+        manager = IndexManager(_load, versions_dir)
+        manager.reload(background=False)
+        path = publish(models_file, versions_dir, version='v2', keep=0)
+        # Complete manifest, but a pickle the loader cannot read
+        with open(os.path.join(path, MODELS_FILE), 'wb') as f:
+            f.write(b'not a pickle')
+        with open(os.path.join(path, VERSION_MANIFEST)) as f:
+            manifest = json.load(f)
+        manifest['files'][MODELS_FILE] = len(b'not a pickle')
+        with open(os.path.join(path, VERSION_MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        manager.reload('v2', background=False)
+        assert manager.active.name == 'v1'
+        assert manager.status()['last_error'].startswith('v2:')
+
+
+def test_watcher_retries_version_published_during_a_load():
+    with tempfile.TemporaryDirectory() as tmp:
+        versions_dir = os.path.join(tmp, 'versions')
+        models_file = _write_build(tmp, [1])
+        publish(models_file, versions_dir, version='v1', keep=0)
+        manager = IndexManager(_load, versions_dir)
+        manager.reload(background=False)
+        publish(models_file, versions_dir, version='v2', keep=0)
+        # An admin reload or rollback is still loading: v2 is not marked seen...
+        manager.loading = 'v1'
+        assert manager.check_for_new_version(background=False) is False
+        assert manager.reload('v2', background=False) is None and manager.latest_seen == 'v1'
+        # ...so the next check loads it
+        manager.loading = None
+        assert manager.check_for_new_version(background=False) and manager.active.name == 'v2'
+
+
+def test_rollback_keeps_history_on_failure_and_skips_deleted_versions():
+    with tempfile.TemporaryDirectory() as tmp:
+        versions_dir = os.path.join(tmp, 'versions')
+        models_file = _write_build(tmp, [1])
+        manager = IndexManager(_load, versions_dir)
+        for version in ('v1', 'v2', 'v3'):
+            publish(models_file, versions_dir, version=version, keep=0)
+            manager.reload(version, background=False)
+        assert manager.status()['history'] == ['v1', 'v2']
+
+        # A rollback whose load fails leaves v2 to roll back to
+        failures = []
+
+        def failing_load(name, path):
+            failures.append(name)
+            raise OSError('disk error')
+        manager.load = failing_load
+        assert manager.rollback(background=False) == 'v2'
+        assert failures == ['v2'] and manager.active.name == 'v3' and manager.previous() == 'v2'
+        manager.load = _load
+
+        # v2 was deleted since: rollback goes to the newest previous version that still exists
+        shutil.rmtree(os.path.join(versions_dir, 'v2'))
+        assert manager.previous() == 'v1' and manager.status()['history'] == ['v1']
+        assert manager.rollback(background=False) == 'v1' and manager.active.name == 'v1'
+
+        # publish(keep=2) deletes v1 while it is the only version to roll back to
+        manager.reload('v3', background=False)
+        publish(models_file, versions_dir, version='v4', keep=2)
+        assert [name for name, _ in list_versions(versions_dir)] == ['v3', 'v4']
+        assert manager.previous() is None
+        try:
+            manager.rollback()
+            assert False, 'rolled back to a deleted version'
+        except LookupError:
+            pass
+
+
+if __name__ == "__main__":
+    test_publish_is_complete_and_relocatable()
+    test_swap_waits_for_inflight_requests_and_rolls_back()
+    test_failed_load_keeps_active_version()
+    test_watcher_retries_version_published_during_a_load()
+    test_rollback_keeps_history_on_failure_and_skips_deleted_versions()
+    print("✅ All tests passed!")
@@ -0,0 +1,85 @@
+import os
+import io
+import sqlite3
+import tempfile
+import contextlib
+
+import numpy as np
+
+import create_db
+from ingredients import canonicalize_ingredient, build_ingredient_index, IngredientIndex
+
+
+def test_canonicalize_ingredient():
+    cases = {
+        '2 c. chopped onions (about 2 large)': 'onion',
+        '1 (8 oz.) pkg. cream cheese, softened': 'cream cheese',
+        '1/2 tsp. salt': 'salt',
+        '3 cloves garlic, minced': 'garlic',
+        '1 tsp cloves': 'clove',
+        '1 1/2 cups basmati rice': 'basmati rice',
+        '½ cup fresh tomatoes': 'tomato',
+        'Salt and pepper to taste': 'salt pepper',
+        '2 large potatoes': 'potato',
+        '1 lb. boneless chicken breasts': 'boneless chicken breast',
+        'molasses': 'molasses',
+        '4 curry leaves': 'curry leaf',
+        '1 c. blueberries': 'blueberry',
+        '2 tbsp.': 'tbsp',
+        '': None,
+        '1/2': None,
+    }
+    for raw, expected in cases.items():
+        assert canonicalize_ingredient(raw) == expected, raw
+
+
+def _make_db(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(path)
+    conn = sqlite3.connect(path)
+    rows = [
+        ('Tomato Rice', '1 c. rice|2 tomatoes|1 onion, chopped'),
+        ('Onion Soup', '3 onions|4 c. water|salt'),
+        ('Rice Pudding', '1 c. rice|2 c. milk|sugar'),
+    ]
+    for name, ingredients in rows:
+        conn.execute('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)',
+                     (name, ingredients, 'Cook.'))
+    conn.commit()
+    conn.close()
+
+
+def test_tables_and_postings():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'r.db')
+        out = os.path.join(tmp, 'postings.npz')
+        _make_db(db)
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.populate_ingredient_tables(db)
+
+        conn = sqlite3.connect(db)
+        names = {r[0] for r in conn.execute('SELECT name FROM ingredients')}
+        assert names == {'rice', 'tomato', 'onion', 'water', 'salt', 'milk', 'sugar'}
+
+        # Incremental: a new recipe only adds its own links
+        conn.execute("INSERT INTO recipes (name, ingredients, instructions) VALUES ('Fried Rice', 'rice|2 eggs|onions', 'Fry.')")
+        conn.commit()
+        conn.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.populate_ingredient_tables(db)
+
+        build_ingredient_index(db, out)
+        index = IngredientIndex.load(out)
+        assert index.num_recipes == 4
+        assert index.recipes_with('rice').tolist() == [1, 3, 4]
+        assert index.recipes_with('Onions').tolist() == [1, 2, 4]
+        assert index.recipes_with_all(['rice', 'onion']).tolist() == [1, 4]
+        assert index.recipes_with_any(['milk', 'egg']).tolist() == [3, 4]
+        assert index.recipes_with('saffron').tolist() == []
+        assert index.indices.dtype == np.int32
+
+
+if __name__ == "__main__":
+    test_canonicalize_ingredient()
+    test_tables_and_postings()
+    print("✅ All tests passed!")
@@ -0,0 +1,138 @@
+import os
+import re
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+import create_db
+from instructions import (clean_step, decode_step_timers, encode_step_timers, extract_durations, ingest_steps,
+                          normalize_instructions, parsed_steps, recipe_steps)
+
+
+# --- Previous implementation (app.py /search), reference for equivalence ---
+
+def legacy_normalize_instructions(instructions):
+    if isinstance(instructions, str):
+        instructions = [instructions]
+
+    normalized = []
+    for item in instructions:
+        if not item or not isinstance(item, str):
+            continue
+        for line in item.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            parts = re.split(r'(?<!\d)(?=\d+[\.\)]\s+)', line)
+            for part in parts:
+                part = part.strip()
+                if not part:
+                    continue
+                sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', part)
+                for sentence in sentences:
+                    sentence = sentence.strip()
+                    sentence = re.sub(r'^[\d\-\*\•]+[\.\)\:]?\s*', '', sentence)
+                    if len(sentence) > 3:
+                        if not sentence[-1] in '.!?':
+                            sentence += '.'
+                        normalized.append(sentence)
+
+    return normalized if normalized else ["Follow the recipe instructions."]
+
+
+def legacy_parsed_steps(steps):
+    parsed = []
+    for j, instruction in enumerate(steps):
+        timers = re.findall(r'(\d+)\s*min', instruction)
+        parsed.append({'step_number': j + 1, 'text': instruction, 'timers': [int(t) for t in timers],
+                       'has_timer': bool(timers)})
+    return parsed
+
+
+SAMPLES = [
+    ["Preheat oven to 350. Grease a pan.", "Bake 25 minutes."],
+    "1. Chop onions. 2. Fry onions for 5 min.\n3) Serve hot",
+    ["- Boil water", "* Add pasta and cook 10 mins", "", None, "ok"],
+    "Mix 1.5 cups flour with sugar. Knead well! Rest it? Yes",
+    ["Step one\nStep two\n\n3. Step three for 12 minutes."],
+    "",
+]
+
+
+def test_normalize_matches_legacy():
+    for sample in SAMPLES:
+        steps = normalize_instructions(sample)
+        assert steps == legacy_normalize_instructions(sample), repr(sample)
+        # Minute timers come out as before; durations are the same in seconds
+        for new, old in zip(parsed_steps(steps), legacy_parsed_steps(steps)):
+            assert new['timers'] == old['timers'] and new['has_timer'] == old['has_timer']
+            assert new['durations'] == [60 * t for t in old['timers']]
+
+
+def test_extract_durations():
+    assert extract_durations("Bake 10-15 minutes, then rest 30 seconds.") == [900, 30]
+    assert extract_durations("Simmer 1 hour 30 minutes") == [5400]
+    assert extract_durations("Roast 1 1/2 hrs and baste every 20 min") == [5400, 1200]
+    assert extract_durations("Let the dough rise 2 hours; a 5-minute rest after") == [7200, 300]
+    assert extract_durations("Add minced garlic and 2 cups stock") == []
+    assert extract_durations("1 hr, 15 mins") == [4500]
+    steps = parsed_steps(["Steam 45 seconds.", "Braise 2 hours."])
+    assert steps[0]['timers'] == [0.75] and steps[1]['timers'] == [120]
+
+
+def test_step_timers_column_round_trip():
+    durations = [[], [600], [], [3600, 45]]
+    value = encode_step_timers(durations)
+    assert value == '|600||3600,45'
+    assert decode_step_timers(value, 4) == durations
+    assert decode_step_timers(value, 3) is None and decode_step_timers(None, 4) is None
+    assert clean_step('["Mix well" , "then bake ."]') == 'Mix well then bake.'
+    assert clean_step('Heat to 180°C|Serve') == 'Heat to 180C\nServe'
+
+
+def test_ingest_stores_steps_and_timers():
+    row = pd.Series({'name': 'Dal Tadka', 'ingredients': '["1 cup toor dal", "2 tomatoes"]',
+                     'instructions': '["1. Rinse the dal well. Pressure cook for 15 minutes.", '
+                                     '"Temper the spices for 30 seconds and pour over."]'})
+    record = create_db.process_row(row, 'test')
+    assert record['instructions'] == ('Rinse the dal well.|Pressure cook for 15 minutes.|'
+                                      'Temper the spices for 30 seconds and pour over.')
+    assert record['step_timers'] == '|900|30'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'recipes.db')
+        create_db.create_database(db)
+        conn = sqlite3.connect(db)
+        conn.execute(create_db.INSERT_SQL, tuple(record.values()))
+        # A row from before step_timers existed
+        conn.execute("INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)",
+                     ('Old', 'rice', '1. Boil rice 20 min. 2. Drain.|Serve'))
+        conn.execute("INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)",
+                     ('Tidy', 'water', 'Boil water for 5 minutes.|Serve.'))
+        conn.commit()
+        rows = conn.execute('SELECT instructions, step_timers FROM recipes ORDER BY id').fetchall()
+        conn.close()
+
+        steps, parsed = recipe_steps(*rows[0])
+        assert [p['durations'] for p in parsed] == [[], [900], [30]]
+        old_steps, old_parsed = recipe_steps(*rows[1])
+        assert rows[1][1] is None and old_steps == ['Boil rice 20 min.', 'Drain.', 'Serve.']
+
+        # Only 'Old' needs its steps rewritten; 'Tidy' just gets step_timers
+        assert create_db.populate_step_timers(db) == {'recipes': 2, 'rewritten': 1}
+        conn = sqlite3.connect(db)
+        assert conn.execute("SELECT step_timers FROM recipes WHERE name = 'Tidy'").fetchone() == ('300|',)
+        backfilled = conn.execute('SELECT instructions, step_timers FROM recipes WHERE name = ?', ('Old',)).fetchone()
+        conn.close()
+        assert backfilled == ('Boil rice 20 min.|Drain.|Serve.', '1200||')
+        assert recipe_steps(*backfilled) == (old_steps, old_parsed)
+        assert ingest_steps(['Serve.']) == (['Serve.'], '')
+
+
+if __name__ == "__main__":
+    test_normalize_matches_legacy()
+    test_extract_durations()
+    test_step_timers_column_round_trip()
+    test_ingest_stores_steps_and_timers()
+    print("✅ All tests passed!")
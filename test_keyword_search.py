@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import tempfile
+import contextlib
+import io
+import time
+
+import create_db
+import keyword_search as keyword_search_module
+from keyword_search import build_match_query, has_fts_index, keyword_search
+
+RECIPES = [
+    ('Chicken Biryani', 'chicken|basmati rice|onion|yogurt', 'Marinate chicken.|Layer with rice.', 'non_vegetarian'),
+    ('Paneer Butter Masala', 'paneer|butter|tomato|cream', 'Cook tomato gravy.|Add paneer.', 'vegetarian'),
+    ('Tomato Rice', 'rice|tomato|onion', 'Cook rice.|Add tomatoes.', 'vegetarian'),
+    ('Fried Chicken', 'chicken|flour|oil', 'Coat chicken.|Fry until golden.', 'non_vegetarian'),
+]
+
+
+def _make_db(path, rows=RECIPES):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(path)
+    conn = sqlite3.connect(path)
+    for name, ingredients, instructions, category in rows:
+        search_text = f"{name} {ingredients.replace('|', ' ')} {instructions.replace('|', ' ')}".lower()
+        conn.execute(
+            'INSERT INTO recipes (name, ingredients, instructions, search_text, category) VALUES (?, ?, ?, ?, ?)',
+            (name, ingredients, instructions, search_text, category))
+    conn.commit()
+    return conn
+
+
+def test_match_query_is_quoted():
+    assert build_match_query('chicken, rice') == '"chicken" OR "rice"'
+    assert build_match_query('NOT "x" AND name:y*') == '"not" OR "x" OR "and" OR "name" OR "y"'
+    assert build_match_query('  ,, ') == ''
+
+
+def test_keyword_search_ranks_by_bm25():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _make_db(os.path.join(tmp, 'r.db'))
+        assert has_fts_index(conn)
+
+        ids = [r_id for r_id, _ in keyword_search(conn, 'chicken rice')]
+        assert ids[0] == 1  # matches both terms, chicken in the name
+        assert set(ids) == {1, 3, 4}
+
+        veg = [r_id for r_id, _ in keyword_search(conn, 'rice', category='vegetarian')]
+        assert veg == [3]
+        conn.close()
+
+
+def test_deadline_returns_best_of_scanned_matches():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Recipe 5 (chicken rice, both in the name) ranks first but is scanned last
+        rows = RECIPES + [('Chicken Rice', 'chicken|rice', 'Cook.', 'non_vegetarian')]
+        conn = _make_db(os.path.join(tmp, 'r.db'), rows)
+        exact = keyword_search(conn, 'chicken rice')
+        assert exact[0][0] == 5
+
+        report = {}
+        assert keyword_search(conn, 'chicken rice', deadline=time.monotonic() + 60, report=report) == exact
+        assert report == {'coverage': 1.0}
+        veg = keyword_search(conn, 'rice', category='vegetarian', deadline=time.monotonic() + 60)
+        assert veg == keyword_search(conn, 'rice', category='vegetarian') and [r for r, _ in veg] == [3]
+
+        batch = keyword_search_module.STREAM_BATCH
+        keyword_search_module.STREAM_BATCH = 2
+        try:
+            # Out of time after the first batch (recipes 1 and 3): their best, and the fraction scanned
+            partial = keyword_search(conn, 'chicken rice', deadline=time.monotonic() - 1, report=report)
+            assert [r for r, _ in partial] == [1, 3] and report['coverage'] == 3 / 5
+            # A deadline that never passes gives the full result, in the same order as without one
+            assert keyword_search(conn, 'chicken rice', deadline=time.monotonic() + 60, report=report) == exact
+            assert report['coverage'] == 1.0
+        finally:
+            keyword_search_module.STREAM_BATCH = batch
+        conn.close()
+
+
+def test_triggers_keep_index_in_sync():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _make_db(os.path.join(tmp, 'r.db'))
+        conn.execute("UPDATE recipes SET name = 'Mushroom Curry', ingredients = 'mushroom|onion', search_text = 'mushroom curry' WHERE id = 2")
+        conn.execute("DELETE FROM recipes WHERE id = 4")
+        conn.commit()
+
+        assert [r for r, _ in keyword_search(conn, 'mushroom')] == [2]
+        assert keyword_search(conn, 'paneer') == []
+        assert [r for r, _ in keyword_search(conn, 'flour')] == []
+        conn.close()
+
+
+def test_non_text_update_leaves_index_alone():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _make_db(os.path.join(tmp, 'r.db'))
+        # A database from before the update trigger was scoped to the indexed columns
+        conn.execute('DROP TRIGGER recipes_fts_au')
+        conn.execute(create_db.FTS_TRIGGERS_SQL[2].replace(
+            'AFTER UPDATE OF name, ingredients, search_text ON', 'AFTER UPDATE ON'))
+        create_db.create_fts_triggers(conn)
+
+        before = conn.total_changes
+        conn.execute("UPDATE recipes SET category = 'vegan', instructions = 'Stir.' WHERE id = 2")
+        assert conn.total_changes - before == 1
+        conn.execute("UPDATE recipes SET search_text = 'palak paneer' WHERE id = 2")
+        assert conn.total_changes - before > 2
+        conn.commit()
+
+        assert [r for r, _ in keyword_search(conn, 'palak')] == [2]
+        assert [r for r, _ in keyword_search(conn, 'paneer', category='vegan')] == [2]
+        conn.close()
+
+
+def test_rebuild_after_bulk_load():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'r.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_db.create_database(path, with_indexes=False)
+        conn = sqlite3.connect(path)
+        for name, ingredients, instructions, category in RECIPES:
+            conn.execute(
+                'INSERT INTO recipes (name, ingredients, instructions, search_text, category) VALUES (?, ?, ?, ?, ?)',
+                (name, ingredients, instructions, name.lower(), category))
+        assert keyword_search(conn, 'paneer') == []
+
+        create_db.rebuild_fts_index(conn)
+        create_db.create_fts_triggers(conn)
+        conn.commit()
+        assert [r for r, _ in keyword_search(conn, 'paneer')] == [2]
+        conn.close()
+
+
+if __name__ == "__main__":
+    test_match_query_is_quoted()
+    test_keyword_search_ranks_by_bm25()
+    test_deadline_returns_best_of_scanned_matches()
+    test_triggers_keep_index_in_sync()
+    test_non_text_update_leaves_index_alone()
+    test_rebuild_after_bulk_load()
+    print("✅ All tests passed!")
@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import numpy as np
+
+import knn
+from knn import NeighborGraph, build_knn
+
+
+def _brute_force(emb, k):
+    unit = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+    sims = unit @ unit.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1, kind='stable')[:, :k]
+
+
+def _shards(tmp, emb, sizes):
+    chunk_files, chunk_offsets, start = [], [], 0
+    for i, size in enumerate(sizes):
+        np.save(os.path.join(tmp, f'emb_chunk_{i}.npy'), emb[start:start + size])
+        chunk_files.append({'emb': f'emb_chunk_{i}.npy'})
+        chunk_offsets.append(start)
+        start += size
+    return chunk_files, chunk_offsets
+
+
+def test_blocked_knn_matches_brute_force():
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((230, 16)).astype(np.float32)
+    recipe_ids = np.arange(100, 330, dtype=np.int64)
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_files, chunk_offsets = _shards(tmp, emb, [100, 3, 127])
+        path = os.path.join(tmp, knn.KNN_FILE)
+        neighbors = build_knn(tmp, chunk_files, chunk_offsets, recipe_ids, k=5, workers=1, block=64,
+                              output_file=path)
+        assert neighbors.dtype == np.int32
+        assert np.array_equal(neighbors, _brute_force(emb, 5))
+
+        graph = NeighborGraph.load(path)
+        similar = graph.similar(100 + 7, k=3)
+        assert [r_id for r_id, _ in similar] == (recipe_ids[neighbors[7, :3]]).tolist()
+        assert similar[0][1] >= similar[1][1] >= similar[2][1]
+        assert graph.similar(5) == []
+
+
+def test_tiny_corpus_has_no_self_or_padding():
+    emb = np.eye(3, dtype=np.float32) + 0.1
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_files, chunk_offsets = _shards(tmp, emb, [2, 1])
+        path = os.path.join(tmp, knn.KNN_FILE)
+        neighbors = build_knn(tmp, chunk_files, chunk_offsets, [1, 2, 3], k=10, workers=1, output_file=path)
+        assert neighbors.shape == (3, 2)
+        for row in range(3):
+            assert sorted(neighbors[row].tolist()) == [r for r in range(3) if r != row]
+
+
+if __name__ == "__main__":
+    test_blocked_knn_matches_brute_force()
+    test_tiny_corpus_has_no_self_or_padding()
+    print("✅ All tests passed!")
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import ast
+import random
+
+import pandas as pd
+
+from create_db import parse_json_list, parse_instructions
+from list_parser import parse_quoted_list
+
+CORPUS_FILE = 'data/RecipeNLG_dataset.csv'
+CORPUS_SAMPLE_ROWS = 20000
+
+
+# --- Previous implementations (reference for equivalence) ---
+
+def legacy_parse_json_list(text):
+    if pd.isna(text) or not text:
+        return []
+
+    text = str(text).strip()
+
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, list):
+            return [str(item).strip().strip('"\'') for item in parsed if item]
+    except:
+        pass
+
+    try:
+        parsed = ast.literal_eval(text)
+        if isinstance(parsed, list):
+            return [str(item).strip().strip('"\'') for item in parsed if item]
+    except:
+        pass
+
+    for sep in ['|', '\n', ',']:
+        if sep in text:
+            items = [item.strip().strip('"\'') for item in text.split(sep) if item.strip()]
+            if items:
+                return items
+
+    return [text.strip()] if text.strip() else []
+
+
+def legacy_parse_instructions(text):
+    if pd.isna(text) or not text:
+        return []
+
+    text = str(text).strip()
+
+    parsed = legacy_parse_json_list(text)
+    if parsed and len(parsed[0]) > 10:
+        cleaned = []
+        for step in parsed:
+            step = step.strip()
+            if len(step) > 5:
+                step = re.sub(r'^\d+[\.\):\-\s]+', '', step)
+                if not step.endswith('.'):
+                    step += '.'
+                cleaned.append(step)
+        return cleaned
+
+    steps = re.split(r'\.\s+(?=[A-Z0-9])', text)
+    cleaned = []
+    for step in steps:
+        step = step.strip()
+        if len(step) > 5:
+            step = re.sub(r'^\d+[\.\):\-\s]+', '', step)
+            if not step.endswith('.'):
+                step += '.'
+            cleaned.append(step)
+
+    return cleaned
+
+
+# --- Samples ---
+
+FIXED_SAMPLES = [
+    '["1 c. firmly packed brown sugar", "1/2 c. evaporated milk", "2 Tbsp. margarine"]',
+    "['1 (8 oz.) pkg. cream cheese', \"Mom's secret sauce\", '2 eggs']",
+    '["In a heavy 2-quart saucepan, mix brown sugar, nuts, evaporated milk and butter.", "Stir over medium heat until mixture bubbles all over top."]',
+    '["1. Preheat oven to 350 degrees.", "2) Grease a pan well.", "3 - Bake for 30 minutes."]',
+    '[]',
+    '[ ]',
+    '["", "salt", "  pepper  "]',
+    "['a', 'b',]",
+    '["tab\tinside", "ok"]',
+    '["quote \\" inside", "back\\\\slash"]',
+    "['escaped \\' quote']",
+    '["unicode \\u00b0F oven"]',
+    '["slash \\/ json only"]',
+    "[u'prefixed']",
+    "['implicit' 'concat']",
+    '["nested", ["list"]]',
+    '[1, 2, "three"]',
+    '["newline\ninside"]',
+    '"not a list"',
+    'salt|pepper|oil',
+    'salt, pepper, oil',
+    'Boil water. Add pasta. Cook 10 minutes.',
+    '1. Heat oil in a pan. 2. Add onions and fry until golden brown.',
+    '["mixed" , \'quotes\' ]',
+    "['\"wrapped in double\"']",
+    '["trailing"] junk',
+    '',
+    None,
+]
+
+
+def _random_item(rng):
+    alphabet = 'abcdefghij ,.()/-\'"\\|°éñ12\t\n'
+    length = rng.randint(0, 30)
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def generated_samples(n=3000, seed=7):
+    """Random lists serialized as JSON and as Python literals"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        items = [_random_item(rng) for _ in range(rng.randint(0, 6))]
+        samples.append(json.dumps(items))
+        samples.append(json.dumps(items, ensure_ascii=False))
+        samples.append(repr(items))
+    return samples
+
+
+def corpus_samples():
+    """Sample raw ingredient/direction cells from the RecipeNLG corpus if present"""
+    if not os.path.exists(CORPUS_FILE):
+        return []
+    df = pd.read_csv(CORPUS_FILE, nrows=CORPUS_SAMPLE_ROWS)
+    samples = []
+    for column in ['ingredients', 'directions', 'NER']:
+        if column in df.columns:
+            samples.extend(df[column].tolist())
+    return samples
+
+
+def all_samples():
+    return FIXED_SAMPLES + generated_samples() + corpus_samples()
+
+
+# --- Tests ---
+
+def test_parse_json_list_matches_legacy():
+    for text in all_samples():
+        assert parse_json_list(text) == legacy_parse_json_list(text), repr(text)
+
+
+def test_parse_instructions_matches_legacy():
+    for text in all_samples():
+        assert parse_instructions(text) == legacy_parse_instructions(text), repr(text)
+
+
+def test_fast_path_rejects_ambiguous_formats():
+    # Escapes and control chars differ between JSON and Python; leave them to the fallback
+    assert parse_quoted_list('["quote \\" inside"]') is None
+    assert parse_quoted_list('["newline\ninside"]') is None
+    assert parse_quoted_list("['a', 'b',]") is None
+    assert parse_quoted_list('[1, 2]') is None
+    assert parse_quoted_list('salt, pepper') is None
+
+
+def test_fast_path_handles_common_formats():
+    assert parse_quoted_list('["1 c. sugar", "2 eggs"]') == ['1 c. sugar', '2 eggs']
+    assert parse_quoted_list("['1 c. sugar', \"Mom's oil\"]") == ['1 c. sugar', "Mom's oil"]
+    assert parse_quoted_list('[ "", " salt " ]') == ['salt']
+    assert parse_quoted_list('[]') == []
+
+
+if __name__ == "__main__":
+    test_parse_json_list_matches_legacy()
+    test_parse_instructions_matches_legacy()
+    test_fast_path_rejects_ambiguous_formats()
+    test_fast_path_handles_common_formats()
+    print("✅ All tests passed!")
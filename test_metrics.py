@@ -0,0 +1,60 @@
+import time
+
+import metrics
+from metrics import Counter, Gauge, Histogram, span, observe_ollama
+
+
+def test_histogram_quantiles_and_text_format():
+    hist = Histogram('test_seconds', 'Test latencies', ('stage',), buckets=(0.01, 0.1, 1.0))
+    for _ in range(90):
+        hist.observe(0.005, stage='fast')
+    for _ in range(10):
+        hist.observe(0.5, stage='fast')
+    assert hist.quantile(0.5, stage='fast') <= 0.01
+    assert 0.1 < hist.quantile(0.95, stage='fast') <= 1.0
+    assert hist.quantile(0.5, stage='other') is None
+
+    text = '\n'.join(hist.render())
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{stage="fast",le="0.01"} 90' in text
+    assert 'test_seconds_bucket{stage="fast",le="+Inf"} 100' in text
+    assert 'test_seconds_count{stage="fast"} 100' in text
+    assert 'test_seconds_quantile{stage="fast",quantile="0.95"}' in text
+
+    counter = Counter('test_total', 'Test counter', ('result',))
+    counter.inc(result='hit')
+    counter.inc(2, result='hit')
+    assert counter.value(result='hit') == 3
+    gauge = Gauge('test_bytes', 'Test gauge', ('index',))
+    gauge.set_function(lambda: 42, index='a')
+    gauge.set_function(lambda: 1 / 0, index='broken')
+    assert gauge.render()[2:] == ['test_bytes{index="a"} 42']
+
+
+def test_spans_and_ollama_stats_feed_the_registry():
+    before = metrics.STAGE_SECONDS.quantile(0.5, stage='test_stage')
+    assert before is None
+    with span('test_stage'):
+        time.sleep(0.002)
+
+    @span('test_stage')
+    def work():
+        return 7
+    assert work() == 7 and work.__name__ == 'work'
+    assert sum(metrics.STAGE_SECONDS.values[('test_stage',)][0]) == 2
+
+    tokens = metrics.LLM_TOKENS.value(phase='decode')
+    observe_ollama({'prompt_eval_count': 300, 'prompt_eval_duration': 500_000_000,
+                    'eval_count': 120, 'eval_duration': 4_000_000_000})
+    assert metrics.LLM_TOKENS.value(phase='decode') == tokens + 120
+    assert metrics.LLM_TOKENS_PER_SECOND.values[('decode',)] == 30.0
+    text = metrics.render()
+    assert 'recipe_stage_seconds_count{stage="llm_decode"}' in text
+    assert 'recipe_llm_tokens_per_second{phase="prompt_eval"} 600.0' in text
+    assert 'recipe_process_memory_bytes{kind="rss"}' in text
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles_and_text_format()
+    test_spans_and_ollama_stats_feed_the_registry()
+    print("✅ All tests passed!")
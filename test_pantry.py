@@ -0,0 +1,96 @@
+import os
+import io
+import sqlite3
+import tempfile
+import contextlib
+
+import numpy as np
+
+import create_db
+from ingredients import build_ingredient_index
+from pantry import parse_pantry, build_pantry_matrix, PantryScorer
+
+RECIPES = [
+    ('Tomato Rice', 'rice|2 tomatoes|1 onion|salt|oil'),
+    ('Chicken Curry', 'chicken|onion|tomato|garlic|ginger|garam masala'),
+    ('Plain Rice', 'rice|water|salt'),
+    ('Chicken Fried Rice', 'chicken|rice|egg|soy sauce|onion'),
+    ('Fruit Salad', 'apple|banana|sugar'),
+]
+
+
+def _scorer(tmp):
+    db = os.path.join(tmp, 'r.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(db)
+        conn = sqlite3.connect(db)
+        for name, ingredients in RECIPES:
+            conn.execute('INSERT INTO recipes (name, ingredients, instructions) VALUES (?, ?, ?)',
+                         (name, ingredients, 'Cook.'))
+        conn.commit()
+        conn.close()
+        create_db.populate_ingredient_tables(db)
+    index = build_ingredient_index(db, os.path.join(tmp, 'postings.npz'))
+    matrix_file = os.path.join(tmp, 'pantry.npz')
+    build_pantry_matrix(index, matrix_file)
+    return PantryScorer.load(index, matrix_file)
+
+
+def test_parse_pantry():
+    assert parse_pantry('Chicken, rice and tomatoes') == ['chicken', 'rice', 'tomato']
+    assert parse_pantry('2 onions; onion') == ['onion']
+    assert parse_pantry('') == []
+
+
+def test_score_ignores_staples():
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = _scorer(tmp)
+        coverage, missing = scorer.score(['rice', 'tomato', 'onion'])
+        # Tomato Rice: salt and oil are staples, so fully covered
+        assert coverage[0] == 1.0 and missing[0] == 0
+        # Plain Rice: only rice is non-staple
+        assert coverage[2] == 1.0 and missing[2] == 0
+        # Chicken Curry: onion + tomato of 6
+        assert missing[1] == 4
+        assert np.isclose(coverage[1], 2 / 6)
+
+
+def test_rank_orders_by_missing_then_coverage():
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = _scorer(tmp)
+        ranked = scorer.rank(['chicken', 'rice', 'onion'], top_k=10)
+        ids = [r_id for r_id, _, _ in ranked]
+        # Plain Rice (0 missing), Tomato Rice (tomato), Chicken Fried Rice (egg, soy sauce)
+        assert ids[:3] == [3, 1, 4]
+        assert 5 not in ids  # shares nothing with the pantry
+
+        limited = scorer.rank(['chicken', 'rice', 'onion'], top_k=10, max_missing=1)
+        assert [r for r, _, _ in limited] == [3, 1]
+
+        assert scorer.rank(['saffron']) == []
+
+
+def test_score_candidates():
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = _scorer(tmp)
+        coverage, missing = scorer.score_candidates([4, 99, 1], ['chicken', 'rice'])
+        assert missing[0] == 3 and np.isinf(missing[1]) and missing[2] == 2
+        assert coverage[1] == 0
+
+
+def test_known_drops_free_text_and_staples():
+    with tempfile.TemporaryDirectory() as tmp:
+        scorer = _scorer(tmp)
+        assert scorer.known(parse_pantry('Chicken, rice and tomatoes')) == ['chicken', 'rice', 'tomato']
+        assert scorer.known(parse_pantry('spicy chicken curry')) == []
+        assert scorer.known(parse_pantry('quick dinner ideas')) == []
+        assert scorer.known(['salt', 'water', 'rice']) == ['rice']
+
+
+if __name__ == "__main__":
+    test_parse_pantry()
+    test_score_ignores_staples()
+    test_rank_orders_by_missing_then_coverage()
+    test_score_candidates()
+    test_known_drops_free_text_and_staples()
+    print("✅ All tests passed!")
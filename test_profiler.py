@@ -0,0 +1,78 @@
+import contextlib
+import contextvars
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import span
+from profiler import SamplingProfiler, SlowRequestLog, collapsed
+
+
+def _spin_for_profiler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_sees_busy_threads_and_skips_idle_ones():
+    stop = threading.Event()
+    busy = threading.Thread(target=_spin_for_profiler, args=(stop,), name='busy-worker')
+    busy.start()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='idle-pool')
+    executor.submit(lambda: None).result()
+    profiler = SamplingProfiler(interval=0.002)
+    try:
+        stacks, rounds = profiler.run(0.2)
+        text = collapsed(stacks)
+        assert rounds > 10
+        assert any(line.startswith('busy-worker;') and '_spin_for_profiler (test_profiler.py' in line
+                   for line in text.splitlines())
+        assert 'idle-pool' not in text
+        assert 'idle-pool' in collapsed(profiler.run(0.02, include_idle=True)[0])
+
+        first = threading.Thread(target=profiler.run, args=(0.3,))
+        first.start()
+        time.sleep(0.05)
+        try:
+            profiler.run(0.01)
+            assert False, 'expected RuntimeError'
+        except RuntimeError:
+            pass
+        first.join()
+    finally:
+        stop.set()
+        busy.join()
+        executor.shutdown()
+
+
+def test_slow_log_records_stage_breakdown_across_threads():
+    log = SlowRequestLog(threshold=0.05, size=2)
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    @log.watch(lambda: {'query': 'chicken'})
+    def handler(delay):
+        with span('test_local'):
+            time.sleep(delay)
+        future = executor.submit(contextvars.copy_context().run, span('test_leg')(time.sleep), delay)
+        future.result()
+        return 'done'
+
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert handler(0.001) == 'done'
+        assert log.recent() == []
+        assert handler(0.04) == 'done'
+        handler(0.03)
+        handler(0.03)
+    entries = log.recent()
+    assert len(entries) == 2 and '[slow] handler took' in out.getvalue()
+    entry = entries[-1]
+    assert entry['request'] == 'handler' and entry['params'] == {'query': 'chicken'}
+    assert set(entry['stages']) == {'test_local', 'test_leg'}
+    assert entry['stages']['test_leg'] >= 0.03
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    test_sampler_sees_busy_threads_and_skips_idle_ones()
+    test_slow_log_records_stage_breakdown_across_threads()
+    print("✅ All tests passed!")
@@ -0,0 +1,77 @@
+import os
+import threading
+
+import numpy as np
+
+from query_encoder import BackgroundEncoder
+
+
+class _Model:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_encode_waits_for_background_load():
+    release = threading.Event()
+
+    def load():
+        release.wait(5)
+        return _Model()
+
+    encoder = BackgroundEncoder(load, name='test')
+    assert not encoder.ready
+    try:
+        encoder.wait(timeout=0.05)
+        assert False, 'should still be loading'
+    except TimeoutError:
+        pass
+    release.set()
+    assert encoder.encode(['a', 'b']).shape == (2, 4)
+    assert encoder.ready and encoder.load_seconds is not None
+
+
+def test_load_error_is_raised_on_encode():
+    def load():
+        raise ImportError('no backend')
+
+    encoder = BackgroundEncoder(load, name='broken')
+    try:
+        encoder.encode(['a'])
+        assert False, 'should raise'
+    except RuntimeError as e:
+        assert 'no backend' in str(e)
+
+
+def test_deferred_load_runs_in_each_process():
+    pids = []
+
+    def load():
+        pids.append(os.getpid())
+        return _Model()
+
+    encoder = BackgroundEncoder(load, name='deferred', start=False)
+    assert not encoder.ready and pids == []
+    pid = os.fork()
+    if pid == 0:
+        ok = encoder.encode(['a']).shape == (1, 4) and pids == [os.getpid()]
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert pids == []
+
+    encoder.start()
+    encoder.wait(timeout=5)
+    assert pids == [os.getpid()]
+    # A child forked after the load gets its own model, not the parent's torch state
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if not encoder.ready and encoder.wait(timeout=5) and pids[-1] == os.getpid() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+if __name__ == "__main__":
+    test_encode_waits_for_background_load()
+    test_load_error_is_raised_on_encode()
+    test_deferred_load_runs_in_each_process()
+    print("✅ All tests passed!")
@@ -0,0 +1,301 @@
+import os
+import io
+import sqlite3
+import tempfile
+import contextlib
+
+import create_db
+from ingredients import build_ingredient_index
+from pantry import build_pantry_matrix, PantryScorer
+from recipe_search import (CandidateCache, CursorExpired, SearchSnapshots, decode_cursor, encode_cursor, filter_rows,
+                           fuse_candidates, fuse_rankings, matches_filters, recipe_payloads, request_deadline,
+                           search_key, visible_candidates)
+
+# id 1..6: (name, cuisine, category, ingredients, instructions, step_timers)
+RECIPES = [
+    ('Tomato Rice', 'Indian', 'main_course', 'rice|2 tomatoes|1 onion|salt|oil',
+     'Fry the onion.|Add rice and tomatoes, simmer until done.', '|900'),
+    ('Chicken Curry', 'Indian', 'main-course', 'chicken|onion|tomato|garlic|ginger|garam masala',
+     'Brown the chicken.|Simmer 30 min.', None),
+    ('Plain Rice', 'Chinese', 'side_dish', 'rice|water|salt', 'Boil the rice.', ''),
+    ('Chicken Fried Rice', 'Chinese', 'main_course', 'chicken|rice|egg|soy sauce|onion|peas|carrot',
+     'Fry everything.', ''),
+    ('Chicken Fried Rice', 'Chinese', 'main_course', '1 lb chicken|2 c. rice|2 eggs|soy sauce|1 onion|peas|carrots',
+     'Fry everything.', ''),
+    ('Fruit Salad', 'American', 'dessert', 'apple|banana|sugar', 'Chop the fruit.', ''),
+]
+
+
+def _fixture(tmp):
+    """recipes.db with RECIPES, near-duplicate clusters and a pantry scorer over it"""
+    db = os.path.join(tmp, 'r.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_database(db)
+        conn = sqlite3.connect(db)
+        conn.executemany('INSERT INTO recipes (name, cuisine, category, ingredients, instructions, step_timers) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', RECIPES)
+        conn.commit()
+        conn.close()
+        create_db.populate_ingredient_tables(db)
+        create_db.assign_clusters(db)
+    index = build_ingredient_index(db, os.path.join(tmp, 'postings.npz'))
+    build_pantry_matrix(index, os.path.join(tmp, 'pantry.npz'))
+    return db, PantryScorer.load(index, os.path.join(tmp, 'pantry.npz'))
+
+
+def test_fuse_rankings_rewards_agreement():
+    keyword = [1, 2, 3, 4]
+    embedding = [5, 3, 6, 1]
+    fused = fuse_rankings([keyword, embedding])
+    assert sorted(fused) == [1, 2, 3, 4, 5, 6]
+    # Found by both lists beats the top of just one
+    assert fused[:2] == [1, 3]
+    assert fuse_rankings([[7, 7, 8], []]) == [7, 8]
+    assert fuse_rankings([]) == []
+
+
+def test_fuse_candidates_puts_pantry_matches_first():
+    with tempfile.TemporaryDirectory() as tmp:
+        _, scorer = _fixture(tmp)
+        candidates = {'keyword': [3, 1], 'embedding': [1, 2], 'pantry': [4]}
+        ranked, pantry_info = fuse_candidates(candidates)
+        assert ranked == [1, 3, 2] and pantry_info == {}
+
+        # Missing: Tomato Rice 0, Plain Rice 0, Chicken Fried Rice 5, Chicken Curry 4 (staples never count)
+        ranked, pantry_info = fuse_candidates(candidates, ['rice', 'tomato', 'onion'], scorer)
+        assert ranked == [1, 3, 2, 4]
+        assert pantry_info[1] == (1.0, 0.0) and pantry_info[4][1] == 5.0 and set(pantry_info) == {1, 2, 3, 4}
+
+        # A query naming no ingredient ('spicy chicken curry' parses to one unknown name) keeps the fused order
+        assert fuse_candidates({'keyword': [2, 4], 'embedding': [2, 1]}, ['spicy chicken curry'], scorer) == \
+            ([2, 4, 1], {})
+        assert fuse_candidates(candidates, ['salt', 'quick dinner idea'], scorer) == ([1, 3, 2], {})
+
+
+def test_matches_filters():
+    row = ('Indian', 'main-course', None)
+    assert matches_filters(row, {}, {}, 1)
+    assert matches_filters(row, {'cuisine': 'indian', 'category': 'main_course'}, {}, 1)
+    assert not matches_filters(row, {'cuisine': 'Thai'}, {}, 1)
+    assert not matches_filters(row, {'category': 'dessert'}, {}, 1)
+    assert not matches_filters((None, None, None), {'cuisine': 'Indian'}, {}, 1)
+
+    pantry_info = {1: (0.5, 2.0), 2: (1.0, 0.0)}
+    assert matches_filters(row, {'max_missing': 2}, pantry_info, 1)
+    assert not matches_filters(row, {'max_missing': 1}, pantry_info, 1)
+    # Unscored recipes count as missing everything; without a pantry max_missing is ignored
+    assert not matches_filters(row, {'max_missing': 5}, pantry_info, 3)
+    assert matches_filters(row, {'max_missing': 0}, {}, 3)
+
+
+def test_visible_candidates_filter_and_collapse_clusters():
+    with tempfile.TemporaryDirectory() as tmp:
+        db, _ = _fixture(tmp)
+        conn = sqlite3.connect(db)
+        ranked = [5, 1, 4, 2, 6, 99]
+        rows = filter_rows(conn, ranked)
+        conn.close()
+        assert rows[4][2] == rows[5][2] == 4 and rows[1][2] is None and 99 not in rows
+
+        # The best-ranked recipe of a near-duplicate cluster stands for it; unknown ids drop out
+        assert visible_candidates(ranked, rows, {}, {}) == ([5, 1, 2, 6], {})
+        assert visible_candidates(ranked, rows, {'cuisine': 'indian', 'category': 'main_course'}, {})[0] == [1, 2]
+
+        pantry_info = {5: (0.5, 3.0), 4: (0.6, 1.0), 1: (1.0, 0.0), 2: (0.3, 4.0)}
+        visible, info = visible_candidates(ranked, rows, {'max_missing': 3}, pantry_info)
+        assert visible == [5, 1] and info == {5: (0.5, 3.0), 1: (1.0, 0.0)}
+        # A filtered-out representative does not hide the rest of its cluster
+        assert visible_candidates(ranked, rows, {'max_missing': 1}, pantry_info)[0] == [1, 4]
+
+
+def test_recipe_payloads_read_step_timers():
+    with tempfile.TemporaryDirectory() as tmp:
+        db, _ = _fixture(tmp)
+        conn = sqlite3.connect(db)
+        recipes = recipe_payloads(conn, [2, 99, 1])
+        assert [r['id'] for r in recipes] == [2, 1]
+        curry, tomato_rice = recipes
+        assert tomato_rice['ingredients'] == ['rice', '2 tomatoes', '1 onion', 'salt', 'oil']
+        assert tomato_rice['cuisine'] == 'Indian' and tomato_rice['category'] == 'main_course'
+        # step_timers from ingest, not the step text
+        assert tomato_rice['instructions'] == ['Fry the onion.', 'Add rice and tomatoes, simmer until done.']
+        assert [s['durations'] for s in tomato_rice['parsed_steps']] == [[], [900]]
+        assert tomato_rice['parsed_steps'][1]['timers'] == [15] and tomato_rice['parsed_steps'][1]['has_timer']
+        # Without step_timers (NULL or no column) timers are parsed from the text
+        assert [s['durations'] for s in curry['parsed_steps']] == [[], [1800]]
+        assert [s['durations'] for s in recipe_payloads(conn, [1], step_timers=False)[0]['parsed_steps']] == [[], []]
+        assert recipe_payloads(conn, []) == []
+        conn.close()
+
+
+def test_request_deadline():
+    clock = lambda: 100.0
+    # Missing: the endpoint's default; 0 or less: none, also when the default is set
+    assert request_deadline(None, 0.08, clock) == request_deadline('', 0.08, clock) == 100.08
+    assert request_deadline(None, 0, clock) is None
+    assert request_deadline(0, 0.08, clock) is None and request_deadline('0', 0.08, clock) is None
+    assert request_deadline(-5, 0.08, clock) is None
+    assert request_deadline('250', 0.08, clock) == request_deadline(250, 0, clock) == 100.25
+    for bad in ('soon', 'nan', 'inf', [], {}, True):
+        try:
+            request_deadline(bad, 0.08, clock)
+        except ValueError:
+            continue
+        raise AssertionError(f'{bad!r} accepted')
+
+
+def test_cursor_round_trip_and_rejection():
+    key = search_key('Chicken  Rice', {'cuisine': 'Indian'})
+    assert key == search_key('chicken rice', {'cuisine': 'Indian'})
+    assert key != search_key('chicken rice', {'cuisine': 'Thai'})
+
+    cursor = encode_cursor(key, 40, 'v2', 'snap')
+    assert '=' not in cursor and decode_cursor(cursor, key) == (40, 'v2', 'snap', False)
+    for bad in ('not-a-cursor', encode_cursor(search_key('pasta', {}), 40), encode_cursor(key, -1)):
+        try:
+            decode_cursor(bad, key)
+        except ValueError:
+            continue
+        raise AssertionError(f'{bad} accepted')
+
+
+def test_candidate_cache_expires_and_evicts():
+    now = [0.0]
+    cache = CandidateCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.put('a', [1, 2])
+    cache.put('b', [3])
+    assert cache.get('a') == [1, 2]
+    # 'b' is now least recently used
+    cache.put('c', [4])
+    assert cache.get('b') is None and cache.get('a') == [1, 2] and len(cache) == 2
+
+    now[0] = 10.0
+    assert cache.get('a') is None and cache.get('c') is None and len(cache) == 0
+    cache.put('a', [5])
+    assert cache.get('a') == [5]
+
+
+class _Ranker:
+    """rank(deadline) for SearchSnapshots.page: 5 ids from first, the same on every call
+
+    changing: each call ranks a different list (101.., 201.., ...); cut: a
+    deadline cuts the list short and marks it partial.
+    """
+
+    def __init__(self, first=101, changing=False, cut=False):
+        self.first, self.changing, self.cut, self.deadlines = first, changing, cut, []
+
+    def __call__(self, deadline):
+        self.deadlines.append(deadline)
+        start = self.first - 1 + (100 * (len(self.deadlines) - 1) if self.changing else 0)
+        partial = self.cut and deadline is not None
+        visible = list(range(start + 1, start + (4 if partial else 6)))
+        return visible, {visible[0]: (1.0, 0.0)}, {'partial': partial, 'coverage': {}}
+
+
+def _hydrate(ids):
+    return [{'id': r_id} for r_id in ids]
+
+
+def _ids(page):
+    return [r['id'] for r in page['recipes']]
+
+
+def _expect_expired(pages, cursor, version='v1', rank=None):
+    try:
+        pages.page('rice', {}, version, rank or _Ranker(), _hydrate, 2, cursor)
+    except CursorExpired:
+        return
+    raise AssertionError('cursor still served')
+
+
+def test_search_pages_hit_snapshot_across_pages():
+    pages, rank = SearchSnapshots(), _Ranker()
+    first = pages.page('rice', {}, 'v1', rank, _hydrate, 2, deadline=5.0)
+    assert _ids(first) == [101, 102] and first['total'] == 5
+    assert first['recipes'][0]['pantry_coverage'] == 1.0 and first['recipes'][0]['missing_count'] == 0
+    second = pages.page('rice', {}, 'v1', rank, _hydrate, 2, first['next_cursor'])
+    last = pages.page('rice', {}, 'v1', rank, _hydrate, 2, second['next_cursor'])
+    assert _ids(second) + _ids(last) == [103, 104, 105] and last['next_cursor'] is None
+    # Pages and a repeated search are served from the one ranking
+    assert pages.page('rice', {}, 'v1', rank, _hydrate, 2)['recipes'] == first['recipes']
+    assert rank.deadlines == [5.0] and len(pages) == 1
+
+    try:
+        pages.page('pasta', {}, 'v1', rank, _hydrate, 2, first['next_cursor'])
+    except ValueError as e:
+        assert not isinstance(e, CursorExpired)
+    else:
+        raise AssertionError('cursor from another search accepted')
+
+
+def test_search_page_served_by_another_process():
+    # Page 1 on one serve.py worker, page 2 on another that never saw the search
+    first = SearchSnapshots().page('rice', {}, 'v1', _Ranker(), _hydrate, 2, deadline=5.0)
+    other, rank = SearchSnapshots(), _Ranker()
+    second = other.page('rice', {}, 'v1', rank, _hydrate, 2, first['next_cursor'])
+    assert _ids(second) == [103, 104] and rank.deadlines == [None]
+    # The rebuilt snapshot serves the following pages
+    assert _ids(other.page('rice', {}, 'v1', rank, _hydrate, 2, second['next_cursor'])) == [105]
+    assert len(rank.deadlines) == 1
+
+    # A list that ranks differently now is never paged with an old cursor
+    _expect_expired(SearchSnapshots(), first['next_cursor'], rank=_Ranker(first=901))
+
+
+def test_search_cursor_after_eviction_is_rebuilt_or_expired():
+    now = [0.0]
+    pages = SearchSnapshots(max_entries=1, ttl=10, clock=lambda: now[0])
+    rice = pages.page('rice', {}, 'v1', _Ranker(), _hydrate, 2)
+    pasta = pages.page('pasta', {}, 'v1', _Ranker(), _hydrate, 2)
+    # 'rice' was evicted by 'pasta': ranked again, and served only if it is the same list
+    assert _ids(pages.page('rice', {}, 'v1', _Ranker(), _hydrate, 2, rice['next_cursor'])) == [103, 104]
+    # 'pasta' expires and now ranks differently
+    now[0] = 10.0
+    try:
+        pages.page('pasta', {}, 'v1', _Ranker(first=901), _hydrate, 2, pasta['next_cursor'])
+    except CursorExpired:
+        pass
+    else:
+        raise AssertionError('expired cursor served from a different ranking')
+
+
+def test_search_cursor_after_version_swap_is_expired():
+    pages, rank = SearchSnapshots(), _Ranker(changing=True)
+    first = pages.page('rice', {}, 'v1', rank, _hydrate, 2)
+    _expect_expired(pages, first['next_cursor'], version='v2')
+    _expect_expired(SearchSnapshots(), first['next_cursor'], version='v2')
+    # A new search on the new version ranks again
+    assert _ids(pages.page('rice', {}, 'v2', rank, _hydrate, 2))[0] == 201 and len(rank.deadlines) == 2
+
+
+def test_search_partial_snapshot_is_kept_not_rebuilt():
+    pages, rank = SearchSnapshots(), _Ranker(changing=True, cut=True)
+    first = pages.page('rice', {}, 'v1', rank, _hydrate, 2, deadline=5.0)
+    assert first['retrieval']['partial'] and first['total'] == 3
+    # A new search retries a deadline-cut list instead of reusing it...
+    again = pages.page('rice', {}, 'v1', rank, _hydrate, 2, deadline=5.0)
+    assert _ids(again) == [201, 202] and len(rank.deadlines) == 2
+    # ...while the first search's cursor keeps paging its own list
+    assert _ids(pages.page('rice', {}, 'v1', rank, _hydrate, 2, first['next_cursor'])) == [103]
+    assert _ids(pages.page('rice', {}, 'v1', rank, _hydrate, 2, again['next_cursor'])) == [203]
+    # A cut-short list cannot be reproduced elsewhere
+    _expect_expired(SearchSnapshots(), first['next_cursor'], rank=_Ranker(cut=True))
+    assert len(rank.deadlines) == 2
+
+
+if __name__ == "__main__":
+    test_fuse_rankings_rewards_agreement()
+    test_request_deadline()
+    test_fuse_candidates_puts_pantry_matches_first()
+    test_matches_filters()
+    test_visible_candidates_filter_and_collapse_clusters()
+    test_recipe_payloads_read_step_timers()
+    test_cursor_round_trip_and_rejection()
+    test_candidate_cache_expires_and_evicts()
+    test_search_pages_hit_snapshot_across_pages()
+    test_search_page_served_by_another_process()
+    test_search_cursor_after_eviction_is_rebuilt_or_expired()
+    test_search_cursor_after_version_swap_is_expired()
+    test_search_partial_snapshot_is_kept_not_rebuilt()
+    print("✅ All tests passed!")
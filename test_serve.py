@@ -0,0 +1,165 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# A serve.py app shaped like app.py: a BackgroundEncoder deferred under PREFORK_SERVER, started in after_fork()
+FORK_APP = '''
+import json, os
+from query_encoder import BackgroundEncoder
+
+class Model:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.threads = os.environ.get('OMP_NUM_THREADS')
+
+    def encode(self, texts):
+        return [[len(t)] for t in texts]
+
+encoder = BackgroundEncoder(Model, name='stub', start=os.environ.get('PREFORK_SERVER') != '1')
+parent_loaded = encoder._pid is not None
+
+def after_fork():
+    encoder.start()
+
+def app(environ, start_response):
+    model = encoder.wait(timeout=5)
+    body = json.dumps({'pid': os.getpid(), 'model_pid': model.pid, 'threads': model.threads,
+                       'encoded': encoder.encode(['abc']), 'parent_loaded': parent_loaded})
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [body.encode()]
+'''
+
+# Index swaps as app.py does them under serve.py: /swap plays the admin endpoint (request + SIGHUP to the
+# parent), update_index() runs in the parent, which re-forks the workers
+SWAP_APP = '''
+import json, os, signal, time
+VERSION_FILE = os.environ['TEST_VERSION_FILE']
+INDEX_WATCH_SECONDS = 0.3
+with open(VERSION_FILE) as f:
+    active = f.read()
+
+def update_index():
+    global active
+    with open(VERSION_FILE) as f:
+        wanted = f.read()
+    changed, active = wanted != active, wanted
+    return changed
+
+def app(environ, start_response):
+    if environ['PATH_INFO'] == '/swap':
+        with open(VERSION_FILE + '.tmp', 'w') as f:
+            f.write(environ['QUERY_STRING'])
+        os.replace(VERSION_FILE + '.tmp', VERSION_FILE)
+        os.kill(os.getppid(), signal.SIGHUP)
+    elif environ['PATH_INFO'] == '/slow':
+        time.sleep(1.5)
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [json.dumps({'pid': os.getpid(), 'version': active}).encode()]
+'''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start(tmp, name, source, env=None):
+    with open(os.path.join(tmp, f'{name}.py'), 'w') as f:
+        f.write(source)
+    port = _free_port()
+    env = {**os.environ, **(env or {}), 'PYTHONPATH': os.pathsep.join([tmp, ROOT])}
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py'), '--app', f'{name}:app',
+                             '--host', '127.0.0.1', '--port', str(port), '--workers', '2',
+                             '--threads-per-worker', '1'],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, f'http://127.0.0.1:{port}'
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def _workers(url, accept=lambda answer: True, timeout=30):
+    """{pid: answer} from both workers, counting only accepted answers"""
+    seen = {}
+    deadline = time.monotonic() + timeout
+    while len(seen) < 2 and time.monotonic() < deadline:
+        try:
+            # A new connection per request, so the kernel spreads them over both workers
+            answer = _get(url)
+        except OSError:
+            time.sleep(0.1)
+            continue
+        if accept(answer):
+            seen[answer['pid']] = answer
+        else:
+            time.sleep(0.05)
+    return seen
+
+
+def test_workers_load_encoder_after_fork():
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, url = _start(tmp, 'fork_app', FORK_APP)
+        try:
+            seen = _workers(url + '/')
+            assert len(seen) == 2, seen
+            for pid, answer in seen.items():
+                # Every worker encodes with a model it loaded itself; the parent never loaded one
+                assert answer['model_pid'] == pid != proc.pid
+                assert answer['encoded'] == [[3]] and answer['threads'] == '1'
+                assert not answer['parent_loaded']
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+
+def test_index_swap_replaces_every_worker():
+    with tempfile.TemporaryDirectory() as tmp:
+        version_file = os.path.join(tmp, 'version')
+        with open(version_file, 'w') as f:
+            f.write('v1')
+        proc, url = _start(tmp, 'swap_app', SWAP_APP, {'TEST_VERSION_FILE': version_file})
+        try:
+            old = _workers(url + '/')
+            assert len(old) == 2 and {a['version'] for a in old.values()} == {'v1'}
+
+            # A request in flight on an old worker is finished, not dropped
+            slow = {}
+            in_flight = threading.Thread(target=lambda: slow.update(_get(url + '/slow')))
+            in_flight.start()
+            time.sleep(0.2)
+            assert _get(url + '/swap?v2')['version'] == 'v1'
+
+            new = _workers(url + '/', lambda answer: answer['version'] == 'v2')
+            assert len(new) == 2 and not set(new) & set(old)
+            in_flight.join(10)
+            assert slow['version'] == 'v1' and slow['pid'] in old
+            # Once replaced (old workers leave their accept loop within serve_forever's 0.5s poll),
+            # no worker answers with the old version
+            time.sleep(1.0)
+            assert all(_get(url + '/')['version'] == 'v2' for _ in range(10))
+
+            # A version published without an admin call is picked up by the parent's watcher
+            with open(version_file, 'w') as f:
+                f.write('v3')
+            newest = _workers(url + '/', lambda answer: answer['version'] == 'v3')
+            assert len(newest) == 2 and not set(newest) & set(new)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+
+if __name__ == "__main__":
+    test_workers_load_encoder_after_fork()
+    test_index_swap_replaces_every_worker()
+    print("✅ All tests passed!")
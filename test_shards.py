@@ -0,0 +1,150 @@
+import json
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from werkzeug.serving import make_server
+
+from shard_server import create_app, load_shard, parse_shard_spec
+from shards import Coordinator, LocalShard, RemoteShard, decode_request, encode_request
+from sparse_weighting import make_hashing_vectorizer
+
+
+def _write_models(tmp, emb, tfidf, sizes):
+    chunk_files, chunk_offsets, start = [], [], 0
+    for i, size in enumerate(sizes):
+        files = {'emb': f'emb_chunk_{i}.npy', 'tfidf': f'tfidf_chunk_{i}.npz'}
+        np.save(os.path.join(tmp, files['emb']), emb[start:start + size])
+        sparse.save_npz(os.path.join(tmp, files['tfidf']), tfidf[start:start + size])
+        chunk_files.append(files)
+        chunk_offsets.append(start)
+        start += size
+    models_data = {'chunks_dir': tmp, 'chunk_files': chunk_files, 'chunk_offsets': chunk_offsets,
+                   'recipe_ids': list(range(1000, 1000 + len(emb)))}
+    path = os.path.join(tmp, 'recipe_models.pkl')
+    with open(path, 'wb') as f:
+        pickle.dump(models_data, f)
+    return models_data, path
+
+
+def _corpus(n=60):
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((n, 8)).astype(np.float32)
+    words = ['chicken', 'rice', 'lemon', 'garlic', 'basil', 'tofu', 'pasta', 'beef']
+    texts = [' '.join(rng.choice(words, 4)) + f' dish{i}' for i in range(n)]
+    tfidf = make_hashing_vectorizer().transform(texts).tocsr().astype(np.float32)
+    tfidf = sparse.csr_matrix(tfidf.multiply(1 / np.sqrt(tfidf.multiply(tfidf).sum(axis=1))))
+    return emb, tfidf, texts
+
+
+def _serve(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def test_partitioned_shards_match_single_shard():
+    emb, tfidf, texts = _corpus()
+    query_emb = emb[17] + 0.05
+    query_vec = make_hashing_vectorizer().transform(['dish33 basil']).tocsr()
+    with tempfile.TemporaryDirectory() as tmp:
+        models_data, _ = _write_models(tmp, emb, tfidf, [25, 10, 25])
+        whole = Coordinator([LocalShard.from_models('all', models_data, [0, 1, 2])], timeout=None)
+        split = Coordinator([LocalShard.from_models('a', models_data, [0, 2]),
+                             LocalShard.from_models('b', models_data, [1])])
+        expected = whole.search(query_emb, query_vec, top_k=5)
+        result = split.search(query_emb, query_vec, top_k=5)
+
+        assert result['failed'] == [] and result['shards'] == 2
+        assert [r for r, _ in result['dense']] == [r for r, _ in expected['dense']]
+        for leg in ('dense', 'sparse'):
+            # sparse scores tie between documents with the same words, so only the scores must agree
+            assert np.allclose([s for _, s in result[leg]], [s for _, s in expected[leg]])
+        assert expected['dense'][0][0] == result['dense'][0][0] == 1017
+        assert expected['sparse'][0][0] == result['sparse'][0][0] == 1033
+        assert result['coverage'] == 1.0 and not result['partial']
+
+
+def test_coordinator_searches_after_fork():
+    emb, tfidf, texts = _corpus()
+    with tempfile.TemporaryDirectory() as tmp:
+        models_data, _ = _write_models(tmp, emb, tfidf, [25, 10, 25])
+        coordinator = Coordinator([LocalShard.from_models('a', models_data, [0, 2]),
+                                   LocalShard.from_models('b', models_data, [1])], timeout=2)
+        # Warm-up in the parent leaves idle pool threads that a forked worker does not get
+        expected = coordinator.search(emb[17], top_k=3)
+        pid = os.fork()
+        if pid == 0:
+            result = coordinator.search(emb[17], top_k=3)
+            os._exit(0 if result['failed'] == [] and result['dense'] == expected['dense'] else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+
+
+def test_deadline_returns_partial_result_with_coverage():
+    emb, tfidf, texts = _corpus()
+    query_vec = make_hashing_vectorizer().transform([texts[5]]).tocsr()
+    with tempfile.TemporaryDirectory() as tmp:
+        models_data, _ = _write_models(tmp, emb, tfidf, [10, 20, 30])
+        coordinator = Coordinator([LocalShard.from_models('all', models_data, [0, 1, 2])], timeout=None)
+
+        # Already past: each leg searches its first chunk only
+        result = coordinator.search(emb[5], query_vec, top_k=3, deadline=time.monotonic() - 1)
+        assert result['partial'] and result['failed'] == []
+        assert result['coverage'] == 10 / 60
+        assert result['dense'][0][0] == result['sparse'][0][0] == 1005
+
+        result = coordinator.search(emb[5], None, top_k=3, deadline=time.monotonic() + 5)
+        assert result['coverage'] == 1.0 and not result['partial']
+
+    body = json.loads(json.dumps(encode_request(emb[0], None, 3, budget=0.25)))
+    _, _, top_k, deadline = decode_request(body)
+    assert top_k == 3 and 0 < deadline - time.monotonic() <= 0.25
+
+
+def test_remote_shards_and_slow_shard_give_partial_result():
+    emb, tfidf, _ = _corpus()
+    query_vec = make_hashing_vectorizer().transform(['dish50']).tocsr()
+    silent = socket.socket()
+    silent.bind(('127.0.0.1', 0))
+    silent.listen(8)
+    with tempfile.TemporaryDirectory() as tmp:
+        models_data, path = _write_models(tmp, emb, tfidf, [30, 30])
+        assert parse_shard_spec('0-1,5', 2) == [0, 1] and parse_shard_spec('all', 2) == [0, 1]
+        servers = [_serve(create_app(load_shard(path, spec))) for spec in ('0', '1')]
+        try:
+            remote = Coordinator([RemoteShard(url, timeout=5) for _, url in servers], timeout=5)
+            local = Coordinator([LocalShard.from_models('all', models_data, [0, 1])], timeout=None)
+            result = remote.search(emb[50], query_vec, top_k=3)
+            expected = local.search(emb[50], query_vec, top_k=3)
+            assert result['failed'] == [] and result['coverage'] == 1.0
+            assert [r for r, _ in result['dense']] == [r for r, _ in expected['dense']]
+            assert np.allclose([s for _, s in result['sparse']], [s for _, s in expected['sparse']])
+            assert result['dense'][0][0] == result['sparse'][0][0] == 1050
+
+            slow_url = f'http://127.0.0.1:{silent.getsockname()[1]}'
+            partial = Coordinator([RemoteShard(servers[1][1], timeout=2), RemoteShard(slow_url, timeout=2)],
+                                  timeout=0.3)
+            start = time.perf_counter()
+            result = partial.search(emb[50], None, top_k=3)
+            assert time.perf_counter() - start < 1.5
+            assert result['failed'] == [slow_url] and result['shards'] == 2
+            assert result['partial'] and result['coverage'] == 0.5
+            assert result['dense'][0][0] == 1050 and result['sparse'] == []
+        finally:
+            for server, _ in servers:
+                server.shutdown()
+            silent.close()
+
+
+if __name__ == "__main__":
+    test_partitioned_shards_match_single_shard()
+    test_coordinator_searches_after_fork()
+    test_deadline_returns_partial_result_with_coverage()
+    test_remote_shards_and_slow_shard_give_partial_result()
+    print("✅ All tests passed!")
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from shared_index import SharedArrays, memory_report
+
+
+def test_arrays_roundtrip_read_only():
+    ids = np.arange(10, dtype=np.int64) * 3
+    vectors = np.random.default_rng(0).standard_normal((10, 5)).astype(np.float32)
+    shared = SharedArrays.create({'ids': ids, 'vectors': vectors})
+    try:
+        assert np.array_equal(shared['ids'], ids)
+        assert np.array_equal(shared['vectors'], vectors)
+        assert not shared['ids'].flags.writeable
+
+        other = SharedArrays.attach(shared.name, shared.layout)
+        assert np.array_equal(other['vectors'], vectors)
+        other.close()
+        # Closing an attached copy must not remove the segment
+        again = SharedArrays.attach(shared.name, shared.layout)
+        assert np.array_equal(again['ids'], ids)
+        again.close()
+    finally:
+        shared.close()
+
+
+def test_forked_child_sees_segment():
+    shared = SharedArrays.create({'ids': np.arange(1000, dtype=np.int64)})
+    try:
+        pid = os.fork()
+        if pid == 0:
+            ok = int(shared['ids'].sum()) == 499500
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+    finally:
+        shared.close()
+
+
+def test_memory_report():
+    report = memory_report()
+    if report is not None:
+        assert report['rss'] > 0 and report['pss'] > 0
+
+
+if __name__ == "__main__":
+    test_arrays_roundtrip_read_only()
+    test_forked_child_sees_segment()
+    test_memory_report()
+    print("✅ All tests passed!")
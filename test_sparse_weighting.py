@@ -0,0 +1,102 @@
+import os
+import pickle
+import random
+import tempfile
+
+import numpy as np
+from sklearn.utils import murmurhash3_32 as sklearn_murmurhash3_32
+
+import sparse_weighting
+from sparse_weighting import DocumentFrequencies, WeightedHashingVectorizer, idf_weights, murmurhash3_32
+
+
+def _corpus(n):
+    rng = np.random.default_rng(0)
+    words = [f'word{i}' for i in range(200)]
+    texts = []
+    for i in range(n):
+        body = ' '.join(rng.choice(words, size=30))
+        texts.append(f'salt pepper {body} unique{i}')
+    return texts
+
+
+def test_prunes_common_and_rare_features():
+    texts = _corpus(sparse_weighting.PRUNE_MIN_DOCS)
+    frequencies = DocumentFrequencies()
+    for start in range(0, len(texts), 250):
+        frequencies.update(texts[start:start + 250])
+    assert frequencies.n_docs == len(texts)
+
+    vectorizer = WeightedHashingVectorizer.from_frequencies(frequencies, max_nnz=20)
+    hashing = sparse_weighting.make_hashing_vectorizer()
+    salt_pepper = hashing.transform(['salt pepper']).indices
+    unique = hashing.transform(['unique7']).indices
+    assert (vectorizer.idf[salt_pepper] == 0).all()
+    assert (vectorizer.idf[unique] == 0).all()
+
+    matrix = vectorizer.transform(texts[:50])
+    assert np.diff(matrix.indptr).max() <= 20
+    assert np.allclose(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel(), 1.0)
+
+
+def test_small_corpus_keeps_features():
+    idf = idf_weights(np.array([0, 1, 5, 5]), 5)
+    assert idf[0] == 0 and (idf[1:] > 0).all()
+    assert idf[1] > idf[2]
+
+
+def test_save_load_roundtrip():
+    frequencies = DocumentFrequencies()
+    frequencies.update(['chicken rice', 'chicken soup', 'tomato soup'])
+    vectorizer = WeightedHashingVectorizer.from_frequencies(frequencies, max_nnz=8)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, sparse_weighting.IDF_FILE)
+        with open(path, 'wb') as f:
+            vectorizer.save(f)
+        loaded = WeightedHashingVectorizer.load(path)
+    assert loaded.fingerprint() == vectorizer.fingerprint()
+    assert (loaded.transform(['chicken soup']) != vectorizer.transform(['chicken soup'])).nnz == 0
+
+
+def test_murmurhash_matches_sklearn():
+    rng = random.Random(0)
+    for _ in range(2000):
+        key = bytes(rng.randrange(256) for _ in range(rng.randrange(12)))
+        assert murmurhash3_32(key) == sklearn_murmurhash3_32(key, seed=0)
+    assert murmurhash3_32('crème brûlée'.encode('utf-8')) == sklearn_murmurhash3_32('crème brûlée')
+
+
+def test_transform_query_matches_transform():
+    texts = _corpus(40) + ['Chicken TIKKA masala, 2 cups rice!', 'crème brûlée', 'a', '']
+    frequencies = DocumentFrequencies()
+    frequencies.update(texts)
+    vectorizer = WeightedHashingVectorizer.from_frequencies(frequencies, max_nnz=12)
+    for text in texts:
+        expected = vectorizer.transform([text])
+        expected.sort_indices()
+        query = vectorizer.transform_query(text)
+        assert query.shape == expected.shape
+        assert query.indices.tolist() == expected.indices.tolist()
+        assert np.allclose(query.data, expected.data, atol=1e-6)
+
+
+def test_pickle_leaves_out_sklearn():
+    frequencies = DocumentFrequencies()
+    frequencies.update(['chicken rice', 'chicken soup'])
+    vectorizer = WeightedHashingVectorizer.from_frequencies(frequencies)
+    vectorizer.transform(['chicken'])
+    data = pickle.dumps(vectorizer)
+    assert b'sklearn' not in data
+    loaded = pickle.loads(data)
+    assert loaded.transform_query('chicken soup').indices.tolist() == \
+        vectorizer.transform_query('chicken soup').indices.tolist()
+
+
+if __name__ == "__main__":
+    test_prunes_common_and_rare_features()
+    test_small_corpus_keeps_features()
+    test_save_load_roundtrip()
+    test_murmurhash_matches_sklearn()
+    test_transform_query_matches_transform()
+    test_pickle_leaves_out_sklearn()
+    print("✅ All tests passed!")